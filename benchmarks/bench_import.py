@@ -0,0 +1,9 @@
+"""Cold import times (each measured in a fresh interpreter)."""
+
+
+def timeraw_import_wordpool():
+    return "import wordpool"
+
+
+def timeraw_import_listgen():
+    return "import wordpool.listgen"
@@ -0,0 +1,178 @@
+"""Benchmarks for session generation."""
+
+import wordpool
+from wordpool import listgen
+
+from .common import CAT_POOLS, cat_pool, seed, typed_session
+
+
+class FR:
+    params = [["EN", "SP"]]
+    param_names = ["language"]
+
+    def setup(self, language):
+        seed()
+
+    def time_generate_session_pool(self, language):
+        listgen.fr.generate_session_pool(language=language)
+
+    def peakmem_generate_session_pool(self, language):
+        listgen.fr.generate_session_pool(language=language)
+
+
+class FRBatch:
+    """Batched FR sessions against as many separate calls, which is the
+    baseline the batch should beat by at least an order of magnitude.
+
+    """
+    params = [[1, 10, 100, 300]]
+    param_names = ["n_sessions"]
+
+    def setup(self, n_sessions):
+        if not hasattr(listgen.fr, "generate_n_session_pools"):
+            raise NotImplementedError("not available in this version")
+        seed()
+
+    def time_generate_n_session_pools(self, n_sessions):
+        listgen.fr.generate_n_session_pools(n_sessions)
+
+    def time_generate_session_pool_loop(self, n_sessions):
+        for _ in range(n_sessions):
+            listgen.fr.generate_session_pool()
+
+    def track_speedup(self, n_sessions):
+        import timeit
+
+        def best(func):
+            return min(timeit.repeat(func, number=1, repeat=5))
+
+        loop = best(lambda: [listgen.fr.generate_session_pool() for _ in range(n_sessions)])
+        return loop / best(lambda: listgen.fr.generate_n_session_pools(n_sessions))
+
+    track_speedup.unit = "x"
+
+    def peakmem_generate_n_session_pools(self, n_sessions):
+        listgen.fr.generate_n_session_pools(n_sessions)
+
+
+class ListTypes:
+    params = [[0, 4]]
+    param_names = ["num_ps"]
+
+    def setup(self, num_ps):
+        seed()
+        self.session = listgen.fr.generate_session_pool()
+
+    def time_assign_list_types(self, num_ps):
+        listgen.assign_list_types(self.session, 4, 5, 17 - num_ps, num_ps)
+
+    def time_assign_multistim(self, num_ps):
+        # done here rather than in setup since list types are random
+        session = listgen.assign_list_types(self.session, 4, 6, 16 - num_ps, num_ps)
+        listgen.assign_multistim(session, {(0,): 5, (1,): 5, (0, 1): 6 - num_ps})
+
+
+class REC1:
+    def setup(self):
+        self.session = typed_session()
+        self.lures = wordpool.load("REC1_lures_en.txt")
+
+    def time_generate_rec1_blocks(self):
+        listgen.generate_rec1_blocks(self.session, self.lures.copy())
+
+    def peakmem_generate_rec1_blocks(self):
+        listgen.generate_rec1_blocks(self.session, self.lures.copy())
+
+
+class LEARN1:
+    params = [[2, 4, 8]]
+    param_names = ["num_blocks"]
+
+    def setup(self, num_blocks):
+        self.session = typed_session()
+
+    def time_generate_learn1_blocks(self, num_blocks):
+        listgen.generate_learn1_blocks(self.session, 2, 2, (0, 1), num_blocks)
+
+    def peakmem_generate_learn1_blocks(self, num_blocks):
+        listgen.generate_learn1_blocks(self.session, 2, 2, (0, 1), num_blocks)
+
+
+class CatFR:
+    params = [CAT_POOLS]
+    param_names = ["pool"]
+
+    def setup(self, pool):
+        seed()
+        self.words = cat_pool(pool)
+        self.assigned = listgen.catfr.assign_list_numbers(self.words)
+
+    def time_assign_list_numbers(self, pool):
+        listgen.catfr.assign_list_numbers(self.words)
+
+    def time_sort_pairs(self, pool):
+        listgen.catfr.sort_pairs(self.assigned)
+
+    def peakmem_sort_pairs(self, pool):
+        listgen.catfr.sort_pairs(self.assigned)
+
+
+class CatFRSession:
+    params = [["SP"]]
+    param_names = ["language"]
+
+    def setup(self, language):
+        seed()
+
+    def time_generate_session_pool(self, language):
+        listgen.catfr.generate_session_pool(language)
+
+    def peakmem_generate_session_pool(self, language):
+        listgen.catfr.generate_session_pool(language)
+
+
+class PAL:
+    params = [["EN", "SP"], [1, 4, 12]]
+    param_names = ["language", "n_sessions"]
+
+    def setup(self, language, n_sessions):
+        seed()
+
+    def time_generate_n_session_pairs(self, language, n_sessions):
+        listgen.pal.generate_n_session_pairs(n_sessions, language=language)
+
+    def peakmem_generate_n_session_pairs(self, language, n_sessions):
+        listgen.pal.generate_n_session_pairs(n_sessions, language=language)
+
+
+class Validate:
+    params = [[10, 1000]]
+    param_names = ["n_sessions"]
+
+    def setup(self, n_sessions):
+        try:
+            from wordpool.listgen.validate import validate
+        except ImportError:
+            raise NotImplementedError("not available in this version")
+        self.validate = validate
+        seed()
+        self.sessions = listgen.fr.generate_n_session_pools(n_sessions)
+
+    def time_validate(self, n_sessions):
+        self.validate(self.sessions)
+
+
+class Planner:
+    params = [["FR", "catFR"]]
+    param_names = ["experiment"]
+
+    def setup(self, experiment):
+        try:
+            from wordpool.listgen.planner import ExposurePlanner
+        except ImportError:
+            raise NotImplementedError("not available in this version")
+        self.planner = ExposurePlanner
+        self.language = "SP" if experiment == "catFR" else "EN"
+
+    def time_plan_sessions(self, experiment):
+        self.planner(experiment, language=self.language, rng=0).plan_sessions(24)
@@ -0,0 +1,114 @@
+"""Benchmarks for loading and transforming word pools."""
+
+import numpy as np
+
+import wordpool
+from wordpool import nopandas
+
+from .common import POOLS, CAT_POOLS, load_lists, seed
+
+
+class Load:
+    params = [POOLS]
+    param_names = ["pool"]
+
+    def time_load(self, pool):
+        wordpool.load(pool)
+
+    def peakmem_load(self, pool):
+        wordpool.load(pool)
+
+    def time_get_pool(self, pool):
+        # the first call parses the pool, later ones hit the cache
+        wordpool.get_pool(pool)
+
+
+class Shuffle:
+    params = [POOLS]
+    param_names = ["pool"]
+
+    def setup(self, pool):
+        seed()
+        self.words = load_lists(pool)
+
+    def time_shuffle_words(self, pool):
+        wordpool.shuffle_words(self.words)
+
+    def time_shuffle_within_lists(self, pool):
+        wordpool.shuffle_within_lists(self.words)
+
+    def peakmem_shuffle_within_lists(self, pool):
+        wordpool.shuffle_within_lists(self.words)
+
+
+class ShuffleWithinGroups:
+    params = [CAT_POOLS]
+    param_names = ["pool"]
+
+    def setup(self, pool):
+        seed()
+        self.words = wordpool.load(pool)
+
+    def time_shuffle_within_groups(self, pool):
+        wordpool.shuffle_within_groups(self.words, "category")
+
+    def peakmem_shuffle_within_groups(self, pool):
+        wordpool.shuffle_within_groups(self.words, "category")
+
+
+class Conversion:
+    params = [POOLS]
+    param_names = ["pool"]
+
+    def setup(self, pool):
+        self.words = load_lists(pool)
+        self.records = wordpool.pool_dataframe_to_pool_list(self.words)
+        self.n_lists = len(self.words) // 12
+
+    def time_assign_list_numbers(self, pool):
+        wordpool.assign_list_numbers(self.words, self.n_lists)
+
+    def time_dataframe_to_list(self, pool):
+        wordpool.pool_dataframe_to_pool_list(self.words)
+
+    def time_list_to_dataframe(self, pool):
+        wordpool.pool_list_to_pool_dataframe(self.records)
+
+
+class ExtractBlocks:
+    params = [[4, 16, 64], [1, 10]]
+    param_names = ["num_lists", "repetitions"]
+
+    def setup(self, num_lists, repetitions):
+        words = [{"word": str(i)} for i in range(12 * num_lists)]
+        self.pool = nopandas.assign_list_numbers_from_word_list(words, num_lists)
+        self.listnos = list(range(num_lists)) * repetitions
+
+    def time_extract_blocks(self, num_lists, repetitions):
+        nopandas.extract_blocks(self.pool, self.listnos, repetitions)
+
+    def peakmem_extract_blocks(self, num_lists, repetitions):
+        nopandas.extract_blocks(self.pool, self.listnos, repetitions)
+
+
+class Lexicon:
+    params = [[1000, 100000]]
+    param_names = ["n_words"]
+
+    def setup(self, n_words):
+        try:
+            from wordpool.lexicon import Lexicon
+        except ImportError:
+            raise NotImplementedError("not available in this version")
+        rng = np.random.default_rng(0)
+        words = np.array(["WORD{:d}".format(n) for n in range(n_words)], dtype=object)
+        words[:300] = wordpool.get_pool("ram_wordpool_en.txt").word.values[:300]
+        self.lexicon = Lexicon({"word": words, "syllables": rng.integers(1, 4, n_words),
+                                "recall": rng.random(n_words)})
+        self.lexicon.select(syllables=1, recall=(0, 1), exclude="ram_wordpool_en.txt")
+
+    def time_select(self, n_words):
+        self.lexicon.select(syllables=1, recall=(0.37, 0.69), exclude="ram_wordpool_en.txt")
+
+    def time_select_narrow(self, n_words):
+        self.lexicon.select(syllables=1, recall=(0.5, 0.501), exclude="ram_wordpool_en.txt")
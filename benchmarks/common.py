@@ -0,0 +1,45 @@
+"""Helpers shared by benchmarks."""
+
+import numpy as np
+
+import wordpool
+from wordpool import listgen
+
+#: Shipped word pools which benchmarks run against
+POOLS = [
+    "ram_wordpool_en.txt",
+    "ram_wordpool_sp.txt",
+    "ram_wordpool_de.txt",
+    "courier_wordpool_en.txt",
+]
+
+#: Shipped categorized pools (``ram_categorized_en.txt`` has no header)
+CAT_POOLS = [
+    "ram_categorized_sp.txt",
+    "ram_categorized_v2_sp.txt",
+]
+
+
+def seed():
+    """Seed the global random state so all commits get the same input."""
+    np.random.seed(0)
+
+
+def load_lists(filename, n_lists=12):
+    """Load a pool and split it into lists, dropping any words left over."""
+    words = wordpool.load(filename)
+    words = words.iloc[:len(words) // n_lists * n_lists]
+    return wordpool.assign_list_numbers(words, n_lists)
+
+
+def typed_session(num_baseline=4, num_nonstim=6, num_stim=16, num_ps=0):
+    """Return an FR session with list types and multistim assigned."""
+    seed()
+    session = listgen.fr.generate_session_pool()
+    session = listgen.assign_list_types(session, num_baseline, num_nonstim, num_stim, num_ps)
+    return listgen.assign_multistim(session, {(0,): 5, (1,): 5, (0, 1): num_stim - 10})
+
+
+def cat_pool(filename):
+    """Load a categorized pool with word numbers assigned."""
+    return listgen.catfr.assign_word_numbers(wordpool.load(filename))
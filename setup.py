@@ -8,6 +8,7 @@ setup(
     author="Michael V. DePalatis",
     author_email="depalati@sas.upenn.edu",
     packages=["wordpool"],
+    python_requires=">=3.9",
     package_data={
         "": ["*.txt", "*.json"]
     },
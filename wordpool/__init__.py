@@ -1,18 +1,27 @@
-import numpy as np
-import pandas as pd
+from ._lazy import np, pd
+from . import instrument
+from .columnar import WordPool
 from .nopandas import assign_list_numbers_from_word_list
-from pkg_resources import resource_filename, resource_listdir
+from .registry import get_pool  # noqa
+from .rng import get_rng
 
 
 __version__ = "0.5.dev0"
 
 
+def _data_files():
+    # importlib.resources pulls in pathlib and friends, so only import it
+    # when data files are actually needed
+    from importlib.resources import files
+    return files("wordpool.data")
+
+
 def list_available_pools():
     """Returns a list of the pools available in the `wordpool.data` package."""
-    files = resource_listdir("wordpool", "data")
-    return [f for f in files if f.endswith(".txt")]
+    return sorted(f.name for f in _data_files().iterdir() if f.name.endswith(".txt"))
 
 
+@instrument.timed("load")
 def load(filename, from_data_package=True):
     """Return contents of a word list.
 
@@ -22,12 +31,18 @@ def load(filename, from_data_package=True):
         path to load arbitrary wordpools from.
     :rtype: pd.DataFrame
 
+    Each call returns a private copy. Pools are compiled to a binary format
+    on first use and memory-mapped afterwards (see :mod:`wordpool.cache`).
+    Use :func:`get_pool` to get a cached, shared view instead.
+
     """
+    from . import cache
+
     if from_data_package:
-        src = resource_filename("wordpool.data", filename)
+        src = str(_data_files().joinpath(filename))
     else:
         src = filename
-    return pd.read_table(src)
+    return cache.load(src)
 
 
 def assign_list_numbers(df, n_lists, start=0):
@@ -41,40 +56,35 @@ def assign_list_numbers(df, n_lists, start=0):
     """
     assert len(df) % n_lists == 0
 
-    pool_list = pool_dataframe_to_pool_list(df)
-    pool_list = assign_list_numbers_from_word_list(pool_list, n_lists, start=start)
-    df = pool_list_to_pool_dataframe(pool_list)
-
-    return df
+    pool = WordPool.from_dataframe(df)
+    pool = assign_list_numbers_from_word_list(pool, n_lists, start=start)
+    return pool.to_dataframe()
 
 
+@instrument.timed("pool_dataframe_to_pool_list")
 def pool_dataframe_to_pool_list(pool_dataframe):
     """Covert a pandas dataframe to a list of dictionaries. For datafromes with
     word1 and word2 columns, make those a single tuple under the key 'word'.
+    The input frame is not modified.
 
     """
+    instrument.count("rows_converted", len(pool_dataframe))
     if 'word1' in pool_dataframe.columns and 'word2' in pool_dataframe.columns:
         word_pairs = pool_dataframe[['word1', 'word2']].values
-        del pool_dataframe['word1']
-        del pool_dataframe['word2']
-        if 'word' in pool_dataframe:
-            del pool_dataframe['word']
+        pool_dataframe = pool_dataframe.drop(columns=[c for c in ('word', 'word1', 'word2') if c in pool_dataframe])
         pool_dataframe.insert(0, 'word', [tuple(pair) for pair in word_pairs])
 
-    pool_list = [{} for _ in range(len(pool_dataframe))]
-    for column, values in pool_dataframe.iteritems():
-        for i in range(len(values)):
-            pool_list[i][column] = values[i]
-
-    return pool_list
+    return WordPool.from_dataframe(pool_dataframe).to_records()
 
 
+@instrument.timed("pool_list_to_pool_dataframe")
 def pool_list_to_pool_dataframe(pool_list):
     """Covert a list of dictionaries to a panda dataframe. For dictionaries with
     a 'word' entry that is a pair, convert that to two seperate columns called
     'word1' and 'word2'
 
     """
+    instrument.count("rows_converted", len(pool_list))
     pool_dataframe = pd.DataFrame()
     if len(pool_list) == 0:
         return pool_dataframe
@@ -90,46 +100,85 @@ def pool_list_to_pool_dataframe(pool_list):
     return pool_dataframe
 
 
-def shuffle_words(df):
+def shuffle_words(df, rng=None):
     """Shuffle words.
 
     :param pd.DataFrame df: Input word pool
+    :param rng: Random number generator or seed (see :func:`wordpool.rng.get_rng`).
     :returns: Shuffled pool
 
     """
-    shuffled = df.reindex(np.random.permutation(df.index))
+    shuffled = df.reindex(get_rng(rng).permutation(df.index))
     return shuffled.reset_index(drop=True)
 
 
-def shuffle_within_groups(df, column):
+@instrument.timed("shuffle_within_groups")
+def shuffle_within_groups(df, column, rng=None):
     """Shuffle within groups of words based on some common values in a column.
 
     :param pd.DataFrame df: Input word pool
     :param str column: Column name.
+    :param rng: Random number generator or seed (see :func:`wordpool.rng.get_rng`).
     :returns: Pool with groups shuffled.
 
     """
     if column not in df.columns:
         raise RuntimeError("Column {} not found in DataFrame".format(column))
 
-    shuffled = []
-    for col in df[column].unique():
-        list_ = df[df[column] == col]
-        shuffled.append(list_.reindex(np.random.permutation(list_.index)))
+    index = grouped_shuffle_index(df[column], rng=rng)
+    return df.iloc[index].reset_index(drop=True)
+
+
+def shuffle_within_groups_batch(df, column, n_sessions, rng=None):
+    """Shuffle within groups for many sessions at once.
+
+    :param pd.DataFrame df: Input word pool
+    :param str column: Column name.
+    :param int n_sessions: Number of shuffles.
+    :param rng: Random number generator or seed (see :func:`wordpool.rng.get_rng`).
+    :returns: ``(n_sessions, len(df))`` array where ``df.iloc[index[i]]`` is
+        what :func:`shuffle_within_groups` would return for session ``i``
+        (before resetting the index).
+    :rtype: np.ndarray
+
+    """
+    if column not in df.columns:
+        raise RuntimeError("Column {} not found in DataFrame".format(column))
+
+    return grouped_shuffle_index(df[column], n_sessions, rng=rng)
+
+
+def grouped_shuffle_index(groups, n_sessions=None, rng=None):
+    """Return row positions which shuffle rows within groups while keeping
+    the groups in the order they first appear.
 
-    return pd.concat(shuffled).reset_index(drop=True)
+    :param groups: Array-like of group values (e.g., categories).
+    :param int n_sessions: When given, return an index for this many
+        independent shuffles.
+    :param rng: Random number generator or seed (see :func:`wordpool.rng.get_rng`).
+    :returns: ``(len(groups),)`` or ``(n_sessions, len(groups))`` array.
+    :rtype: np.ndarray
+
+    """
+    # number groups by first appearance, then sort by group and a random key
+    # in one go
+    group_order, _ = pd.factorize(np.asarray(groups))
+    shape = (len(group_order),) if n_sessions is None else (n_sessions, len(group_order))
+    keys = get_rng(rng).random(shape)
+    return np.lexsort((keys, np.broadcast_to(group_order, shape)), axis=-1)
 
 
-def shuffle_within_lists(df):
+def shuffle_within_lists(df, rng=None):
     """Shuffle within lists in the pool (i.e., shuffle each list but do not
     move any words between lists. This requires that list
     numbers have alreay been assigned.
 
     :param pd.DataFrame df: Input word pool
+    :param rng: Random number generator or seed (see :func:`wordpool.rng.get_rng`).
     :returns: Pool with lists shuffled
 
     """
     if "listno" not in df.columns:
         raise RuntimeError("You must assign list numbers first.")
 
-    return shuffle_within_groups(df, "listno")
+    return shuffle_within_groups(df, "listno", rng=rng)
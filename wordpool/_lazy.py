@@ -0,0 +1,46 @@
+"""Deferred imports of heavy dependencies.
+
+Importing :mod:`pandas` (and to a lesser extent :mod:`numpy`) dominates the
+time it takes to import :mod:`wordpool`. Modules in this package refer to
+them through :class:`LazyModule` proxies so that the import only happens
+when a function actually needs them.
+
+"""
+
+import importlib
+
+
+class LazyModule(object):
+    """Proxy for a module which is imported on first attribute access.
+
+    :param str name: Fully qualified module name.
+
+    """
+    def __init__(self, name):
+        self.__dict__["_name"] = name
+        self.__dict__["_module"] = None
+
+    def _load(self):
+        module = self.__dict__["_module"]
+        if module is None:
+            module = importlib.import_module(self.__dict__["_name"])
+            self.__dict__["_module"] = module
+        return module
+
+    def __getattr__(self, attr):
+        return getattr(self._load(), attr)
+
+    def __setattr__(self, attr, value):
+        setattr(self._load(), attr, value)
+
+    def __dir__(self):
+        return dir(self._load())
+
+    def __repr__(self):
+        state = "loaded" if self.__dict__["_module"] is not None else "not loaded"
+        return "<lazy module {!r} ({:s})>".format(self.__dict__["_name"], state)
+
+
+np = LazyModule("numpy")
+npr = LazyModule("numpy.random")
+pd = LazyModule("pandas")
@@ -0,0 +1,316 @@
+"""Compiled word pool cache.
+
+Parsing a pool with :func:`pd.read_table` is comparatively slow, so
+:func:`wordpool.load` compiles each pool it parses into a directory of raw
+binary arrays: a fixed width table of all distinct strings and one array per
+column (codes into the string table for text columns, the values themselves
+for numeric ones), described by a ``meta.json`` file. Later loads
+memory-map these files instead of parsing the text again, which also lets
+processes share the OS's cached copy.
+
+Compiled pools are stored in ``$WORDPOOL_CACHE_DIR`` (``~/.cache/wordpool``
+by default) under a key made from the pool's path, modification time and
+size, so they are rebuilt whenever the source changes. Outdated versions of a
+pool are removed when it is compiled again, and :func:`prune` removes the
+pools whose source is gone. Pools which can't be compiled (e.g., because of
+missing values) are remembered, so they are parsed without being scanned
+again. Set ``WORDPOOL_NO_CACHE=1`` to always parse pools.
+
+"""
+
+from collections import OrderedDict
+import hashlib
+import json
+import mmap
+import os
+import os.path as osp
+import shutil
+import tempfile
+import threading
+import time
+
+from . import instrument
+from ._lazy import np, pd
+
+#: Version of the compiled format. Bumping it invalidates existing caches.
+FORMAT_VERSION = 1
+
+#: Suffix of the markers of pools which can't be compiled
+_SKIP = ".skip"
+
+#: Age in seconds after which leftovers of compilations are removed
+_STALE_TMP = 3600
+
+#: Number of decoded string tables kept per process
+_MAX_TABLES = 32
+
+_tables = OrderedDict()
+_tables_lock = threading.Lock()
+
+
+def cache_dir():
+    """Return the directory compiled pools are stored in."""
+    return os.environ.get("WORDPOOL_CACHE_DIR") or osp.join(osp.expanduser("~"), ".cache", "wordpool")
+
+
+def _digest(ident):
+    return hashlib.sha1(ident.encode("utf-8")).hexdigest()
+
+
+def cache_key(path):
+    """Return the key of the compiled version of the pool at ``path``. Keys
+    of all versions of a pool start with the same prefix, followed by a dash.
+
+    :raises OSError: when ``path`` doesn't exist.
+
+    """
+    stat = os.stat(path)
+    version = "{:d}|{:d}|{:d}".format(stat.st_mtime_ns, stat.st_size, FORMAT_VERSION)
+    return "{}-{}".format(_digest(osp.realpath(path)), _digest(version))
+
+
+def _remove(entry):
+    if osp.isdir(entry):
+        shutil.rmtree(entry, ignore_errors=True)
+    else:
+        try:
+            os.remove(entry)
+        except OSError:
+            pass
+
+
+def _evict(directory, key):
+    """Remove the other versions of the pool compiled under ``key``."""
+    prefix = key.split("-")[0] + "-"
+    try:
+        names = os.listdir(directory)
+    except OSError:
+        return
+    for name in names:
+        if name.startswith(prefix) and not name.startswith(key):
+            _remove(osp.join(directory, name))
+
+
+def prune():
+    """Remove compiled pools whose source no longer exists or has changed, as
+    well as leftovers of interrupted compilations.
+
+    :returns: The number of removed entries.
+
+    """
+    directory = cache_dir()
+    try:
+        names = os.listdir(directory)
+    except OSError:
+        return 0
+
+    removed = 0
+    for name in names:
+        entry = osp.join(directory, name)
+        if name.startswith(".tmp-"):
+            # leave compilations which may still be running alone
+            try:
+                stale = time.time() - os.stat(entry).st_mtime > _STALE_TMP
+            except OSError:
+                continue
+        else:
+            key = name[:-len(_SKIP)] if name.endswith(_SKIP) else name
+            source = _source(entry)
+            try:
+                stale = source is None or cache_key(source) != key
+            except OSError:
+                stale = True
+        if stale:
+            _remove(entry)
+            removed += 1
+    return removed
+
+
+def _source(entry):
+    """Return the path of the pool an entry was compiled from."""
+    try:
+        if entry.endswith(_SKIP):
+            with open(entry) as f:
+                return f.read() or None
+        with open(osp.join(entry, "meta.json")) as f:
+            return json.load(f).get("source")
+    except (OSError, ValueError):
+        return None
+
+
+def compile_pool(frame, dest, source=None):
+    """Write a pool to ``dest`` in the compiled format. The directory is
+    written under a temporary name and renamed when complete, so concurrent
+    readers never see a partial pool.
+
+    :param pd.DataFrame frame: Pool to compile.
+    :param str dest: Directory to create.
+    :param str source: Path of the pool's source, recorded for :func:`prune`.
+    :returns: False if the pool contains values other than strings and
+        numbers (e.g., missing values), True otherwise.
+
+    """
+    columns, strings = [], []
+    for name in frame.columns:
+        values = frame[name].to_numpy()
+        if values.dtype == object:
+            if not all(isinstance(value, str) for value in values):
+                return False
+            columns.append({"name": name, "kind": "str", "offset": len(strings)})
+            strings.extend(values)
+        elif values.dtype.kind in "biuf":
+            columns.append({"name": name, "kind": "array"})
+        else:
+            return False
+
+    codes, table = pd.factorize(np.array(strings, dtype=object))
+    table = np.array(table, dtype=str)
+
+    parent = osp.dirname(dest)
+    os.makedirs(parent, exist_ok=True)
+    tmp = tempfile.mkdtemp(dir=parent, prefix=".tmp-")
+    try:
+        table.tofile(osp.join(tmp, "strings.bin"))
+        for i, column in enumerate(columns):
+            if column["kind"] == "str":
+                offset = column.pop("offset")
+                values = codes[offset:offset + len(frame)].astype(np.int32)
+            else:
+                values = frame[column["name"]].to_numpy()
+            column["dtype"] = values.dtype.str
+            values.tofile(osp.join(tmp, "{:d}.bin".format(i)))
+
+        with open(osp.join(tmp, "meta.json"), "w") as f:
+            json.dump({"version": FORMAT_VERSION, "length": len(frame), "strings": table.dtype.str,
+                       "columns": columns, "source": source}, f)
+
+        try:
+            os.rename(tmp, dest)
+        except OSError:
+            # another process got there first
+            if not osp.isdir(dest):
+                raise
+    finally:
+        shutil.rmtree(tmp, ignore_errors=True)
+    return True
+
+
+def map_array(path, dtype):
+    """Map a file of raw binary data as a copy-on-write array.
+
+    :func:`np.load` and :class:`np.memmap` are comparatively slow for small
+    files, so the data is mapped directly.
+
+    :param str path: File to map.
+    :param dtype: Data type of the array.
+    :rtype: np.ndarray
+
+    """
+    with open(path, "rb") as f:
+        if os.fstat(f.fileno()).st_size == 0:
+            return np.empty(0, dtype=dtype)
+        buffer = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_COPY)
+    return np.frombuffer(buffer, dtype=dtype)
+
+
+def decode(table, codes):
+    """Return the strings ``codes`` refer to as an object array.
+
+    Only the distinct codes are converted to Python strings (once each), so
+    callers can keep the codes and a mapped table and decode just the values
+    they hand out.
+
+    :param np.ndarray table: Fixed width string table.
+    :param np.ndarray codes: Indices into ``table``. Code -1 decodes to a
+        missing value.
+    :rtype: np.ndarray
+
+    """
+    used, inverse = np.unique(codes, return_inverse=True)
+    strings = np.full(len(used), np.nan, dtype=object)
+    valid = used >= 0
+    strings[valid] = table[used[valid]].tolist()
+    return strings[inverse].reshape(np.shape(codes))
+
+
+def _string_table(src, dtype):
+    """Return the decoded string table of a compiled pool. Compiled pools never
+    change (a changed source gets a new key), so tables are decoded once per
+    process rather than on every load.
+
+    """
+    with _tables_lock:
+        table = _tables.pop(src, None)
+    if table is None:
+        table = np.array(map_array(osp.join(src, "strings.bin"), dtype).tolist(), dtype=object)
+    with _tables_lock:
+        _tables[src] = table
+        while len(_tables) > _MAX_TABLES:
+            _tables.popitem(last=False)
+    return table
+
+
+def load_compiled(src):
+    """Load a compiled pool.
+
+    Arrays are mapped copy-on-write, so the returned frame can be modified
+    without affecting the compiled pool. Strings are shared with earlier loads
+    of the same pool.
+
+    :param str src: Directory written by :func:`compile_pool`.
+    :rtype: pd.DataFrame
+
+    """
+    with open(osp.join(src, "meta.json")) as f:
+        meta = json.load(f)
+
+    columns = {}
+    for i, column in enumerate(meta["columns"]):
+        values = map_array(osp.join(src, "{:d}.bin".format(i)), column["dtype"])
+        if column["kind"] == "str":
+            values = _string_table(src, meta["strings"])[values]
+        columns[column["name"]] = values
+
+    return pd.DataFrame(columns, index=pd.RangeIndex(meta["length"]), copy=False)
+
+
+def load(path):
+    """Load the pool at ``path``, compiling it first if there is no up to date
+    compiled version yet. Pools which can't be compiled or cached are parsed
+    as usual.
+
+    :param str path: Path to a tab-separated word pool.
+    :rtype: pd.DataFrame
+
+    """
+    if os.environ.get("WORDPOOL_NO_CACHE"):
+        instrument.count("cache.disabled")
+        return pd.read_table(path)
+
+    try:
+        dest = osp.join(cache_dir(), cache_key(path))
+    except OSError:
+        # e.g., the pool lives in a zip file
+        instrument.count("cache.disabled")
+        return pd.read_table(path)
+
+    if osp.isdir(dest):
+        instrument.count("cache.hits")
+        return load_compiled(dest)
+    if osp.isfile(dest + _SKIP):
+        instrument.count("cache.skipped")
+        return pd.read_table(path)
+
+    instrument.count("cache.misses")
+
+    frame = pd.read_table(path)
+    try:
+        os.makedirs(osp.dirname(dest), exist_ok=True)
+        if not compile_pool(frame, dest, osp.realpath(path)):
+            with open(dest + _SKIP, "w") as f:
+                f.write(osp.realpath(path))
+        _evict(osp.dirname(dest), osp.basename(dest))
+    except OSError:
+        # a read-only cache directory shouldn't keep anyone from loading pools
+        pass
+    return frame
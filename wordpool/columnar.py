@@ -0,0 +1,211 @@
+"""Columnar word pools.
+
+A :class:`WordPool` stores a word pool as a set of equally long NumPy arrays
+(one per column) rather than one dictionary per word. The functions in
+:mod:`wordpool.nopandas` accept either representation.
+
+"""
+
+from collections import OrderedDict
+
+from ._lazy import np, pd
+
+
+def as_column(values, length=None):
+    """Convert ``values`` to a 1D array suitable as a pool column.
+
+    Sequences of tuples (such as stim channels) are stored as object arrays
+    of tuples rather than 2D arrays. Scalars are repeated ``length`` times.
+
+    """
+    if isinstance(values, np.ndarray) and values.ndim == 1:
+        return values
+
+    if isinstance(values, (list, np.ndarray)):
+        column = np.empty(len(values), dtype=object)
+        if any(isinstance(value, (tuple, list)) for value in values):
+            for i, value in enumerate(values):
+                column[i] = value
+            return column
+
+        column[:] = values
+        if all(isinstance(value, (bool, int, float, np.number)) for value in values):
+            # numbers are stored natively, strings stay Python objects like
+            # they do in pandas
+            column = np.array(values)
+        return column
+
+    # scalar
+    assert length is not None, "A length is required for scalar values"
+    if isinstance(values, (bool, int, float, np.number)):
+        return np.full(length, values)
+    column = np.empty(length, dtype=object)
+    column.fill(values)
+    return column
+
+
+class WordPool(object):
+    """Struct-of-arrays word pool.
+
+    Columns are NumPy arrays which are never modified in place: assigning a
+    column replaces the array, so arrays shared with other pools or with a
+    :class:`pd.DataFrame` stay untouched.
+
+    :param dict columns: Mapping of column names to values.
+    :param int length: Number of words. Only required when there are no
+        columns.
+
+    """
+    __slots__ = ("_columns", "_length")
+
+    def __init__(self, columns=None, length=None):
+        self._columns = OrderedDict()
+        self._length = length
+        for name, values in (columns or {}).items():
+            self[name] = values
+
+    @classmethod
+    def from_dataframe(cls, df):
+        """Create a pool from a frame. Columns are views of the frame's data
+        whenever pandas allows it.
+
+        """
+        columns = OrderedDict((name, df[name].to_numpy()) for name in df.columns)
+        return cls(columns, length=len(df))
+
+    @classmethod
+    def from_records(cls, records):
+        """Create a pool from a list of dictionaries (the
+        :mod:`wordpool.nopandas` representation).
+
+        """
+        names = OrderedDict()
+        for record in records:
+            names.update((name, None) for name in record)
+        columns = OrderedDict((name, as_column([record.get(name) for record in records])) for name in names)
+        return cls(columns, length=len(records))
+
+    @classmethod
+    def concat(cls, pools):
+        """Concatenate pools with the same columns."""
+        pools = list(pools)
+        names = pools[0].columns
+        columns = OrderedDict((name, np.concatenate([pool[name] for pool in pools])) for name in names)
+        return cls(columns, length=sum(len(pool) for pool in pools))
+
+    @property
+    def columns(self):
+        return list(self._columns)
+
+    def __len__(self):
+        return self._length or 0
+
+    def __contains__(self, name):
+        return name in self._columns
+
+    def __getitem__(self, name):
+        return self._columns[name]
+
+    def __setitem__(self, name, values):
+        column = as_column(values, self._length)
+        if self._length is None:
+            self._length = len(column)
+        assert len(column) == self._length, "Column {} has the wrong length".format(name)
+        self._columns[name] = column
+
+    def __delitem__(self, name):
+        del self._columns[name]
+
+    def __repr__(self):
+        return "<WordPool ({:d} words): {}>".format(len(self), ", ".join(self._columns))
+
+    def take(self, indices):
+        """Return a new pool with the words at the given positions."""
+        indices = np.asarray(indices, dtype=np.intp)
+        columns = OrderedDict((name, values[indices]) for name, values in self._columns.items())
+        return WordPool(columns, length=len(indices))
+
+    def to_dataframe(self):
+        """Convert to a :class:`pd.DataFrame`."""
+        return pd.DataFrame(OrderedDict(self._columns), index=pd.RangeIndex(len(self)), copy=False)
+
+    def to_records(self):
+        """Convert to a list of dictionaries."""
+        names = self.columns
+        rows = zip(*[self._columns[name].tolist() for name in names])
+        return [dict(zip(names, row)) for row in rows]
+
+
+def assign_list_numbers(pool, number_of_lists, start=0):
+    """Columnar implementation of
+    :func:`wordpool.nopandas.assign_list_numbers_from_word_list`.
+
+    """
+    pool["listno"] = np.arange(len(pool)) // (len(pool) // number_of_lists) + start
+    return pool
+
+
+def assign_list_types(pool, num_baseline, stim_nonstim, num_ps=0):
+    """Columnar implementation of
+    :func:`wordpool.nopandas.assign_list_types_from_type_list`.
+
+    """
+    types = np.array(["BASELINE"] * num_baseline + ["PS"] * num_ps + list(stim_nonstim), dtype=object)
+    phase_types = types[pool["listno"]]
+    pool["phase_type"] = phase_types
+
+    stim_channels = as_column(None, len(pool))
+    stim_channels[phase_types == "STIM"] = as_column((0,), 1)
+    pool["stim_channels"] = stim_channels
+    return pool
+
+
+def assign_stim_attribute(pool, attribute_list, attribute_name):
+    """Columnar implementation of
+    :func:`wordpool.nopandas._assign_stim_attribute_from_stim_attribute_list`.
+
+    """
+    stim = np.flatnonzero(pool["phase_type"] == "STIM")
+    stim_listnos = pool["listno"][stim]
+    assert len(np.unique(stim_listnos)) == len(attribute_list), \
+        "The number of attributes should be the same as the number of stim lists."
+
+    # move on to the next attribute whenever the stim list number changes
+    changes = np.r_[True, stim_listnos[1:] != stim_listnos[:-1]]
+    attributes = as_column(list(attribute_list))
+
+    if attribute_name in pool:
+        values = pool[attribute_name].astype(object)
+    else:
+        values = as_column(None, len(pool))
+    values[stim] = attributes[np.cumsum(changes) - 1]
+    pool[attribute_name] = values
+    return pool
+
+
+def block_indices(pool, listnos, num_blocks):
+    """Columnar implementation of :func:`wordpool.nopandas.block_indices`."""
+    # group words by list number once, keeping their order within lists
+    order = np.argsort(pool["listno"], kind="stable")
+    sorted_listnos = pool["listno"][order]
+    starts = np.searchsorted(sorted_listnos, listnos, side="left")
+    ends = np.searchsorted(sorted_listnos, listnos, side="right")
+    if (starts == ends).any():
+        raise KeyError("No words in lists {}".format(np.asarray(listnos)[starts == ends].tolist()))
+
+    # positions of all words of the requested lists via a running offset
+    # into the sorted order
+    lengths = ends - starts
+    block_listnos = np.repeat(np.arange(len(listnos)), lengths)
+    offsets = np.arange(lengths.sum()) - np.repeat(np.cumsum(lengths) - lengths, lengths)
+    index = order[np.repeat(starts, lengths) + offsets]
+    return index, block_listnos // num_blocks, block_listnos
+
+
+def extract_blocks(pool, listnos, num_blocks):
+    """Columnar implementation of :func:`wordpool.nopandas.extract_blocks`."""
+    index, blocknos, block_listnos = block_indices(pool, listnos, num_blocks)
+    blocks = pool.take(index)
+    blocks["blockno"] = blocknos
+    blocks["block_listno"] = block_listnos
+    return blocks
@@ -1,2 +1,26 @@
 class LanguageError(Exception):
     """Used when an invalid language is requested."""
+
+
+class ListAssignmentError(Exception):
+    """Used when words cannot be assigned to lists with the requested
+    parameters.
+
+    """
+
+
+class BankExhaustedError(Exception):
+    """Used when every session in a session bank has been drawn."""
+
+
+class ServerError(Exception):
+    """Used when a session server cannot serve a request.
+
+    :param int status: HTTP status code.
+    :param str message: Error message of the server.
+
+    """
+    def __init__(self, status, message):
+        super(ServerError, self).__init__("{:d}: {}".format(status, message))
+        self.status = status
+        self.message = message
@@ -0,0 +1,201 @@
+"""Optional instrumentation of list generation.
+
+Hot paths of :mod:`wordpool` and :mod:`wordpool.listgen` are wrapped in named
+stages (e.g., ``catfr.sort_pairs`` or ``pipeline.multistim``) and update
+counters (e.g., ``rows_converted`` or ``cache.misses``). Instrumentation is
+off by default, in which case a stage costs a single flag check. Turn it on
+with :func:`enable` or by setting ``WORDPOOL_INSTRUMENT=1`` (or
+``WORDPOOL_INSTRUMENT=memory`` to also sample memory)::
+
+    from wordpool import instrument
+
+    instrument.enable(memory=True)
+    listgen.catfr.generate_session_pool(language="SP")
+    print(instrument.stats())
+
+Memory sampling uses :mod:`tracemalloc`, which slows down everything while it
+runs. The peak of a stage includes the peaks of the stages nested in it.
+:mod:`tracemalloc` only tracks the peak of the whole process, so memory is
+only sampled in the thread which called :func:`enable`. Stages running in
+other threads are timed but have no memory statistics, and allocations of
+other threads still count towards the sampled stages.
+
+"""
+
+from contextlib import nullcontext
+from functools import wraps
+import os
+import threading
+import time
+
+
+class _State(object):
+    enabled = False
+    memory = False
+    callback = None
+    # thread sampling memory, and whether enable started tracemalloc
+    memory_thread = None
+    started_tracing = False
+
+
+_state = _State()
+_lock = threading.Lock()
+_local = threading.local()
+_timers = {}
+_counters = {}
+_memory = {}
+_null = nullcontext()
+
+
+def enable(memory=False, callback=None):
+    """Start collecting statistics.
+
+    :param bool memory: Also record allocations and peak memory of each stage
+        running in the calling thread (starts :mod:`tracemalloc` if needed).
+    :param callable callback: Called with a dictionary describing each
+        completed stage (``kind`` ``"stage"``, ``name``, ``elapsed`` and, with
+        ``memory``, ``allocated`` and ``peak`` in bytes) and each counter update
+        (``kind`` ``"counter"``, ``name``, ``n``).
+
+    """
+    if memory:
+        import tracemalloc
+        if not tracemalloc.is_tracing():
+            tracemalloc.start()
+            _state.started_tracing = True
+        _state.memory_thread = threading.get_ident()
+    _state.memory = memory
+    _state.callback = callback
+    _state.enabled = True
+
+
+def disable():
+    """Stop collecting statistics. Collected statistics are kept until
+    :func:`reset` is called. :mod:`tracemalloc` is only stopped if
+    :func:`enable` started it.
+
+    """
+    _state.enabled = False
+    if _state.started_tracing:
+        import tracemalloc
+        tracemalloc.stop()
+        _state.started_tracing = False
+    _state.memory = False
+    _state.memory_thread = None
+    _state.callback = None
+
+
+def is_enabled():
+    """Return True if statistics are being collected."""
+    return _state.enabled
+
+
+def reset():
+    """Discard all collected statistics."""
+    with _lock:
+        _timers.clear()
+        _counters.clear()
+        _memory.clear()
+
+
+def stats():
+    """Return a snapshot of the collected statistics.
+
+    :returns: Dictionary with ``timers`` (``calls``, ``total`` and ``max``
+        seconds per stage), ``counters`` and ``memory`` (maximum
+        ``allocated`` and ``peak`` bytes per stage).
+    :rtype: dict
+
+    """
+    with _lock:
+        return {
+            "timers": {name: dict(zip(("calls", "total", "max"), values)) for name, values in _timers.items()},
+            "counters": dict(_counters),
+            "memory": {name: dict(zip(("allocated", "peak"), values)) for name, values in _memory.items()},
+        }
+
+
+def count(name, n=1):
+    """Add ``n`` to counter ``name``."""
+    if not _state.enabled:
+        return
+    with _lock:
+        _counters[name] = _counters.get(name, 0) + n
+    if _state.callback is not None:
+        _state.callback({"kind": "counter", "name": name, "n": n})
+
+
+class _Stage(object):
+    __slots__ = ("name", "t0", "frame")
+
+    def __init__(self, name):
+        self.name = name
+
+    def __enter__(self):
+        # reset_peak affects the whole process, so only one thread samples
+        if _state.memory and threading.get_ident() == _state.memory_thread:
+            import tracemalloc
+            stack = getattr(_local, "stack", None)
+            if stack is None:
+                stack = _local.stack = []
+            current, peak = tracemalloc.get_traced_memory()
+            if stack:
+                # keep the enclosing stage's peak before resetting it
+                stack[-1][1] = max(stack[-1][1], peak)
+            tracemalloc.reset_peak()
+            self.frame = [current, current]
+            stack.append(self.frame)
+        else:
+            self.frame = None
+        self.t0 = time.perf_counter()
+        return self
+
+    def __exit__(self, *args):
+        elapsed = time.perf_counter() - self.t0
+        event = {"kind": "stage", "name": self.name, "elapsed": elapsed}
+
+        if self.frame is not None:
+            import tracemalloc
+            current, peak = tracemalloc.get_traced_memory()
+            stack = _local.stack
+            stack.pop()
+            start, top = self.frame[0], max(self.frame[1], peak)
+            if stack:
+                stack[-1][1] = max(stack[-1][1], top)
+            event.update(allocated=current - start, peak=top - start)
+
+        with _lock:
+            calls, total, longest = _timers.get(self.name, (0, 0., 0.))
+            _timers[self.name] = (calls + 1, total + elapsed, max(longest, elapsed))
+            if self.frame is not None:
+                allocated, peak = _memory.get(self.name, (0, 0))
+                _memory[self.name] = (max(allocated, event["allocated"]), max(peak, event["peak"]))
+
+        if _state.callback is not None:
+            _state.callback(event)
+        return False
+
+
+def stage(name):
+    """Return a context manager timing a stage (a shared no-op context when
+    disabled).
+
+    """
+    return _Stage(name) if _state.enabled else _null
+
+
+def timed(name):
+    """Decorator running a function as a stage."""
+    def decorator(func):
+        @wraps(func)
+        def wrapper(*args, **kwargs):
+            if not _state.enabled:
+                return func(*args, **kwargs)
+            with _Stage(name):
+                return func(*args, **kwargs)
+        return wrapper
+    return decorator
+
+
+if os.environ.get("WORDPOOL_INSTRUMENT"):
+    enable(memory=os.environ["WORDPOOL_INSTRUMENT"] == "memory")
@@ -0,0 +1,342 @@
+"""Lexical attribute queries.
+
+A :class:`Lexicon` holds words together with attribute columns (e.g.,
+syllable counts or recall probabilities from earlier studies) and answers
+queries combining equality, membership and range conditions with exclusion
+of other pools. Replacement words for the FR pool (see
+``docs/wordpool_update.md``) could be selected with::
+
+    lexicon = Lexicon(wordpool.load("/path/to/ltpfr2_words.txt", False))
+    words = lexicon.query(syllables=1, recall=(0.37, 0.69),
+                          exclude=["ram_wordpool_en.txt", "ram_categorized_en.txt"],
+                          order_by="recall", ascending=False)
+
+Columns are indexed on first use: a sorted index (an argsort of the column)
+answers range conditions with two binary searches and a hash index (rows
+grouped by value) answers equality and membership conditions. A query
+materializes the rows of its most selective condition and checks the others
+only on those rows, so queries take microseconds even for lexicons with
+hundreds of thousands of words.
+
+"""
+
+import threading
+
+from ._lazy import np, pd
+from .columnar import WordPool
+
+# Lookups of fewer values go through a dictionary instead of pandas
+_SMALL = 64
+
+
+class _SortedIndex(object):
+    """Rows of a column ordered by value, with rows of missing values last.
+    Only present values are searched.
+
+    """
+    def __init__(self, values):
+        missing = pd.isnull(values)
+        present = np.flatnonzero(~missing)
+        order = present[np.argsort(values[present], kind="stable")]
+        self.values = values[order]
+        self.n_present = len(order)
+        self.order = np.concatenate([order, np.flatnonzero(missing)]) if missing.any() else order
+        self._ranks = None
+
+    @property
+    def ranks(self):
+        """Position of each row in the index."""
+        if self._ranks is None:
+            ranks = np.empty(len(self.order), dtype=np.int64)
+            ranks[self.order] = np.arange(len(self.order))
+            self._ranks = ranks
+        return self._ranks
+
+    def bounds(self, low, high):
+        start = 0 if low is None else np.searchsorted(self.values, low, side="left")
+        stop = self.n_present if high is None else np.searchsorted(self.values, high, side="right")
+        return start, max(start, stop)
+
+
+class _HashIndex(object):
+    """Rows of a column grouped by value. Rows of missing values have a code
+    of -1 and are in no group.
+
+    """
+    def __init__(self, values):
+        codes, uniques = pd.factorize(values)
+        self.codes = codes
+        self.values = pd.Index(uniques)
+        self.order = np.argsort(codes, kind="stable")
+        self.starts = np.searchsorted(codes[self.order], np.arange(len(uniques) + 1))
+        self._positions = None
+
+    def lookup(self, values):
+        """Return the codes of values present in the column."""
+        if len(values) < _SMALL:
+            if self._positions is None:
+                self._positions = dict(zip(self.values.tolist(), range(len(self.values))))
+            positions = self._positions
+            return np.array([positions[value] for value in values if value in positions], dtype=np.int64)
+        found = self.values.get_indexer(values)
+        return found[found >= 0]
+
+
+class _Condition(object):
+    """A condition on one column with an estimate of the number of matching
+    rows.
+
+    """
+    def __init__(self, estimate, rows, mask):
+        self.estimate = estimate
+        self.rows = rows
+        self.mask = mask
+
+
+class Lexicon(object):
+    """Words with attribute columns and indexes over them.
+
+    :param pool: Words and their attributes as a :class:`pd.DataFrame`, a
+        :class:`wordpool.columnar.WordPool` or a dictionary of columns.
+        Duplicate words are allowed.
+    :param str word_column: Name of the column holding the words.
+
+    """
+    def __init__(self, pool, word_column="word"):
+        if isinstance(pool, pd.DataFrame):
+            columns = {name: pool[name].to_numpy() for name in pool.columns}
+        elif isinstance(pool, WordPool):
+            columns = {name: pool[name] for name in pool.columns}
+        else:
+            columns = {name: np.asarray(values) for name, values in pool.items()}
+        if word_column not in columns:
+            raise KeyError("Lexicon has no {} column".format(word_column))
+
+        self.columns = columns
+        self.word_column = word_column
+        self._sorted = {}
+        self._hashed = {}
+        self._excluded = {}
+        self._lock = threading.Lock()
+
+    def __len__(self):
+        return len(self.columns[self.word_column])
+
+    def __contains__(self, word):
+        return len(self.hash_index(self.word_column).lookup([word])) > 0
+
+    def __repr__(self):
+        return "<Lexicon: {:d} words, columns {}>".format(len(self), ", ".join(self.columns))
+
+    def _column(self, name):
+        try:
+            return self.columns[name]
+        except KeyError:
+            raise KeyError("Lexicon has no {} column".format(name))
+
+    def sorted_index(self, name):
+        """Return the sorted index of a column, building it on first use."""
+        index = self._sorted.get(name)
+        if index is None:
+            index = _SortedIndex(self._column(name))
+            with self._lock:
+                self._sorted[name] = index
+        return index
+
+    def hash_index(self, name):
+        """Return the hash index of a column, building it on first use."""
+        index = self._hashed.get(name)
+        if index is None:
+            index = _HashIndex(self._column(name))
+            with self._lock:
+                self._hashed[name] = index
+        return index
+
+    def _range(self, name, low, high):
+        index = self.sorted_index(name)
+        start, stop = index.bounds(low, high)
+        values = self.columns[name]
+
+        def mask(rows):
+            selected = values[rows]
+            # missing values are out of any range, as in the sorted index
+            keep = ~pd.isnull(selected)
+            if low is not None:
+                keep &= selected >= low
+            if high is not None:
+                keep &= selected <= high
+            return keep
+
+        return _Condition(stop - start, lambda: np.sort(index.order[start:stop]), mask)
+
+    def _isin(self, name, wanted):
+        index = self.hash_index(name)
+        found = index.lookup(wanted)
+        starts, stops = index.starts[found], index.starts[found + 1]
+        # the last entry is looked up for missing values (code -1)
+        table = np.zeros(len(index.values) + 1, dtype=bool)
+        table[found] = True
+
+        def rows():
+            if len(starts) <= 1:
+                return index.order[starts[0]:stops[0]] if len(starts) else index.order[:0]
+            return np.sort(np.concatenate([index.order[start:stop] for start, stop in zip(starts, stops)]))
+
+        return _Condition(int((stops - starts).sum()), rows, lambda rows: table[index.codes[rows]])
+
+    def _exclusion(self, exclude):
+        """Return the condition leaving out words of pools."""
+        from . import get_pool, list_available_pools
+
+        if isinstance(exclude, (str, pd.DataFrame, WordPool)):
+            exclude = [exclude]
+
+        pools = list_available_pools()
+        words = self.hash_index(self.word_column)
+        # the last entry is looked up for missing words (code -1)
+        keep = np.ones(len(words.values) + 1, dtype=bool)
+        loose = []
+        for source in exclude:
+            if isinstance(source, str) and (source in pools or source.endswith(".txt")):
+                # shipped pools don't change, so their codes are kept
+                found = self._excluded.get(source)
+                if found is None:
+                    found = words.lookup(get_pool(source)["word"].to_numpy())
+                    with self._lock:
+                        self._excluded[source] = found
+            elif isinstance(source, str):
+                loose.append(source)
+                continue
+            elif isinstance(source, (pd.DataFrame, WordPool)):
+                found = words.lookup(np.asarray(source["word"]))
+            else:
+                found = words.lookup(list(source))
+            keep[found] = False
+        if loose:
+            keep[words.lookup(loose)] = False
+
+        return _Condition(len(self), lambda: np.flatnonzero(keep[words.codes]),
+                          lambda rows: keep[words.codes[rows]])
+
+    def select(self, exclude=None, order_by=None, ascending=True, limit=None, **conditions):
+        """Return the rows of words matching all conditions.
+
+        :param exclude: Words to leave out: a pool (frame or
+            :class:`wordpool.columnar.WordPool`), the filename of a pool in
+            ``wordpool.data`` or a list of pools, filenames, words or
+            sequences of words. Strings are taken as filenames if they end
+            in ``.txt`` or name a shipped pool, and as words otherwise.
+        :param str order_by: Column to sort the results by, with missing
+            values last in either order. Otherwise, rows are returned in
+            lexicon order.
+        :param bool ascending: Sort order.
+        :param int limit: Maximum number of rows to return.
+        :param conditions: Conditions on columns, given as a value (equality),
+            a list or set of values (membership) or a ``(low, high)`` tuple
+            (inclusive range, with None for an open end). Rows with missing
+            values never match a range.
+        :rtype: np.ndarray
+
+        """
+        plan = []
+        for name, condition in conditions.items():
+            if isinstance(condition, tuple):
+                low, high = condition
+                plan.append(self._range(name, low, high))
+            elif isinstance(condition, (list, set, frozenset, np.ndarray)):
+                plan.append(self._isin(name, list(condition)))
+            else:
+                plan.append(self._isin(name, [condition]))
+        if exclude is not None:
+            plan.append(self._exclusion(exclude))
+
+        if not plan:
+            rows = np.arange(len(self))
+        else:
+            # Start from the most selective condition and check the others on
+            # its rows only
+            plan.sort(key=lambda condition: condition.estimate)
+            rows = plan[0].rows()
+            for condition in plan[1:]:
+                if not len(rows):
+                    break
+                rows = rows[condition.mask(rows)]
+
+        if order_by is not None:
+            rows = self._order(rows, order_by, ascending, limit)
+        return rows[:limit] if limit is not None else rows
+
+    def _order(self, rows, name, ascending, limit):
+        """Sort rows by the ranks of a column's sorted index."""
+        index = self.sorted_index(name)
+        if limit is None and len(rows) > len(self) // 16:
+            # walk the index instead of sorting many rows
+            selected = np.zeros(len(self), dtype=bool)
+            selected[rows] = True
+            present, missing = index.order[:index.n_present], index.order[index.n_present:]
+            present = present[selected[present]]
+            if not len(missing):
+                return present if ascending else present[::-1]
+            missing = missing[selected[missing]]
+            return np.concatenate([present if ascending else present[::-1], missing])
+
+        ranks = index.ranks[rows]
+        if not ascending:
+            # reverse present values only
+            ranks = np.where(ranks < index.n_present, index.n_present - 1 - ranks, ranks)
+        if limit is not None and 0 < limit < len(rows):
+            top = np.argpartition(ranks, limit - 1)[:limit]
+            return rows[top[np.argsort(ranks[top])]]
+        return rows[np.argsort(ranks)]
+
+    def count(self, **kwargs):
+        """Return the number of words matching a query (see :meth:`select`)."""
+        return len(self.select(**kwargs))
+
+    def words(self, **kwargs):
+        """Return the words matching a query (see :meth:`select`).
+
+        :rtype: np.ndarray
+
+        """
+        return self.columns[self.word_column][self.select(**kwargs)]
+
+    def query(self, columns=None, **kwargs):
+        """Return the words matching a query (see :meth:`select`) with their
+        attributes as a new pool.
+
+        :param list columns: Columns to include (default: all).
+        :rtype: pd.DataFrame
+
+        """
+        rows = self.select(**kwargs)
+        names = list(self.columns) if columns is None else columns
+        frame = pd.DataFrame({name: self._column(name)[rows] for name in names})
+        if self.word_column in frame and self.word_column != "word" and "word" not in frame:
+            frame = frame.rename(columns={self.word_column: "word"})
+        return frame
+
+    def attributes(self, pool, columns=None):
+        """Add the attributes of the words of a pool as columns. Words which
+        aren't in the lexicon get missing values. For duplicate words, the
+        attributes of the first occurrence are used.
+
+        :param pd.DataFrame pool: Pool with a ``word`` column. It is not
+            modified.
+        :param list columns: Attribute columns to add (default: all).
+        :returns: A copy of the pool with attribute columns.
+        :rtype: pd.DataFrame
+
+        """
+        names = [name for name in (columns or self.columns) if name != self.word_column]
+        # the index keeps rows of the same word in order
+        words = self.hash_index(self.word_column)
+        codes = words.values.get_indexer(np.asarray(pool["word"]))
+        found = codes >= 0
+        rows = words.order[words.starts[np.where(found, codes, 0)]]
+
+        attributes = {}
+        for name in names:
+            values = pd.Series(self._column(name)[np.where(found, rows, 0)])
+            attributes[name] = values.where(found).to_numpy()
+        return pool.assign(**attributes)
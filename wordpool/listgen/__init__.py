@@ -1,24 +1,26 @@
 """List generation and I/O."""
 
-import random
 import os.path as osp
-import numpy.random as npr
-import pandas as pd
 
-from .. import load, pool_dataframe_to_pool_list, pool_list_to_pool_dataframe, exc
-from ..nopandas import assign_list_types_from_type_list, assign_multistim_from_stim_channels_list, extract_blocks
-from . import fr, catfr, pal  # noqa
-
-RAM_LIST_EN = load("ram_wordpool_en.txt")
-RAM_LIST_SP = load("ram_wordpool_sp.txt")
-
-CAT_LIST_EN = load("ram_categorized_en.txt")
-CAT_LIST_SP = load("ram_categorized_sp.txt")
-
-PRACTICE_LIST_EN = load("practice_en.txt")
-PRACTICE_LIST_SP = load("practice_sp.txt")
-
-LURES_LIST_EN = load("REC1_lures_en.txt")
+from .. import exc, instrument
+from .._lazy import np, pd
+from ..columnar import WordPool
+from ..registry import lazy_pools
+from ..rng import get_rng
+from . import fr, catfr, pal, pipeline, export, bank  # noqa
+from .cohort import generate_cohort  # noqa
+from .export import export_cohort  # noqa
+
+# Pools such as RAM_LIST_EN are loaded on first access
+__getattr__ = lazy_pools(__name__, {
+    "RAM_LIST_EN": "ram_wordpool_en.txt",
+    "RAM_LIST_SP": "ram_wordpool_sp.txt",
+    "CAT_LIST_EN": "ram_categorized_en.txt",
+    "CAT_LIST_SP": "ram_categorized_sp.txt",
+    "PRACTICE_LIST_EN": "practice_en.txt",
+    "PRACTICE_LIST_SP": "practice_sp.txt",
+    "LURES_LIST_EN": "REC1_lures_en.txt",
+})
 
 
 def write_wordpool_txt(path, language="EN", include_lure_words=False,
@@ -38,31 +40,22 @@ def write_wordpool_txt(path, language="EN", include_lure_words=False,
     if language == "SP" and include_lure_words:
         raise exc.LanguageError("Spanish lure words don't exist yet")
 
-    kwargs = {
-        "index": False,
-        "header": False,
-        "encoding": "utf8"
-    }
-
-    if categorized:
-        words = CAT_LIST_EN if language == "EN" else CAT_LIST_SP
-        filename = osp.join(path, "CatFR_WORDS.txt")
-    else:
-        words = RAM_LIST_EN if language == "EN" else RAM_LIST_SP
-        filename = osp.join(path, "RAM_wordpool.txt")
+    # Files are only replaced when their contents change (see
+    # wordpool.listgen.export)
+    filename = osp.join(path, "CatFR_WORDS.txt" if categorized else "RAM_wordpool.txt")
+    export.write_text(filename, export.pool_file_text(language, categorized))
     ret = [filename]
-    words.word.to_csv(filename, **kwargs)
 
     if include_lure_words:
-        lures = LURES_LIST_EN
         filename = osp.join(path, "RAM_lurepool.txt")
-        lures.to_csv(filename, **kwargs)
+        export.write_text(filename, export.pool_file_text(language, lures=True))
         ret.append(filename)
 
     return ret
 
 
-def assign_list_types(pool, num_baseline, num_nonstim, num_stim, num_ps=0):
+@instrument.timed("listgen.assign_list_types")
+def assign_list_types(pool, num_baseline, num_nonstim, num_stim, num_ps=0, rng=None):
     """Assign list types to a pool. The types are:
 
         * ``BASELINE``
@@ -76,31 +69,18 @@ def assign_list_types(pool, num_baseline, num_nonstim, num_stim, num_ps=0):
         :param int num_nonstim: Number of non-stim trials.
         :param int num_stim: Number of stim trials.
         :param int num_ps: Number of parameter search trials.
+        :param rng: Random number generator or seed (see :func:`wordpool.rng.get_rng`).
         :returns: pool with assigned types
         :rtype: pd.DataFrame
 
         """
-    # List numbers should already be assigned and sorted
-    listnos = pool.listno.unique()
-    assert all([n == m for n, m in zip(listnos, sorted(listnos))])
-
-    # Check that the inputs match the number of lists
-
-    parameters_lists = num_baseline + num_nonstim + num_stim + num_ps
-    error_message = "Parameters call for " + str(parameters_lists) + " lists, but I see " + str(len(listnos)) + " list numbers."
-    assert len(listnos) == parameters_lists, error_message
+    pool = pipeline.assign_list_types(WordPool.from_dataframe(pool), num_baseline, num_nonstim, num_stim,
+                                      num_ps=num_ps, rng=rng)
+    return pool.to_dataframe()
 
-    stim_or_nostim = ["NON-STIM"] * num_nonstim + ["STIM"] * num_stim
-    random.shuffle(stim_or_nostim)
 
-    pool_list = pool_dataframe_to_pool_list(pool)
-    pool_list = assign_list_types_from_type_list(pool_list, num_baseline, stim_or_nostim, num_ps=num_ps)
-    pool_dataframe = pool_list_to_pool_dataframe(pool_list)
-
-    return pool_dataframe
-
-
-def assign_multistim(pool, stimspec):
+@instrument.timed("listgen.assign_multistim")
+def assign_multistim(pool, stimspec, rng=None):
     """Update stim lists to account for multiple stimulation sites.
 
         To specify the number of stim lists, use a dict such as::
@@ -118,94 +98,117 @@ def assign_multistim(pool, stimspec):
         :param pd.DataFrame pool: Word pool with assigned stim lists.
         :param list names: Names of individual stim channels.
         :param dict stimspec: Stim specifications.
+        :param rng: Random number generator or seed (see :func:`wordpool.rng.get_rng`).
         :returns: Re-assigned word pool.
         :rtype: pd.DataFrame
 
         """
-    assert 'phase_type' in pool.columns, "You must assign stim lists first"
-    assert 'STIM' in pool['phase_type'].unique(), "You must assign stim lists first"
-    stim_lists = list(pool[pool['phase_type'] == 'STIM'].listno.unique())
-    assert sum(stimspec.values()) == len(stim_lists), \
-        "Incompatible number of stim lists"
-
-    stimspec_list = []
-    for key, value in stimspec.items():
-        stimspec_list += [key] * value
-    random.shuffle(stimspec_list)
-
-    pool_list = pool_dataframe_to_pool_list(pool)
-    pool_list = assign_multistim_from_stim_channels_list(pool_list, stimspec_list)
-    pool_dataframe = pool_list_to_pool_dataframe(pool_list)
+    pool = pipeline.assign_multistim(WordPool.from_dataframe(pool), stimspec, rng=rng)
+    return pool.to_dataframe()
 
-    return pool_dataframe
 
-
-def generate_rec1_blocks(pool, lures):
+def generate_rec1_blocks(pool, lures, rng=None):
     """Generate REC1 word blocks.
 
         :param pd.DataFrame pool: Word pool used in verbal task session.
-        :param pd.DataFrame lures: Lures to use.
+        :param pd.DataFrame lures: Lures to use. This frame is not modified.
+        :param rng: Random number generator or seed (see :func:`wordpool.rng.get_rng`).
         :returns: :class:`pd.DataFrame`.
 
         """
-    # Remove practice and baseline lists
-    allowed = pool[~pool.isin(["PRACTICE", "BASELINE"])]
-
-    # Divide into stim lists (exclude if in last four)...
-    stims = allowed[(allowed.phase_type == "STIM") & (allowed.listno <= allowed.listno.max() - 4)]
-
-    # ...and nonstim lists (take all)
-    nonstims = allowed[allowed.phase_type == "NON-STIM"]
-
-    # Randomly select stim list numbers
-    stim_idx = pd.Series(stims.listno.unique()).sample(6)
-    rec_stims = stims[stims.listno.isin(stim_idx)]
-    rec_nonstims = nonstims
-
-    # Combine selected words
-    targets = pd.concat([rec_stims, rec_nonstims])
-
-    # Give lures list numbers
-    lures["type"] = "LURE"
-    lures["listno"] = npr.choice(targets.listno.unique(), len(lures))
+    blocks = generate_rec1_blocks_batch([pool], lures, rng=rng)
+    return blocks.drop(columns="session")
+
+
+@instrument.timed("listgen.generate_rec1_blocks_batch")
+def generate_rec1_blocks_batch(pools, lures, rng=None):
+    """Generate REC1 word blocks for many sessions at once.
+
+    For each session, 6 stim lists (excluding the last 4 lists) and all
+    non-stim lists are recognition targets. Every lure is given the list
+    number of a random target list. The first half of the lists makes up the
+    first block, the second half the second one, and words are shuffled
+    within blocks.
+
+    :param list pools: Word pools used in verbal task sessions.
+    :param pd.DataFrame lures: Lures to use for every session. This frame is
+        not modified.
+    :param rng: Random number generator or seed (see :func:`wordpool.rng.get_rng`).
+    :returns: Blocks of all sessions with a ``session`` column (the position
+        in ``pools``) and an ``index`` column with the index of each word in
+        its pool or in ``lures``.
+    :rtype: pd.DataFrame
+
+    """
+    rng = get_rng(rng)
+    n_sessions, n_lures = len(pools), len(lures)
+
+    stacked = pd.concat(pools, ignore_index=True)
+    labels = np.concatenate([pool.index.values for pool in pools])
+    sessions = np.repeat(np.arange(n_sessions), [len(pool) for pool in pools])
+    listnos = stacked.listno.to_numpy(dtype=np.int64)
+    stim = (stacked.phase_type == "STIM").to_numpy()
+    nonstim = (stacked.phase_type == "NON-STIM").to_numpy()
+
+    # Candidate stim lists (excluding the last four) and selected lists as a
+    # (session, list number) table
+    last_listno = np.zeros(n_sessions, dtype=np.int64)
+    np.maximum.at(last_listno, sessions, listnos)
+    stim_candidates = stim & (listnos <= last_listno[sessions] - 4)
+    candidates = np.zeros((n_sessions, listnos.max() + 1), dtype=bool)
+    candidates[sessions[stim_candidates], listnos[stim_candidates]] = True
+    if (candidates.sum(axis=1) < 6).any():
+        raise ValueError("Each session needs at least 6 stim lists before its last 4 lists")
+
+    # Randomly select 6 stim lists per session
+    keys = np.where(candidates, rng.random(candidates.shape), 2)
+    selected = np.zeros_like(candidates)
+    selected[np.arange(n_sessions)[:, None], np.argsort(keys, axis=1)[:, :6]] = True
+    selected[sessions[nonstim], listnos[nonstim]] = True
+    targets = np.flatnonzero((stim | nonstim) & selected[sessions, listnos])
+
+    # Give lures the list number of a random selected list by picking among
+    # each session's selected list numbers (which argsort puts first)
+    n_selected = selected.sum(axis=1)
+    selected_listnos = np.argsort(~selected, axis=1, kind="stable")
+    picks = (rng.random((n_sessions, n_lures)) * n_selected[:, None]).astype(np.int64)
+    lure_listnos = np.take_along_axis(selected_listnos, picks, axis=1).ravel()
+    lure_sessions = np.repeat(np.arange(n_sessions), n_lures)
+
+    # Split each session's lists in half and shuffle words within blocks
+    list_ranks = np.cumsum(selected, axis=1) - 1
+    all_sessions = np.concatenate([sessions[targets], lure_sessions])
+    all_listnos = np.concatenate([listnos[targets], lure_listnos])
+    blocks = list_ranks[all_sessions, all_listnos] >= (n_selected // 2)[all_sessions]
+    order = np.lexsort((rng.random(len(all_sessions)), blocks, all_sessions))
+
+    target_words = stacked.iloc[targets]
+    target_words.insert(0, "index", labels[targets])
+    lure_rows = np.tile(np.arange(n_lures), n_sessions)
+    lure_words = lures.iloc[lure_rows].assign(type="LURE", listno=lure_listnos)
+    lure_words.insert(0, "index", lures.index.values[lure_rows])
 
     # Set default category values if this is catFR
-    if "category" in pool.columns:
-        lures["category"] = "X"
-        lures["category_num"] = -999
-
-    # Combine lures and targets
-    combined = pd.concat([targets, lures]).sort_values(by="listno")
-    listnos = combined.listno.unique()
+    if "category" in stacked.columns:
+        lure_words = lure_words.assign(category="X", category_num=-999)
 
-    # Break into two blocks and shuffle
-    block_listnos = [listnos[:int(len(listnos)/2)], listnos[int(len(listnos)/2):]]
-    blocks = [combined[combined.listno.isin(idx)].sample(frac=1) for idx in block_listnos]
-    return pd.concat(blocks).reset_index()
+    combined = pd.concat([target_words, lure_words], ignore_index=True).iloc[order]
+    combined.insert(0, "session", all_sessions[order])
+    return combined.reset_index(drop=True)
 
 
-def generate_learn1_blocks(pool, num_nonstim, num_stim, stim_channels=(0, 1), num_blocks=4):
+@instrument.timed("listgen.generate_learn1_blocks")
+def generate_learn1_blocks(pool, num_nonstim, num_stim, stim_channels=(0, 1), num_blocks=4, rng=None):
     """Generate blocks for the LEARN1 (repeated list learning) subtask.
 
         :param pd.DataFrame pool: Input word pool.
         :param int num_nonstim: Number of nonstim lists to include.
         :param int num_stim: Number of stim lists to include.
         :param tuple stim_channels: Tuple of stim channels to draw from.
+        :param rng: Random number generator or seed (see :func:`wordpool.rng.get_rng`).
         :returns: 4 blocks of lists as a :class:`pd.DataFrame`.
 
         """
-    nonstim_listnos = random.sample(list(pool[pool.phase_type == 'NON-STIM'].listno.unique()), num_nonstim)
-    stim_listnos = random.sample(list(pool[pool.stim_channels == stim_channels].listno.unique()), num_stim)
-    listnos = nonstim_listnos + stim_listnos
-
-    listnos_sequence = []
-    for i in range(num_blocks):
-        block_listnos = listnos[:]
-        random.shuffle(block_listnos)
-        listnos_sequence += block_listnos
-
-    pool_list = pool_dataframe_to_pool_list(pool)
-    result_list = extract_blocks(pool_list, listnos_sequence, num_blocks)
-    result = pool_list_to_pool_dataframe(result_list)
-
-    return result
+    pool = pipeline.learn1_blocks(WordPool.from_dataframe(pool), num_nonstim, num_stim,
+                                  stim_channels=stim_channels, num_blocks=num_blocks, rng=rng)
+    return pool.to_dataframe()
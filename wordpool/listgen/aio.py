@@ -0,0 +1,116 @@
+"""asyncio counterparts of the list generation functions.
+
+Generating sessions is CPU-bound and would block an event loop (and with it,
+e.g., hardware heartbeats) for its whole duration. The coroutines in this
+module run the corresponding :mod:`wordpool.listgen` functions in an executor
+instead::
+
+    pool = await aio.generate_cat_session_pool(language="SP", timeout=5)
+
+By default, the loop's default executor (a thread pool) is used. Use
+:func:`set_executor` to configure another one, e.g., a
+:class:`concurrent.futures.ProcessPoolExecutor` so that generation doesn't
+compete with the loop for the GIL. Every coroutine also accepts an
+``executor`` argument.
+
+When a coroutine is cancelled or times out, work which hasn't started yet is
+cancelled as well. Work which already runs in a thread finishes in the
+background, but its result is discarded.
+
+Generator objects are not safe to share between concurrent calls, so give each
+call its own ``rng`` (or seed) when generating several sessions at once, or
+use :func:`generate_subject`.
+
+"""
+
+import asyncio
+from functools import partial, wraps
+
+from . import fr, catfr, pal
+from .. import listgen
+from .cohort import EXPERIMENTS, _generate_unit
+from .._lazy import np
+
+_executor = None
+
+
+def set_executor(executor):
+    """Set the executor used when a coroutine is called without one.
+
+    :param concurrent.futures.Executor executor: Executor, or None to use the
+        event loop's default executor.
+
+    """
+    global _executor
+    _executor = executor
+
+
+def get_executor():
+    """Return the executor set with :func:`set_executor`."""
+    return _executor
+
+
+async def run(func, *args, executor=None, timeout=None, **kwargs):
+    """Call ``func(*args, **kwargs)`` in an executor and wait for the result.
+
+    :param callable func: Function to call. It must be picklable when using
+        a process pool.
+    :param concurrent.futures.Executor executor: Executor to use instead of
+        the configured one.
+    :param float timeout: Seconds to wait before raising
+        :class:`asyncio.TimeoutError`.
+
+    """
+    loop = asyncio.get_running_loop()
+    future = loop.run_in_executor(executor or _executor, partial(func, *args, **kwargs))
+    return await asyncio.wait_for(future, timeout)
+
+
+def _coroutine(func):
+    @wraps(func)
+    async def wrapper(*args, executor=None, timeout=None, **kwargs):
+        return await run(func, *args, executor=executor, timeout=timeout, **kwargs)
+
+    wrapper.__doc__ = "Asynchronous :func:`{}.{}`.".format(func.__module__, func.__name__)
+    return wrapper
+
+
+generate_fr_session_pool = _coroutine(fr.generate_session_pool)
+generate_n_fr_session_pools = _coroutine(fr.generate_n_session_pools)
+generate_cat_session_pool = _coroutine(catfr.generate_session_pool)
+generate_pal_session_pairs = _coroutine(pal.generate_n_session_pairs)
+assign_list_types = _coroutine(listgen.assign_list_types)
+assign_multistim = _coroutine(listgen.assign_multistim)
+generate_rec1_blocks = _coroutine(listgen.generate_rec1_blocks)
+generate_rec1_blocks_batch = _coroutine(listgen.generate_rec1_blocks_batch)
+generate_learn1_blocks = _coroutine(listgen.generate_learn1_blocks)
+
+
+async def generate_subject(experiment, subject, n_sessions, seed=None, executor=None, timeout=None, **kwargs):
+    """Generate all sessions of a subject concurrently. The results are the
+    same as those of :func:`wordpool.listgen.generate_cohort` with the same
+    seed.
+
+    :param str experiment: ``FR``, ``catFR`` or ``PAL``.
+    :param subject: Subject identifier.
+    :param int n_sessions: Number of sessions.
+    :param int seed: Root seed. When None, a fresh one is drawn from the OS.
+    :param concurrent.futures.Executor executor: Executor to use instead of
+        the configured one.
+    :param float timeout: Seconds to wait for all sessions. Sessions still
+        pending are cancelled on timeout.
+    :param kwargs: Passed on to the session generator of the experiment.
+    :returns: List of session pools.
+
+    """
+    if experiment not in EXPERIMENTS:
+        raise ValueError("Experiment must be one of {}".format(", ".join(EXPERIMENTS)))
+    if seed is None:
+        seed = np.random.SeedSequence().entropy
+
+    # PAL sessions of a subject are generated together
+    sessions = [None] if experiment == "PAL" else range(n_sessions)
+    tasks = [run(_generate_unit, experiment, subject, session, n_sessions, seed, kwargs, executor=executor)
+             for session in sessions]
+    results = await asyncio.wait_for(asyncio.gather(*tasks), timeout)
+    return list(results[0]) if experiment == "PAL" else results
@@ -0,0 +1,352 @@
+"""Precomputed session banks.
+
+Generating a session can take an unpredictable amount of time, which is
+unwelcome at the start of a recording. A session bank is built offline with
+:func:`build_bank` and stores many valid sessions in a compact directory of
+raw arrays (string columns as ``int32`` codes into a shared string table,
+as in :mod:`wordpool.cache`)::
+
+    build_bank("catfr_sp.bank", "catFR", 10000, language="SP")
+
+At the start of a session, the task opens the bank and draws the next session
+nobody used yet::
+
+    with SessionBank("catfr_sp.bank") as bank:
+        index, pool = bank.draw()
+
+Drawing takes constant time: column arrays are memory-mapped and only the
+rows of the drawn entry are decoded. Consumed entries are recorded in a bitmap
+which is written back to the bank immediately, so an entry is never drawn
+twice, even across processes. Processes coordinate through :func:`fcntl.flock`,
+which isn't available on Windows: there, draws are only coordinated between
+the threads of one process, and opening a bank warns about it.
+
+"""
+
+from contextlib import contextmanager
+import json
+import mmap
+import os
+import os.path as osp
+import shutil
+import tempfile
+import threading
+import warnings
+
+try:
+    import fcntl
+except ImportError:  # pragma: no cover
+    fcntl = None
+
+from .. import exc
+from .._lazy import np, pd
+from ..cache import decode, map_array
+from ..vocab import Vocabulary
+from .cohort import iter_cohort
+
+#: Version of the bank format.
+FORMAT_VERSION = 1
+
+# The state file holds the draw cursor and number of consumed entries
+# followed by the consumption bitmap
+_HEADER = 16
+
+
+def _entry(pools):
+    """Stack the sessions of one entry."""
+    if len(pools) == 1:
+        return pools[0].reset_index(drop=True)
+    frames = [pool.assign(session=n) for n, pool in enumerate(pools)]
+    frame = pd.concat(frames, ignore_index=True)
+    return frame[["session"] + [name for name in frame.columns if name != "session"]]
+
+
+def _check_strings(values):
+    if not all(isinstance(value, str) for value in values):
+        raise TypeError("Only strings, numbers and missing values can be stored in a bank")
+
+
+def _is_pairs(entry, name):
+    """Return True if a column holds ``(word1, word2)`` tuples (or missing
+    values), like the ``word`` column of PAL sessions.
+
+    """
+    if name != "word" or "word1" not in entry or "word2" not in entry:
+        return False
+    values = entry[name].to_numpy()
+    present = pd.notnull(values)
+    return bool(present.any()) and all(isinstance(value, tuple) and len(value) == 2 for value in values[present])
+
+
+def _pairs(word1, word2, present):
+    """Rebuild a column of ``(word1, word2)`` tuples."""
+    pairs = np.full(len(present), np.nan, dtype=object)
+    rows = np.flatnonzero(present)
+    pairs[rows] = list(zip(word1[rows].tolist(), word2[rows].tolist()))
+    return pairs
+
+
+def build_bank(path, experiment, n_entries, n_sessions=1, seed=None, max_workers=None,
+               progress=None, **kwargs):
+    """Generate sessions and store them in a new bank.
+
+    Sessions are generated with :func:`wordpool.listgen.cohort.iter_cohort`,
+    with each entry of the bank taking the place of a subject, and written to
+    the bank as soon as all sessions of an entry are complete, so the whole
+    bank is never held in memory.
+
+    :param str path: Directory to create.
+    :param str experiment: ``FR``, ``catFR`` or ``PAL``.
+    :param int n_entries: Number of entries.
+    :param int n_sessions: Number of sessions per entry. Entries with more than
+        one session (e.g., for PAL, where all sessions of a subject must use
+        different pairs) get a ``session`` column.
+    :param int seed: Root seed.
+    :param int max_workers: Number of worker processes (see
+        :func:`wordpool.listgen.generate_cohort`).
+    :param callable progress: Called as ``progress(done, total)``.
+    :param kwargs: Passed on to the session generator (e.g., ``language``).
+    :raises ValueError: when the bank already exists or entries differ in
+        length or columns.
+
+    """
+    if osp.exists(path):
+        raise ValueError("{} already exists".format(path))
+
+    generated = iter_cohort(experiment, [str(i) for i in range(n_entries)], n_sessions, seed=seed,
+                            max_workers=max_workers, progress=progress, **kwargs)
+
+    parent = osp.dirname(osp.abspath(path))
+    os.makedirs(parent, exist_ok=True)
+    tmp = tempfile.mkdtemp(dir=parent, prefix=".tmp-")
+    files = []
+    try:
+        vocabulary = Vocabulary()
+        columns, length = None, None
+        # sessions of entries which aren't complete yet
+        pending = {}
+        for subject, session, pools in generated:
+            if session is not None:
+                sessions = pending.setdefault(subject, [None] * n_sessions)
+                sessions[session] = pools
+                if any(pool is None for pool in sessions):
+                    continue
+                pools = pending.pop(subject)
+            entry = _entry(pools)
+
+            if columns is None:
+                length = len(entry)
+                columns = []
+                for i, name in enumerate(entry.columns):
+                    if _is_pairs(entry, name):
+                        # pairs are rebuilt from word1 and word2, so only
+                        # whether a row has one is stored
+                        kind, dtype = "pairs", np.dtype(np.uint8)
+                    else:
+                        kind = "str" if entry[name].dtype == object else "array"
+                        dtype = np.dtype(np.int32) if kind == "str" else entry[name].dtype
+                    if dtype.kind not in "biuf":
+                        raise TypeError("Only strings, numbers and missing values can be stored in a bank")
+                    columns.append({"name": name, "kind": kind, "dtype": dtype.str})
+                    files.append(open(osp.join(tmp, "{:d}.bin".format(i)), "wb"))
+            elif len(entry) != length or list(entry.columns) != [column["name"] for column in columns]:
+                raise ValueError("All entries must have the same length and columns")
+
+            # entries complete in any order, so each is written at its place
+            for column, f in zip(columns, files):
+                values = entry[column["name"]].to_numpy()
+                if column["kind"] == "pairs":
+                    present = pd.notnull(values)
+                    word1, word2 = entry.word1.to_numpy()[present], entry.word2.to_numpy()[present]
+                    if any(pair != (a, b) for pair, a, b in zip(values[present], word1, word2)):
+                        raise ValueError("Pairs in the word column must match word1 and word2")
+                    values = present
+                elif column["kind"] == "str":
+                    missing = pd.isnull(values)
+                    _check_strings(values[~missing])
+                    codes = np.full(len(values), -1, dtype=np.int32)
+                    codes[~missing] = vocabulary.intern(values[~missing])
+                    values = codes
+                values = values.astype(column["dtype"])
+                f.seek(int(subject) * length * values.itemsize)
+                values.tofile(f)
+
+        for f in files:
+            f.close()
+        files = []
+
+        np.array(vocabulary.strings, dtype=str).tofile(osp.join(tmp, "strings.bin"))
+        state = np.zeros(_HEADER + (n_entries + 7) // 8, dtype=np.uint8)
+        state.tofile(osp.join(tmp, "state.bin"))
+
+        with open(osp.join(tmp, "meta.json"), "w") as f:
+            json.dump({
+                "version": FORMAT_VERSION,
+                "experiment": experiment,
+                "kwargs": kwargs,
+                "entries": n_entries,
+                "sessions": n_sessions,
+                "length": length,
+                "strings": np.array(vocabulary.strings, dtype=str).dtype.str,
+                "columns": columns,
+            }, f)
+
+        os.rename(tmp, path)
+    finally:
+        for f in files:
+            f.close()
+        shutil.rmtree(tmp, ignore_errors=True)
+
+
+class SessionBank(object):
+    """A bank of precomputed sessions built by :func:`build_bank`.
+
+    Without :mod:`fcntl` (i.e., on Windows), the bank must only be opened by
+    one process at a time.
+
+    :param str path: Bank directory.
+
+    """
+    def __init__(self, path):
+        self.path = path
+        with open(osp.join(path, "meta.json")) as f:
+            self.meta = json.load(f)
+        self.experiment = self.meta["experiment"]
+        self.n_sessions = self.meta["sessions"]
+
+        shape = (self.meta["entries"], self.meta["length"])
+        self._columns = [(column["name"], column["kind"],
+                          map_array(osp.join(path, "{:d}.bin".format(i)), column["dtype"]).reshape(shape))
+                         for i, column in enumerate(self.meta["columns"])]
+
+        # strings are decoded when entries are handed out
+        self._strings = map_array(osp.join(path, "strings.bin"), self.meta["strings"])
+
+        self._lock = threading.Lock()
+        if fcntl is None:  # pragma: no cover
+            warnings.warn("fcntl is unavailable, so draws from {} are not locked against other processes"
+                          .format(path), RuntimeWarning)
+        self._state_file = open(osp.join(path, "state.bin"), "r+b")
+        self._state = mmap.mmap(self._state_file.fileno(), 0, access=mmap.ACCESS_WRITE)
+        self._header = np.frombuffer(self._state, dtype=np.uint64, count=2)
+        self._bitmap = np.frombuffer(self._state, dtype=np.uint8, offset=_HEADER)
+
+    def __len__(self):
+        return self.meta["entries"]
+
+    def __repr__(self):
+        return "<SessionBank {} ({}, {:d}/{:d} remaining)>".format(
+            self.path, self.experiment, self.remaining, len(self))
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *args):
+        self.close()
+
+    def close(self):
+        """Close the bank."""
+        if self._state is not None:
+            del self._header, self._bitmap
+            self._state.close()
+            self._state_file.close()
+            self._state = None
+
+    @property
+    def remaining(self):
+        """Number of entries not consumed yet."""
+        return len(self) - int(self._header[1])
+
+    @property
+    def strings(self):
+        """Fixed width string table the codes of string columns refer to."""
+        return self._strings
+
+    def coded_columns(self):
+        """Return the columns of all entries without decoding them.
+
+        :returns: Dictionary mapping column names to memory-mapped
+            ``(len(bank), length)`` arrays (copy-on-write, so changes don't
+            reach the bank). String columns hold codes into :attr:`strings`,
+            with -1 for missing values. The ``word`` column of PAL sessions,
+            which pairs up ``word1`` and ``word2``, is left out.
+        :rtype: dict
+
+        """
+        return {name: values for name, kind, values in self._columns if kind != "pairs"}
+
+    def is_consumed(self, index):
+        """Return True if entry ``index`` has been consumed."""
+        if not 0 <= index < len(self):
+            raise IndexError(index)
+        return bool(self._bitmap[index >> 3] & (1 << (index & 7)))
+
+    def get(self, index):
+        """Return entry ``index`` without consuming it.
+
+        :rtype: pd.DataFrame
+
+        """
+        if not 0 <= index < len(self):
+            raise IndexError(index)
+        columns = {}
+        for name, kind, values in self._columns:
+            values = values[index]
+            if kind == "pairs":
+                columns[name] = values.astype(bool)
+            else:
+                columns[name] = decode(self._strings, values) if kind == "str" else values.copy()
+        for name, kind, _ in self._columns:
+            if kind == "pairs":
+                columns[name] = _pairs(columns["word1"], columns["word2"], columns[name])
+        return pd.DataFrame(columns, index=pd.RangeIndex(self.meta["length"]), copy=False)
+
+    @contextmanager
+    def _locked(self):
+        with self._lock:
+            if fcntl is not None:
+                fcntl.flock(self._state_file.fileno(), fcntl.LOCK_EX)
+            try:
+                yield
+            finally:
+                if fcntl is not None:
+                    fcntl.flock(self._state_file.fileno(), fcntl.LOCK_UN)
+
+    def _mark(self, index):
+        if self.is_consumed(index):
+            return False
+        self._bitmap[index >> 3] |= np.uint8(1 << (index & 7))
+        self._header[1] += 1
+        return True
+
+    def consume(self, index):
+        """Mark entry ``index`` as consumed (e.g., when a session was handed
+        out some other way).
+
+        :returns: False if the entry was already consumed.
+
+        """
+        with self._locked():
+            marked = self._mark(index)
+            self._state.flush()
+        return marked
+
+    def draw(self):
+        """Consume the next entry which hasn't been consumed yet.
+
+        :returns: The index of the entry and its session pool.
+        :raises BankExhaustedError: when all entries have been consumed.
+
+        """
+        with self._locked():
+            cursor = int(self._header[0])
+            # entries consumed out of order are skipped
+            while cursor < len(self) and self.is_consumed(cursor):
+                cursor += 1
+            if cursor == len(self):
+                self._header[0] = cursor
+                raise exc.BankExhaustedError("All {:d} entries of {} have been consumed".format(len(self), self.path))
+            self._mark(cursor)
+            self._header[0] = cursor + 1
+            self._state.flush()
+        return cursor, self.get(cursor)
@@ -1,11 +1,9 @@
 """CatFR list generation utilities."""
 
-import functools
-import numpy as np
-import pandas as pd
-
-from .. import exc
-from .. import load, shuffle_within_groups
+from .. import exc, instrument
+from .._lazy import np, pd
+from .. import get_pool, shuffle_within_groups
+from ..rng import get_rng
 
 
 def assign_word_numbers(pool):
@@ -21,85 +19,179 @@ def assign_word_numbers(pool):
         error_message = "The category " + str(i) + " appears not to have " + str(n_words) + " words. It has " + str(word_count[i]) + "."
         assert n_words == word_count[i], error_message
 
-    # Assign word and category numbers
-    pool["category_num"] = -999
-    for n, cat in enumerate(pool.category.unique()):
-        pool.loc[pool.category == cat, "wordno"] = range(n_words)
-        pool.loc[pool.category == cat, "category_num"] = n
+    # Assign word and category numbers (in order of appearance)
+    pool["wordno"] = pool.groupby("category", sort=False).cumcount().values
+    pool["category_num"] = pd.factorize(pool.category)[0]
 
     return pool
 
 
-def assign_list_numbers(pool, n_lists=26, list_start=0):
-    """Assign list numbers to words in the pool."""
-    assert "wordno" in pool.columns
-    pool["listno"] = -1
-
-    def condition(half, category):
-        if half == 0:
-            half_cond = pool.wordno % 2 == 0
-        else:
-            half_cond = pool.wordno % 2 == 1
-        return (
-            (pool.category == category) &
-            (half_cond) &
-            (pool.listno == -1)
-        )
-
-    original = pool.copy()
-    while True:
-        pool = original.copy()
-        try:
-            for listno in range(list_start, n_lists):
-                choices = pool.category[(pool.listno == -1)].unique()
-                cats = np.random.choice(choices, 3, replace=False)
-                ixf, ixs = [], []
-
-                for cat in cats:
-                    cond = functools.partial(condition, category=cat)
-                    ixf.append(pool.word[cond(0)].sample(2).index)
-                    ixs.append(pool.word[cond(1)].sample(2).index)
-                ix = pd.Index(np.array(ixf + ixs).flatten())
-                pool.loc[ix, "listno"] = listno
-            return pool
-        except ValueError:
-            pass
-
-
-def sort_pairs(pool):
-    """Arrange categorical pairs of words."""
-    assert "category" in pool.columns
-    assert "listno" in pool.columns
+@instrument.timed("catfr.assign_list_numbers")
+def assign_list_numbers(pool, n_lists=26, list_start=0, stats=None, cooccurrence=None, rng=None):
+    """Assign list numbers to words in the pool.
+
+    Each list is made up of 3 categories with 2 even and 2 odd numbered words
+    from each. Lists are built one at a time by picking categories at random
+    among those with words left, skipping any category whose choice would
+    leave the remaining lists impossible to fill. This always succeeds on the
+    first attempt, so it runs in bounded time.
+
+    :param pd.DataFrame pool: Word pool with assigned word numbers.
+    :param int n_lists: Number of lists to assign.
+    :param int list_start: First list number.
+    :param dict stats: If given, updated with the number of ``attempts``
+        needed (always 1) and the number of random category picks that were
+        ``skipped`` to keep the assignment feasible.
+    :param pd.DataFrame cooccurrence: How often each pair of categories
+        already shared a list (e.g., in earlier sessions), with categories as
+        index and columns. When given, each category after the first in a
+        list is the one with the fewest previous lists in common with the
+        categories already chosen (ties are broken at random).
+    :param rng: Random number generator or seed (see :func:`wordpool.rng.get_rng`).
+    :returns: Copy of the pool with a ``listno`` column. Words which were not
+        assigned to any list have a list number of -1.
+    :raises exc.ListAssignmentError: when the pool can't be split into the
+        requested number of lists.
+
+    """
     assert "wordno" in pool.columns
+    pool = pool.copy()
+    rng = get_rng(rng)
+
+    cat_codes, categories = pd.factorize(pool.category)
+    odd = (pool.wordno % 2).values.astype(int)
+
+    # Every time a category is used in a list, it provides 2 words of each
+    # word number parity
+    counts = np.zeros((len(categories), 2), dtype=int)
+    np.add.at(counts, (cat_codes, odd), 1)
+    capacity = counts.min(axis=1) // 2
+
+    total = n_lists - list_start
+    if len(categories) < 3 or np.minimum(capacity, total).sum() < 3 * total:
+        raise exc.ListAssignmentError(
+            "Can't assign {:d} lists of 3 categories from {:d} categories with {:d} words each".format(
+                total, len(categories), 4 * capacity.max()))
+
+    if cooccurrence is not None:
+        penalty = cooccurrence.reindex(index=categories, columns=categories, fill_value=0).to_numpy()
+
+    # uses[c, k] is the list number of the k-th use of category c
+    uses = np.full((len(categories), max(capacity.max(), 1)), -1, dtype=int)
+    remaining = capacity.copy()
+    skipped = 0
+    for i, listno in enumerate(range(list_start, n_lists)):
+        # To be able to fill the lists left after this one, at most max_low
+        # categories can be picked among those with fewer uses left than
+        # there are lists left.
+        lists_left = total - i
+        high = remaining >= lists_left
+        max_low = high.sum() * (lists_left - 1) + remaining[~high].sum() - 3 * (lists_left - 1)
+
+        chosen, n_low = [], 0
+        candidates = list(rng.permutation(np.flatnonzero(remaining)))
+        while candidates:
+            if cooccurrence is not None and chosen:
+                scores = penalty[np.ix_(candidates, chosen)].sum(axis=1)
+                cat = candidates.pop(int(np.argmin(scores)))
+            else:
+                cat = candidates.pop(0)
+            if not high[cat]:
+                if n_low == max_low:
+                    skipped += 1
+                    continue
+                n_low += 1
+            chosen.append(cat)
+            if len(chosen) == 3:
+                break
+
+        chosen = np.array(chosen)
+        uses[chosen, capacity[chosen] - remaining[chosen]] = listno
+        remaining[chosen] -= 1
+
+    # Randomly rank words within each category and parity, then give the k-th
+    # pair of each to the list of the category's k-th use
+    order = np.lexsort((rng.random(len(pool)), odd, cat_codes))
+    group = cat_codes[order] * 2 + odd[order]
+    starts = np.flatnonzero(np.r_[True, group[1:] != group[:-1]])
+    rank = np.empty(len(pool), dtype=int)
+    rank[order] = np.arange(len(pool)) - np.repeat(starts, np.diff(np.r_[starts, len(pool)]))
+    use = rank // 2
+
+    listnos = np.full(len(pool), -1, dtype=int)
+    in_use = use < uses.shape[1]
+    listnos[in_use] = uses[cat_codes[in_use], use[in_use]]
+    pool["listno"] = listnos
+
+    instrument.count("catfr.attempts")
+    instrument.count("catfr.skipped", skipped)
+    if stats is not None:
+        stats.update(attempts=1, skipped=skipped)
 
-    def cond(category, listno, excluded):
-        return (pool.listno == listno) & (pool.category == category) & ~(pool.word.isin(excluded))
+    return pool
 
-    lists = []
-    used = []
-    for listno in sorted(pool.listno.unique()):
-        order_1 = pool.category[pool.listno == listno].unique()
-        order_2 = np.random.permutation(order_1)
-        while order_2[0] == order_1[-1]:
-            order_2 = np.random.permutation(order_1)
-        order = np.append(order_1, order_2)
 
-        list_ = None
-        for cat in order:
-            row = pool[cond(cat, listno, used)].sample(2)
-            list_ = pd.concat([list_, row])
-            used.extend(list_.iloc[-2:].word)
-        lists.append(list_)
+@instrument.timed("catfr.sort_pairs")
+def sort_pairs(pool, rng=None):
+    """Arrange categorical pairs of words.
 
-    return pd.concat(lists).reset_index(drop=True)
+    Every list presents each of its categories twice, with 2 words each time.
+    The first round follows the order in which categories appear in the pool,
+    the second round is a random permutation of it which never starts with
+    the category that ended the first round.
 
+    :param pd.DataFrame pool: Word pool with assigned list numbers.
+    :param rng: Random number generator or seed (see :func:`wordpool.rng.get_rng`).
 
-def generate_session_pool(language="EN"):
+    """
+    assert "category" in pool.columns
+    assert "listno" in pool.columns
+    assert "wordno" in pool.columns
+    rng = get_rng(rng)
+
+    list_codes, _ = pd.factorize(pool.listno, sort=True)
+    cat_codes = pd.factorize(pool.category)[0].astype(np.int64)
+
+    # Group rows into (list, category) buckets ordered by where the category
+    # first appears in the list, shuffling words within each bucket
+    _, first, inverse = np.unique(list_codes * (cat_codes.max() + 1) + cat_codes,
+                                  return_index=True, return_inverse=True)
+    first_row = first[inverse.ravel()]
+    rows = np.lexsort((rng.random(len(pool)), first_row, list_codes))
+    starts = np.flatnonzero(np.r_[True, np.diff(first_row[rows]) != 0])
+    sizes = np.diff(np.r_[starts, len(pool)])
+    if (sizes < 4).any():
+        raise ValueError("Each category needs at least 4 words in every list")
+    bucket_lists = list_codes[rows[starts]]
+
+    slot_buckets, slot_rounds = [], []
+    bucket = 0
+    for n_cats in np.bincount(bucket_lists):
+        if n_cats < 2:
+            raise ValueError("Each list needs at least 2 categories")
+
+        # second round order which doesn't start with the last category
+        head = rng.integers(n_cats - 1)
+        order = np.r_[head, rng.permutation(np.delete(np.arange(n_cats), head))]
+
+        slot_buckets += [bucket + np.arange(n_cats), bucket + order]
+        slot_rounds += [np.zeros(n_cats, dtype=int), np.ones(n_cats, dtype=int)]
+        bucket += n_cats
+
+    # Each slot takes the next 2 words of its bucket
+    offsets = starts[np.concatenate(slot_buckets)] + 2 * np.concatenate(slot_rounds)
+    index = rows[(offsets[:, None] + np.arange(2)).ravel()]
+    return pool.iloc[index].reset_index(drop=True)
+
+
+@instrument.timed("catfr.generate_session_pool")
+def generate_session_pool(language="EN", rng=None):
     """Generate a single session pool for catFR experiments.
 
     :param str language: Language to load words in.
     :param int num_lists: Number of lists to assign.
     :param int listno_start: Where to start numbering from.
+    :param rng: Random number generator or seed (see :func:`wordpool.rng.get_rng`).
     :returns: Shuffled, categorized word pool.
 
     """
@@ -110,7 +202,8 @@ def generate_session_pool(language="EN"):
 
     # Load and shuffle order of words in categories
     filename = "ram_categorized_{:s}.txt".format(language.lower())
-    pool = shuffle_within_groups(load(filename), "category")
-    words = sort_pairs(assign_list_numbers(assign_word_numbers(pool)))
+    rng = get_rng(rng)
+    pool = shuffle_within_groups(get_pool(filename), "category", rng=rng)
+    words = sort_pairs(assign_list_numbers(assign_word_numbers(pool), rng=rng), rng=rng)
 
     return words
@@ -0,0 +1,153 @@
+"""Generate sessions for whole cohorts in parallel.
+
+Every unit of work (one session for FR and catFR, all sessions of a subject
+for PAL since those are generated together) draws from its own
+:func:`wordpool.rng.session_rng` stream, derived from a root seed, the
+experiment, the subject and the session number. Results therefore do not depend on the
+number of workers or the order in which units finish.
+
+"""
+
+from collections import OrderedDict
+import os
+
+from .._lazy import np
+from ..rng import session_rng, stream_seed
+
+EXPERIMENTS = ("FR", "catFR", "PAL")
+
+
+def unit_seed(root_seed, experiment, subject, session=None):
+    """Return the :class:`np.random.SeedSequence` for a unit of work, e.g., to
+    seed other libraries consistently with the generated sessions. Its entropy
+    and spawn key are those of :func:`wordpool.rng.stream_seed`, which keys
+    the :func:`wordpool.rng.session_rng` streams of the unit, followed by the
+    session number.
+
+    :param int root_seed: Root seed of the cohort.
+    :param str experiment: Experiment name.
+    :param subject: Subject identifier (converted with ``str``).
+    :param int session: Session number or None for per-subject units.
+    :rtype: np.random.SeedSequence
+
+    """
+    seed = stream_seed(root_seed, subject, experiment)
+    if session is None:
+        return seed
+    return np.random.SeedSequence(seed.entropy, spawn_key=seed.spawn_key + (session,))
+
+
+def _generate_unit(experiment, subject, session, n_sessions, root_seed, kwargs):
+    from . import fr, catfr, pal
+
+    # PAL units span all sessions of a subject and use the first stream
+    rng = session_rng(root_seed, subject, session or 0, experiment=experiment)
+    if experiment == "FR":
+        return fr.generate_session_pool(rng=rng, **kwargs)
+    elif experiment == "catFR":
+        return catfr.generate_session_pool(rng=rng, **kwargs)
+    else:
+        return pal.generate_n_session_pairs(n_sessions, rng=rng, **kwargs)
+
+
+def _generate_chunk(experiment, units, n_sessions, root_seed, kwargs):
+    return [(subject, session, _generate_unit(experiment, subject, session, n_sessions, root_seed, kwargs))
+            for subject, session in units]
+
+
+def _generate_serial(experiment, units, n_sessions, root_seed, kwargs, progress):
+    for done, (subject, session) in enumerate(units, 1):
+        yield subject, session, _generate_unit(experiment, subject, session, n_sessions, root_seed, kwargs)
+        if progress is not None:
+            progress(done, len(units))
+
+
+def _generate_parallel(experiment, units, n_sessions, root_seed, kwargs, progress, max_workers, chunksize):
+    from concurrent.futures import ProcessPoolExecutor, as_completed
+
+    if chunksize is None:
+        # a few chunks per worker balances load without too much overhead
+        workers = max_workers or os.cpu_count() or 1
+        chunksize = max(1, len(units) // (4 * workers))
+
+    chunks = [units[i:i + chunksize] for i in range(0, len(units), chunksize)]
+    done = 0
+    with ProcessPoolExecutor(max_workers=max_workers) as executor:
+        futures = [executor.submit(_generate_chunk, experiment, chunk, n_sessions, root_seed, kwargs)
+                   for chunk in chunks]
+        try:
+            for future in as_completed(futures):
+                results = future.result()
+                for result in results:
+                    yield result
+                done += len(results)
+                if progress is not None:
+                    progress(done, len(units))
+        except BaseException:
+            for future in futures:
+                future.cancel()
+            raise
+
+
+def iter_cohort(experiment, subjects, n_sessions, seed=None, max_workers=None,
+                chunksize=None, progress=None, **kwargs):
+    """Generate session pools for all sessions of a cohort of subjects and
+    yield them as they are completed, so that they can be written out without
+    keeping the whole cohort in memory. See :func:`generate_cohort` for the
+    parameters.
+
+    :returns: Iterator of ``(subject, session, pool)`` tuples in order of
+        completion. For PAL, ``session`` is None and ``pool`` is the list of
+        all sessions of the subject.
+
+    """
+    if experiment not in EXPERIMENTS:
+        raise ValueError("Experiment must be one of {}".format(", ".join(EXPERIMENTS)))
+    subjects = list(subjects)
+    assert len(set(subjects)) == len(subjects), "Subjects must be unique"
+
+    if seed is None:
+        seed = np.random.SeedSequence().entropy
+
+    if experiment == "PAL":
+        units = [(subject, None) for subject in subjects]
+    else:
+        units = [(subject, session) for subject in subjects for session in range(n_sessions)]
+
+    if max_workers == 0:
+        return _generate_serial(experiment, units, n_sessions, seed, kwargs, progress)
+    return _generate_parallel(experiment, units, n_sessions, seed, kwargs, progress, max_workers, chunksize)
+
+
+def generate_cohort(experiment, subjects, n_sessions, seed=None, max_workers=None,
+                    chunksize=None, progress=None, **kwargs):
+    """Generate session pools for all sessions of a cohort of subjects.
+
+    :param str experiment: ``FR``, ``catFR`` or ``PAL``.
+    :param list subjects: Subject identifiers.
+    :param int n_sessions: Number of sessions per subject.
+    :param int seed: Root seed. When None, a fresh one is drawn from the OS.
+    :param int max_workers: Number of worker processes. Defaults to the
+        number of CPUs. With 0, everything runs in the calling process.
+    :param int chunksize: Number of units of work sent to a worker at once.
+        By default, each worker gets about 4 chunks.
+    :param callable progress: Called as ``progress(done, total)`` whenever
+        units of work complete.
+    :param kwargs: Passed on to the session generator of the experiment
+        (e.g., ``language``).
+    :returns: Mapping of subjects to lists of session pools, in the order of
+        ``subjects``.
+    :rtype: OrderedDict
+
+    """
+    subjects = list(subjects)
+    results = iter_cohort(experiment, subjects, n_sessions, seed=seed, max_workers=max_workers,
+                          chunksize=chunksize, progress=progress, **kwargs)
+
+    sessions = OrderedDict((subject, [None] * n_sessions) for subject in subjects)
+    for subject, session, pools in results:
+        if session is None:
+            sessions[subject] = list(pools)
+        else:
+            sessions[subject][session] = pools
+    return sessions
@@ -0,0 +1,249 @@
+"""Exporting pools and sessions to experiment files.
+
+Files are written atomically (to a temporary file which is then renamed)
+and only when their contents change, so exporting a whole cohort again only
+touches the files that are actually different.
+
+"""
+
+import csv
+import hashlib
+import os
+import os.path as osp
+import tempfile
+
+from .. import get_pool, exc
+from .._lazy import pd
+from ..columnar import WordPool
+
+
+class _HashingWriter(object):
+    """File-like wrapper which hashes everything written to a file."""
+    def __init__(self, f):
+        self.f = f
+        self.hash = hashlib.sha1()
+        self.size = 0
+
+    def write(self, text):
+        data = text.encode("utf8")
+        self.hash.update(data)
+        self.size += len(data)
+        self.f.write(data)
+
+
+def _file_hash(path):
+    digest = hashlib.sha1()
+    with open(path, "rb") as f:
+        for block in iter(lambda: f.read(1 << 16), b""):
+            digest.update(block)
+    return digest.hexdigest()
+
+
+def _current_umask():
+    """Return the umask as reported by Linux, or None elsewhere. Unlike
+    :func:`os.umask`, this doesn't change the umask of other threads.
+
+    """
+    try:
+        with open("/proc/self/status") as f:
+            for line in f:
+                if line.startswith("Umask:"):
+                    return int(line.split()[1], 8)
+    except (OSError, ValueError):
+        pass
+    return None
+
+
+def _import_umask():
+    umask = _current_umask()
+    if umask is None:
+        # the umask can only be read by setting it, which is done once here
+        # rather than in threads which write files
+        umask = os.umask(0o077)
+        os.umask(umask)
+    return umask
+
+
+#: umask of the process when this module was imported
+_UMASK = _import_umask()
+
+
+def _new_file_mode():
+    """Return the mode of files created by :func:`open` in this process."""
+    umask = _current_umask()
+    if umask is None:
+        umask = _UMASK
+    return 0o666 & ~umask
+
+
+def write_atomic(path, write):
+    """Write a file atomically unless its contents didn't change. A new file
+    gets the permissions :func:`open` would give it, a replaced one keeps its
+    own.
+
+    :param str path: File to write.
+    :param callable write: Called with a file-like object with a ``write``
+        method accepting text, which is encoded as UTF-8.
+    :returns: True if the file was written, False if it already had the same
+        contents.
+
+    """
+    directory = osp.dirname(osp.abspath(path))
+    os.makedirs(directory, exist_ok=True)
+    fd, tmp = tempfile.mkstemp(dir=directory, prefix=".tmp-")
+    try:
+        with os.fdopen(fd, "wb") as f:
+            writer = _HashingWriter(f)
+            write(writer)
+
+        if osp.isfile(path) and osp.getsize(path) == writer.size and _file_hash(path) == writer.hash.hexdigest():
+            return False
+        # mkstemp creates files only their owner can read
+        try:
+            mode = os.stat(path).st_mode & 0o7777
+        except OSError:
+            mode = _new_file_mode()
+        os.chmod(tmp, mode)
+        os.replace(tmp, path)
+        return True
+    finally:
+        if osp.exists(tmp):
+            os.remove(tmp)
+
+
+def write_text(path, text):
+    """Write text to a file atomically unless it didn't change (see
+    :func:`write_atomic`).
+
+    """
+    return write_atomic(path, lambda f: f.write(text))
+
+
+def _columns(session):
+    """Return the column names and value iterables of a session given as a
+    frame, :class:`WordPool` or list of dictionaries.
+
+    """
+    if isinstance(session, WordPool):
+        return session.columns, [_blank_missing(session[name]) for name in session.columns]
+    if hasattr(session, "columns"):
+        return list(session.columns), [_blank_missing(session[name].to_numpy()) for name in session.columns]
+    names = list(session[0]) if len(session) else []
+    return names, [[None if _is_missing(word.get(name)) else word.get(name) for word in session] for name in names]
+
+
+def _is_missing(value):
+    return value is None or (isinstance(value, float) and value != value)
+
+
+def _blank_missing(values):
+    """Replace missing values with None, which :mod:`csv` writes as an empty
+    field like :meth:`pd.DataFrame.to_csv` does.
+
+    """
+    if values.dtype.kind not in "fcOmM":
+        return values
+    missing = pd.isnull(values)
+    if not missing.any():
+        return values
+    values = values.astype(object)
+    values[missing] = None
+    return values
+
+
+def write_session(path, session):
+    """Write a session as a tab-separated file with a header. Rows are
+    streamed to disk directly from the session's columns.
+
+    :param str path: File to write.
+    :param session: Session pool as a :class:`pd.DataFrame`,
+        :class:`WordPool` or list of dictionaries.
+    :returns: True if the file was written, False if it was unchanged.
+
+    """
+    names, columns = _columns(session)
+
+    def write(f):
+        writer = csv.writer(f, delimiter="\t", lineterminator="\n")
+        writer.writerow(names)
+        writer.writerows(zip(*columns))
+
+    return write_atomic(path, write)
+
+
+def pool_file_text(language="EN", categorized=False, lures=False):
+    """Return the contents of ``RAM_wordpool.txt``, ``CatFR_WORDS.txt`` or
+    ``RAM_lurepool.txt`` (see :func:`wordpool.listgen.write_wordpool_txt`).
+
+    """
+    if language not in ["EN", "SP"]:
+        raise exc.LanguageError("Invalid language specified")
+
+    kwargs = {
+        "index": False,
+        "header": False,
+    }
+
+    if lures:
+        if language == "SP":
+            raise exc.LanguageError("Spanish lure words don't exist yet")
+        return get_pool("REC1_lures_en.txt").to_csv(**kwargs)
+    elif categorized:
+        words = get_pool("ram_categorized_{:s}.txt".format(language.lower()))
+    else:
+        words = get_pool("ram_wordpool_{:s}.txt".format(language.lower()))
+    return words.word.to_csv(**kwargs)
+
+
+def export_cohort(path, sessions, language="EN", include_lure_words=False, categorized=False,
+                  session_filename="session_{session:d}.tsv", max_workers=None):
+    """Write pool files and session files for a cohort of subjects.
+
+    Every subject gets a directory in ``path`` with the files
+    :func:`wordpool.listgen.write_wordpool_txt` writes and one file per
+    session (see :func:`write_session`). Subjects are exported in parallel
+    threads and files whose contents didn't change are left alone.
+
+    :param str path: Root directory.
+    :param dict sessions: Mapping of subjects to lists of session pools (as
+        returned by :func:`wordpool.listgen.generate_cohort`).
+    :param str language: Pool language (``EN`` or ``SP``).
+    :param bool include_lure_words: Also write lure words.
+    :param bool categorized: Write the categorized word pool.
+    :param str session_filename: Format of session filenames, with the
+        ``subject`` and ``session`` (number) as fields.
+    :param int max_workers: Number of threads.
+    :returns: Dictionary with lists of the ``written`` and ``unchanged``
+        files.
+
+    """
+    from concurrent.futures import ThreadPoolExecutor
+
+    if include_lure_words and language == "SP":
+        raise exc.LanguageError("Spanish lure words don't exist yet")
+
+    # pool files are the same for everyone
+    pool_files = [("CatFR_WORDS.txt" if categorized else "RAM_wordpool.txt",
+                   pool_file_text(language, categorized))]
+    if include_lure_words:
+        pool_files.append(("RAM_lurepool.txt", pool_file_text(language, lures=True)))
+
+    def export_subject(subject, subject_sessions):
+        directory = osp.join(path, str(subject))
+        results = []
+        for filename, text in pool_files:
+            filename = osp.join(directory, filename)
+            results.append((filename, write_text(filename, text)))
+        for n, session in enumerate(subject_sessions):
+            filename = osp.join(directory, session_filename.format(subject=subject, session=n))
+            results.append((filename, write_session(filename, session)))
+        return results
+
+    summary = {"written": [], "unchanged": []}
+    with ThreadPoolExecutor(max_workers=max_workers) as executor:
+        futures = [executor.submit(export_subject, subject, subject_sessions)
+                   for subject, subject_sessions in sessions.items()]
+        for future in futures:
+            for filename, written in future.result():
+                summary["written" if written else "unchanged"].append(filename)
+    return summary
@@ -1,34 +1,98 @@
 """FR list generation."""
 
-from .. import load, shuffle_words, pool_dataframe_to_pool_list, pool_list_to_pool_dataframe
-from ..nopandas import assign_list_numbers_from_word_list
+from collections.abc import Sequence
 
-RAM_LIST_EN = load("ram_wordpool_en.txt")
-RAM_LIST_SP = load("ram_wordpool_sp.txt")
+from .. import get_pool, instrument
+from .._lazy import np, pd
+from ..registry import lazy_pools
+from ..rng import get_rng
+from . import pipeline
 
-CAT_LIST_EN = load("ram_categorized_en.txt")
-CAT_LIST_SP = load("ram_categorized_sp.txt")
+__getattr__ = lazy_pools(__name__, {
+    "RAM_LIST_EN": "ram_wordpool_en.txt",
+    "RAM_LIST_SP": "ram_wordpool_sp.txt",
+    "CAT_LIST_EN": "ram_categorized_en.txt",
+    "CAT_LIST_SP": "ram_categorized_sp.txt",
+})
 
 
-def generate_session_pool(num_lists=26, language="EN"):
+@instrument.timed("fr.generate_session_pool")
+def generate_session_pool(num_lists=26, language="EN", rng=None):
     """Generate the pool of words for a single task session. This does *not*
     assign stim, no-stim, or PS metadata since this part depends on the
     experiment.
 
     :param int num_lists: Total number of lists excluding the practice list.
     :param str language: Session language (``EN`` or ``SP``).
+    :param rng: Random number generator or seed (see :func:`wordpool.rng.get_rng`).
     :returns: Word pool
     :rtype: pd.DataFrame
 
     """
-    global RAM_LIST_EN
+    return pipeline.fr_session(num_lists, language, rng=rng).to_dataframe()
+
+
+@instrument.timed("fr.generate_n_session_pools")
+def generate_n_session_pools(n_sessions, num_lists=26, language="EN", stacked=True, rng=None):
+    """Generate the pools of words for many task sessions at once. This is
+    equivalent to calling :func:`generate_session_pool` ``n_sessions`` times
+    but draws all permutations in a single step.
+
+    :param int n_sessions: Number of sessions to generate.
+    :param int num_lists: Total number of lists excluding the practice list.
+    :param str language: Session language (``EN`` or ``SP``).
+    :param bool stacked: When True (the default), return all sessions as a
+        single frame with an additional ``session`` column. Otherwise, return
+        a :class:`SessionPools` view which only builds a session's frame when
+        it is accessed.
+    :param rng: Random number generator or seed (see :func:`wordpool.rng.get_rng`).
+    :rtype: pd.DataFrame or SessionPools
+
+    """
     assert language in ("EN", "SP")
 
-    words = RAM_LIST_EN if language == "EN" else RAM_LIST_SP
-    words = shuffle_words(words).reset_index(drop=True)
+    words = get_pool("ram_wordpool_{:s}.txt".format(language.lower()))
+    n_words = len(words)
+    assert n_words % num_lists == 0, \
+        "The number of words must be evenly divisible by the number of lists."
+
+    # each row is an independent permutation of the pool, shuffled in place
+    # rather than by sorting random keys
+    order = get_rng(rng).permuted(np.broadcast_to(np.arange(n_words), (n_sessions, n_words)), axis=1)
+    pools = SessionPools(words, order, n_words // num_lists)
+    return pools.stacked() if stacked else pools
+
+
+class SessionPools(Sequence):
+    """Lazy view of a batch of FR session pools. Indexing returns the same
+    frame :func:`generate_session_pool` would.
+
+    :param pd.DataFrame words: The word pool sessions are drawn from.
+    :param np.ndarray order: ``(n_sessions, n_words)`` array of row positions
+        in ``words`` for each session.
+    :param int list_length: Number of words per list.
+
+    """
+    def __init__(self, words, order, list_length):
+        self.words = words
+        self.order = order
+        self.listnos = np.arange(order.shape[1]) // list_length
+
+    def __len__(self):
+        return len(self.order)
 
-    word_list = pool_dataframe_to_pool_list(words)
+    def __getitem__(self, session):
+        if isinstance(session, slice):
+            return [self[i] for i in range(*session.indices(len(self)))]
+        df = self.words.take(self.order[session]).reset_index(drop=True)
+        df["listno"] = self.listnos
+        return df
 
-    pool_list = assign_list_numbers_from_word_list(word_list, num_lists)
-    df = pool_list_to_pool_dataframe(pool_list)
-    return df
+    def stacked(self):
+        """Return all sessions as a single frame with a ``session`` column."""
+        n_sessions, n_words = self.order.shape
+        rows = self.order.ravel()
+        columns = {"session": np.repeat(np.arange(n_sessions), n_words)}
+        columns.update((name, self.words[name].to_numpy()[rows]) for name in self.words.columns)
+        columns["listno"] = np.tile(self.listnos, n_sessions)
+        return pd.DataFrame(columns, copy=False)
@@ -1,89 +1,251 @@
-from collections import deque
-import numpy as np
-from numpy.random import shuffle
-import pandas as pd
+from .. import get_pool, instrument
+from .._lazy import np, pd
+from ..registry import LazyPoolMapping, lazy_pools
+from ..rng import get_rng
+from ..vocab import Vocabulary
 
-from .. import load, assign_list_numbers
 
+wordpools = LazyPoolMapping({
+    'EN': "ram_wordpool_en.txt",
+    'SP': "ram_wordpool_sp.txt"
+})
 
-wordpools = {
-    'EN': load("ram_wordpool_en.txt"),
-    'SP': load("ram_wordpool_sp.txt")
-}
+__getattr__ = lazy_pools(__name__, {
+    "PRACTICE_LIST_EN": "practice_en.txt",
+    "PRACTICE_LIST_SP": "practice_sp.txt",
+})
 
-PRACTICE_LIST_EN = load("practice_en.txt")
-PRACTICE_LIST_SP = load("practice_sp.txt")
 
+@instrument.timed("pal.generate_n_session_pairs")
+def generate_n_session_pairs(n_sessions, n_lists=26, n_pairs=6, language='EN', stacked=False, rng=None):
+    """Generate the word pairs of several PAL sessions of a subject. Every
+    session pairs up words differently, so no pair is repeated across
+    sessions.
 
-def generate_n_session_pairs(n_sessions, n_lists=26, n_pairs=6, language='EN'):
-    words = wordpools[language].values
+    :param int n_sessions: Number of sessions (at most half the pool size).
+    :param int n_lists: Number of lists excluding the practice list.
+    :param int n_pairs: Number of pairs per list.
+    :param str language: Session language (``EN`` or ``SP``).
+    :param bool stacked: When True, return all sessions as a single frame with
+        an additional ``session`` column instead of a list of frames.
+    :param rng: Random number generator or seed (see :func:`wordpool.rng.get_rng`).
+    :rtype: list or pd.DataFrame
+
+    """
+    rng = get_rng(rng)
+
+    # wordpools are shared, read-only views, so only index into them
+    words = wordpools[language].word.values
     n_words = len(words)
     assert n_lists*n_pairs*2 == n_words
-    shuffle(words)
-    words = deque([w[0] for w in words])
-    sess_pools = []
-    indices = np.random.choice(int(n_words/2), size=n_sessions, replace=False)
-    for i in indices:
-        words.rotate(i)
-        word1 = list(words)[:int(n_words / 2)]
-        word2 = list(words)[int(n_words / 2):]
-        word2.reverse()
-        new_session = pd.DataFrame(np.array([word1, word2]).T, columns=['word1', 'word2'])
-        sess_pools.append(add_fields(new_session))
-        words.rotate(-1*i)
-    return sess_pools
-
-
-def add_fields(word_lists=None, pairs_per_list=6, num_lists=26, language='EN'):
+    half = n_words // 2
+    words = words[rng.permutation(n_words)]
+
+    # Row s of index is np.roll(arange(n_words), shifts[s]). Pairing the first
+    # half of each rolled pool with the reversed second half pairs words
+    # whose positions add up to n_words - 1 - 2 * shift, so sessions with
+    # distinct shifts share no pairs.
+    shifts = rng.choice(half, size=n_sessions, replace=False)
+    index = (np.arange(n_words) - shifts[:, None]) % n_words
+    word1 = words[index[:, :half]]
+    word2 = words[index[:, ::-1][:, :half]]
+    return _sessions(word1, word2, n_pairs, language, rng, stacked)
+
+
+def add_fields(word_lists=None, pairs_per_list=6, num_lists=26, language='EN', rng=None):
     """Generate the pool of words for a single task session. This does *not*
     assign stim, no-stim, or PS metadata since this part depends on the
     experiment.
 
-    :param int words_per_list: Number of words in each list.
+    :param pd.DataFrame word_lists: Pairs (``word1`` and ``word2`` columns) to
+        use. By default, pairs are drawn from the word pool at random.
+    :param int pairs_per_list: Number of pairs in each list.
     :param int num_lists: Total number of lists excluding the practice list.
     :param str language: Session language (``EN`` or ``SP``).
+    :param rng: Random number generator or seed (see :func:`wordpool.rng.get_rng`).
     :returns: Word pool
     :rtype: pd.DataFrame
 
     """
+    rng = get_rng(rng)
     if word_lists is None:
-        words = wordpools[language].values
-        shuffle(words)
+        words = wordpools[language].word.values[rng.permutation(len(wordpools[language]))]
         assert len(words) == pairs_per_list * 2 * num_lists
-        word_lists = pd.DataFrame(words.reshape((-1, 2)), columns=['word1', 'word2'])
+        word1, word2 = words[0::2], words[1::2]
+    else:
+        assert len(word_lists) == pairs_per_list * num_lists
+        word1, word2 = word_lists.word1.values, word_lists.word2.values
 
     assert language in ['EN', 'SP']
-    practice_list_words = (PRACTICE_LIST_EN if language == 'EN' else PRACTICE_LIST_SP).values
-    shuffle(practice_list_words)
-    practice_list = pd.DataFrame(practice_list_words.reshape((-1, 2)), columns=['word1', 'word2'])
+    return _sessions(word1[None], word2[None], pairs_per_list, language, rng)[0]
 
-    practice_list['type'] = 'PRACTICE'
-    practice_list['listno'] = 0
 
-    word_lists = assign_list_numbers(word_lists, num_lists, start=1)
-    full_list = pd.concat([practice_list, word_lists], ignore_index=True)
-    cue_positions_by_list = [assign_cues(w) for _, w in full_list.groupby('listno')]
-    full_list['cue_pos'] = np.concatenate(cue_positions_by_list)
-    return full_list
+def _sessions(word1, word2, pairs_per_list, language, rng, stacked=False):
+    """Add a practice list, list numbers and cue positions to the pairs of
+    many sessions at once.
 
+    :param np.ndarray word1: First words with one row per session.
+    :param np.ndarray word2: Second words.
 
-def assign_cues(words):
+    """
+    n_sessions, n_pairs = word1.shape
+
+    # every session gets its own order of practice words
+    practice = get_pool("practice_{:s}.txt".format(language.lower())).word.values
+    practice = practice[np.argsort(rng.random((n_sessions, len(practice))), axis=1)]
+    word1 = np.concatenate([practice[:, 0::2], word1], axis=1)
+    word2 = np.concatenate([practice[:, 1::2], word2], axis=1)
+    n_practice = len(practice[0]) // 2
+
+    listno = np.r_[np.zeros(n_practice, dtype=int), 1 + np.arange(n_pairs) // pairs_per_list]
+    types = np.r_[np.full(n_practice, 'PRACTICE', dtype=object), np.full(n_pairs, np.nan, dtype=object)]
+
+    # Balanced cues: rank pairs within each list at random and cue word1 for
+    # odd ranks, as assign_cues does
+    n_total = len(listno)
+    order = np.lexsort((rng.random((n_sessions, n_total)), np.broadcast_to(listno, (n_sessions, n_total))),
+                       axis=-1)
+    starts = np.searchsorted(listno, listno)
+    rank = np.empty_like(order)
+    np.put_along_axis(rank, order, np.arange(n_total) - starts, axis=1)
+    cues = np.where(rank % 2, 'word1', 'word2').astype(object)
+
+    # pairs as tuples in a word column, as pool_dataframe_to_pool_list makes
+    # them (practice pairs never had one)
+    pairs = np.full((n_sessions, n_total), np.nan, dtype=object)
+    pairs[:, n_practice:] = _tuples(word1[:, n_practice:], word2[:, n_practice:])
+
+    frame = pd.DataFrame({
+        'session': np.repeat(np.arange(n_sessions), n_total),
+        'word1': word1.ravel(),
+        'word2': word2.ravel(),
+        'type': np.tile(types, n_sessions),
+        'listno': np.tile(listno, n_sessions),
+        'word': pairs.ravel(),
+        'cue_pos': cues.ravel(),
+    })
+    if stacked:
+        return frame
+
+    frame = frame.drop(columns='session')
+    return [frame.iloc[i * n_total:(i + 1) * n_total].reset_index(drop=True) for i in range(n_sessions)]
+
+
+def _tuples(word1, word2):
+    """Return an object array of ``(word1, word2)`` tuples of the same shape
+    as its arguments.
+
+    """
+    pairs = np.empty(word1.size, dtype=object)
+    pairs[:] = list(zip(word1.ravel().tolist(), word2.ravel().tolist()))
+    return pairs.reshape(word1.shape)
+
+
+def assign_cues(words, rng=None):
     cues = ['word1' if i % 2 else 'word2' for i in range(len(words))]
-    shuffle(cues)
+    get_rng(rng).shuffle(cues)
     return cues
 
 
+class PairIndex(object):
+    """Order-insensitive index of word pairs.
+
+    Words are mapped to their codes in a :class:`wordpool.vocab.Vocabulary`
+    of the indexed words and every pair to a single integer key with the smaller code first, so
+    whole frames of pairs can be looked up at once and ``(a, b)`` matches
+    ``(b, a)``.
+
+    :param pd.DataFrame pairs: Pairs to index (``word1`` and ``word2``
+        columns).
+    :param Vocabulary vocabulary: Vocabulary to add the words to instead of
+        a new one.
+
+    """
+    def __init__(self, pairs, vocabulary=None):
+        self.vocabulary = Vocabulary() if vocabulary is None else vocabulary
+        self.vocabulary.intern(np.concatenate([pairs.word1.values, pairs.word2.values]))
+
+        # words interned later can't be in the index, so keys only need to
+        # cover the current vocabulary
+        self.size = len(self.vocabulary)
+        self.pair_keys = np.unique(self.keys(pairs))
+
+    def __len__(self):
+        return len(self.pair_keys)
+
+    def __contains__(self, pair):
+        word1, word2 = pair
+        return bool(self.contains(pd.DataFrame({'word1': [word1], 'word2': [word2]}))[0])
+
+    def keys(self, pairs):
+        """Return the key of each pair in a frame. Pairs with a word that
+        isn't in the index get a key of -1.
+
+        """
+        a = self.vocabulary.lookup(pairs.word1.values).astype(np.int64)
+        b = self.vocabulary.lookup(pairs.word2.values).astype(np.int64)
+        lo, hi = np.minimum(a, b), np.maximum(a, b)
+        return np.where((lo < 0) | (hi >= self.size), -1, lo * self.size + hi)
+
+    def contains(self, pairs):
+        """Return a boolean array which is True for each pair in a frame which
+        is in the index.
+
+        """
+        keys = self.keys(pairs)
+        return (keys >= 0) & np.isin(keys, self.pair_keys)
+
+
 def equal_pairs(a, b):
-    backward = np.array(
-        [(b.loc[b.word2 == a.loc[i].word1].word1 == a.loc[i].word2).any()
-         for i in a.index]).astype(np.bool)
-    forward = np.array(
-        [(b.loc[b.word1 == a.loc[i].word1].word2 == a.loc[i].word2).any()
-         for i in a.index]).astype(np.bool)
-    return backward | forward
+    """Return a boolean array which is True for each pair in ``a`` that also
+    appears in ``b`` in either order.
+
+    """
+    return PairIndex(b).contains(a)
+
+
+def session_overlap(sessions):
+    """Count the pairs shared between each two sessions.
+
+    :param list sessions: Session pools (frames with ``word1`` and ``word2``
+        columns). Practice lists are usually the same across sessions, so
+        they should be excluded beforehand.
+    :returns: ``(n_sessions, n_sessions)`` array with the number of distinct
+        pairs shared by each two sessions and zeros on the diagonal.
+    :rtype: np.ndarray
+
+    """
+    n_sessions = len(sessions)
+    stacked = pd.concat([session[['word1', 'word2']] for session in sessions], ignore_index=True)
+    session_ids = np.repeat(np.arange(n_sessions), [len(session) for session in sessions])
+
+    # distinct (pair, session) combinations
+    keys = PairIndex(stacked).keys(stacked)
+    combined = np.unique(keys * n_sessions + session_ids)
+    keys, session_ids = combined // n_sessions, combined % n_sessions
+
+    # keep pairs found in more than one session and build an incidence matrix
+    _, shared_ids, counts = np.unique(keys, return_inverse=True, return_counts=True)
+    shared = counts[shared_ids] > 1
+    _, columns = np.unique(keys[shared], return_inverse=True)
+    incidence = np.zeros((n_sessions, columns.max() + 1 if shared.any() else 0), dtype=np.int64)
+    incidence[session_ids[shared], columns] = 1
+
+    overlap = incidence.dot(incidence.T)
+    np.fill_diagonal(overlap, 0)
+    return overlap
 
 
 def where_(word, wordpool):
+    """Return a boolean mask of the pairs containing ``word``, which can also
+    be a list of words to look up at once.
+
+    """
     if wordpool.empty:
         return np.array([])
-    return (wordpool.word1 == word) | (wordpool.word2 == word)
+    if isinstance(word, str):
+        return (wordpool.word1 == word) | (wordpool.word2 == word)
+
+    wanted = Vocabulary(word)
+    mask = (wanted.lookup(wordpool.word1) >= 0) | (wanted.lookup(wordpool.word2) >= 0)
+    return pd.Series(mask, index=wordpool.index)
@@ -0,0 +1,169 @@
+"""Session pipelines.
+
+A :class:`SessionPipeline` records the steps of generating a session (e.g.,
+FR lists, list types, multistim and LEARN1 blocks) and runs them all on a
+single columnar :class:`wordpool.columnar.WordPool` instead of converting
+between frames and lists of dictionaries at every step::
+
+    pipeline = (SessionPipeline(rng=1)
+                .fr_session(language="EN")
+                .list_types(4, 6, 16)
+                .multistim({(0,): 5, (1,): 5, (0, 1): 6})
+                .learn1_blocks(2, 2, (0, 1)))
+    pool = pipeline.run()
+    print(pipeline.timings)
+
+The stage functions in this module are the columnar implementations behind
+the corresponding :mod:`wordpool.listgen` functions and give the same
+results for the same random number generator.
+
+"""
+
+from collections import OrderedDict
+from functools import partial
+import time
+
+from .. import get_pool, instrument
+from .._lazy import np, pd
+from ..columnar import WordPool
+from ..nopandas import (
+    assign_list_numbers_from_word_list, assign_list_types_from_type_list,
+    assign_multistim_from_stim_channels_list, extract_blocks
+)
+from ..rng import get_rng
+
+
+def fr_session(num_lists=26, language="EN", rng=None):
+    """Columnar implementation of :func:`wordpool.listgen.fr.generate_session_pool`."""
+    assert language in ("EN", "SP")
+
+    words = get_pool("ram_wordpool_{:s}.txt".format(language.lower()))
+    order = get_rng(rng).permutation(len(words))
+    pool = WordPool.from_dataframe(words).take(order)
+    return assign_list_numbers_from_word_list(pool, num_lists)
+
+
+def assign_list_types(pool, num_baseline, num_nonstim, num_stim, num_ps=0, rng=None):
+    """Columnar implementation of :func:`wordpool.listgen.assign_list_types`."""
+    # List numbers should already be assigned and sorted
+    listnos = pd.unique(pool["listno"])
+    assert all([n == m for n, m in zip(listnos, sorted(listnos))])
+
+    # Check that the inputs match the number of lists
+    parameters_lists = num_baseline + num_nonstim + num_stim + num_ps
+    error_message = "Parameters call for " + str(parameters_lists) + " lists, but I see " + str(len(listnos)) + " list numbers."
+    assert len(listnos) == parameters_lists, error_message
+
+    stim_or_nostim = ["NON-STIM"] * num_nonstim + ["STIM"] * num_stim
+    get_rng(rng).shuffle(stim_or_nostim)
+
+    return assign_list_types_from_type_list(pool, num_baseline, stim_or_nostim, num_ps=num_ps)
+
+
+def assign_multistim(pool, stimspec, rng=None):
+    """Columnar implementation of :func:`wordpool.listgen.assign_multistim`."""
+    assert 'phase_type' in pool, "You must assign stim lists first"
+    stim = pool['phase_type'] == 'STIM'
+    assert stim.any(), "You must assign stim lists first"
+    assert sum(stimspec.values()) == len(pd.unique(pool['listno'][stim])), \
+        "Incompatible number of stim lists"
+
+    stimspec_list = []
+    for key, value in stimspec.items():
+        stimspec_list += [key] * value
+    get_rng(rng).shuffle(stimspec_list)
+
+    return assign_multistim_from_stim_channels_list(pool, stimspec_list)
+
+
+def learn1_blocks(pool, num_nonstim, num_stim, stim_channels=(0, 1), num_blocks=4, rng=None):
+    """Columnar implementation of :func:`wordpool.listgen.generate_learn1_blocks`."""
+    rng = get_rng(rng)
+    listnos = pool['listno']
+    matches = np.array([channels == stim_channels for channels in pool['stim_channels']], dtype=bool)
+    nonstim_listnos = rng.choice(pd.unique(listnos[pool['phase_type'] == 'NON-STIM']), num_nonstim, replace=False).tolist()
+    stim_listnos = rng.choice(pd.unique(listnos[matches]), num_stim, replace=False).tolist()
+    listnos = nonstim_listnos + stim_listnos
+
+    listnos_sequence = []
+    for i in range(num_blocks):
+        block_listnos = listnos[:]
+        rng.shuffle(block_listnos)
+        listnos_sequence += block_listnos
+
+    return extract_blocks(pool, listnos_sequence, num_blocks)
+
+
+class SessionPipeline(object):
+    """Builder for session generation pipelines.
+
+    Stages are only recorded when added and run in order by :meth:`run`.
+    Each stage is a function taking the current pool and keyword arguments
+    (including the pipeline's ``rng``) and returning the new pool.
+
+    :param rng: Random number generator or seed (see
+        :func:`wordpool.rng.get_rng`) shared by all stages.
+
+    """
+    def __init__(self, rng=None):
+        self.rng = rng
+        self.stages = []
+        self.timings = OrderedDict()
+
+    def __repr__(self):
+        return "<SessionPipeline: {}>".format(" -> ".join(name for name, _ in self.stages))
+
+    def stage(self, name, func, **kwargs):
+        """Add a stage.
+
+        :param str name: Stage name used for timings.
+        :param callable func: ``func(pool, rng=rng, **kwargs)`` returning a
+            :class:`WordPool`. The first stage gets a pool of None.
+        :returns: The pipeline.
+
+        """
+        self.stages.append((name, partial(func, **kwargs)))
+        return self
+
+    def fr_session(self, num_lists=26, language="EN"):
+        """Start from an FR session pool (see
+        :func:`wordpool.listgen.fr.generate_session_pool`).
+
+        """
+        return self.stage("fr_session", lambda pool, **kwargs: fr_session(**kwargs),
+                          num_lists=num_lists, language=language)
+
+    def list_types(self, num_baseline, num_nonstim, num_stim, num_ps=0):
+        """Assign list types (see :func:`wordpool.listgen.assign_list_types`)."""
+        return self.stage("list_types", assign_list_types, num_baseline=num_baseline,
+                          num_nonstim=num_nonstim, num_stim=num_stim, num_ps=num_ps)
+
+    def multistim(self, stimspec):
+        """Assign stim channels (see :func:`wordpool.listgen.assign_multistim`)."""
+        return self.stage("multistim", assign_multistim, stimspec=stimspec)
+
+    def learn1_blocks(self, num_nonstim, num_stim, stim_channels=(0, 1), num_blocks=4):
+        """Extract LEARN1 blocks (see
+        :func:`wordpool.listgen.generate_learn1_blocks`).
+
+        """
+        return self.stage("learn1_blocks", learn1_blocks, num_nonstim=num_nonstim, num_stim=num_stim,
+                          stim_channels=stim_channels, num_blocks=num_blocks)
+
+    def run(self, pool=None):
+        """Run all stages and record the time each took in :attr:`timings`.
+
+        :param WordPool pool: Pool passed to the first stage.
+        :returns: The resulting pool. Use :meth:`WordPool.to_dataframe` to get
+            a frame.
+        :rtype: WordPool
+
+        """
+        rng = get_rng(self.rng)
+        self.timings = OrderedDict()
+        for name, func in self.stages:
+            t0 = time.perf_counter()
+            with instrument.stage("pipeline." + name):
+                pool = func(pool, rng=rng)
+            self.timings[name] = self.timings.get(name, 0) + time.perf_counter() - t0
+        return pool
@@ -0,0 +1,354 @@
+"""Multi-session exposure planning.
+
+:func:`wordpool.listgen.fr.generate_session_pool` and
+:func:`wordpool.listgen.catfr.generate_session_pool` draw every session
+independently, so nothing keeps a subject from seeing the same words together
+in a list again or a word in the same serial position over and over. An
+:class:`ExposurePlanner` generates all sessions of a subject in turn and keeps
+an :class:`ExposureIndex` of how often each word was presented, in which
+serial positions and together with which other words:
+
+* FR lists are built one serial position at a time (in random order). Each
+  position takes the words shown least often in it and every word goes to
+  the list with whose words it was presented least often.
+* catFR lists pick categories which shared a list least often (through the
+  ``cooccurrence`` argument of
+  :func:`wordpool.listgen.catfr.assign_list_numbers`), split every category
+  into the groups of 4 words with the fewest repeated pairs and finally
+  order words within each category pair slot by their serial position
+  counts. Sessions still satisfy all catFR constraints.
+
+Use :func:`plan_cohort` to plan sessions for many subjects::
+
+    sessions = plan_cohort("FR", subjects, 24, seed=42)
+
+"""
+
+from collections import OrderedDict
+from functools import lru_cache
+from itertools import permutations
+from math import factorial
+import os
+
+from .. import get_pool, shuffle_within_groups
+from .._lazy import np, pd
+from ..rng import get_rng, session_rng
+from . import catfr
+
+EXPERIMENTS = ("FR", "catFR")
+
+
+class ExposureIndex(object):
+    """Counts of how often items (words or categories) were presented.
+
+    :param int n_items: Number of items.
+    :param int list_length: Number of serial positions.
+
+    """
+    def __init__(self, n_items, list_length):
+        #: Number of lists each item was presented in.
+        self.exposures = np.zeros(n_items, dtype=np.int32)
+        #: ``positions[i, p]`` counts presentations of item i at position p.
+        self.positions = np.zeros((n_items, list_length), dtype=np.int32)
+        #: ``cooccurrence[i, j]`` counts lists containing both i and j.
+        self.cooccurrence = np.zeros((n_items, n_items), dtype=np.int32)
+
+    def record(self, lists):
+        """Count a session.
+
+        :param np.ndarray lists: Item indices with one row per list in
+            serial position order.
+
+        """
+        lists = np.asarray(lists)
+        # items (e.g., categories) can appear in several lists, so repeated
+        # indices have to be counted with np.add.at rather than +=
+        np.add.at(self.exposures, lists, 1)
+        np.add.at(self.positions, (lists, np.arange(lists.shape[1])), 1)
+        np.add.at(self.cooccurrence, (lists[:, :, None], lists[:, None, :]), 1)
+        np.add.at(self.cooccurrence, (lists, lists), -1)
+
+    def repeated_pairs(self):
+        """Return the number of pairs of items which were presented together
+        more than once.
+
+        """
+        return int(np.triu(self.cooccurrence > 1, 1).sum())
+
+
+def _assign(cost, rng):
+    """Greedily match words (rows) to lists (columns) of a square cost
+    matrix. Every round, each word asks for its cheapest free list and each
+    list takes the cheapest of the words asking for it.
+
+    """
+    cost = cost + rng.random(cost.shape)  # breaks ties at random
+    assignment = np.full(len(cost), -1, dtype=np.intp)
+    words = np.arange(len(cost))
+    while len(words):
+        best = cost[words].argmin(axis=1)
+        order = np.lexsort((cost[words, best], best))
+        won = order[np.r_[True, best[order][1:] != best[order][:-1]]]
+        assignment[words[won]] = best[won]
+        cost[:, best[won]] = np.inf
+        words = words[assignment[words] < 0]
+    return assignment
+
+
+#: Maximum number of ways to split a category which are compared. The cost
+#: of choosing splits grows with the square of this number.
+MAX_SPLITS = 256
+
+
+@lru_cache(maxsize=None)
+def _all_splits(n_groups):
+    """Return all ways of splitting ``2 * n_groups`` items into labeled pairs
+    as the group of each item, in lexicographic order.
+
+    """
+    labels = []
+
+    def extend(prefix, left):
+        if len(prefix) == 2 * n_groups:
+            labels.append(list(prefix))
+            return
+        for group in range(n_groups):
+            if left[group]:
+                left[group] -= 1
+                prefix.append(group)
+                extend(prefix, left)
+                prefix.pop()
+                left[group] += 1
+
+    extend([], [2] * n_groups)
+    return np.array(labels, dtype=np.intp).reshape(-1, 2 * n_groups)
+
+
+def _splits(n_groups, rng):
+    """Return ways of splitting ``2 * n_groups`` items into labeled pairs:
+    all of them when there are at most :data:`MAX_SPLITS`, which is the case
+    for up to 6 items (90 splits), or else as many random ones.
+
+    """
+    if factorial(2 * n_groups) // 2 ** n_groups <= MAX_SPLITS:
+        return _all_splits(n_groups)
+    labels = np.tile(np.repeat(np.arange(n_groups), 2), (MAX_SPLITS, 1))
+    return rng.permuted(labels, axis=1)
+
+
+class ExposurePlanner(object):
+    """Plans the sessions of a subject.
+
+    :param str experiment: ``FR`` or ``catFR``.
+    :param str language: Session language (``EN`` or ``SP``).
+    :param int num_lists: Number of FR lists per session. catFR sessions
+        always use the defaults of :mod:`wordpool.listgen.catfr`.
+    :param int list_length: Number of words per FR list. Defaults to using
+        every word in the pool once per session. With fewer, the least
+        exposed words are used.
+    :param rng: Random number generator or seed (see
+        :func:`wordpool.rng.get_rng`).
+
+    """
+    def __init__(self, experiment="FR", language="EN", num_lists=26, list_length=None, rng=None):
+        if experiment not in EXPERIMENTS:
+            raise ValueError("Experiment must be one of {}".format(", ".join(EXPERIMENTS)))
+        assert language in ("EN", "SP")
+
+        self.experiment = experiment
+        self.rng = get_rng(rng)
+
+        if experiment == "FR":
+            self.words = get_pool("ram_wordpool_{:s}.txt".format(language.lower()))
+            self.num_lists = num_lists
+            self.list_length = list_length or len(self.words) // num_lists
+            assert self.num_lists * self.list_length <= len(self.words), "Not enough words"
+            self.category_index = None
+        else:
+            self.words = get_pool("ram_categorized_{:s}.txt".format(language.lower()))
+            self.words["_item"] = np.arange(len(self.words))
+            self.categories = pd.unique(self.words.category)
+            self.list_length = 12
+            self.category_index = ExposureIndex(len(self.categories), 3)
+
+        self.index = ExposureIndex(len(self.words), self.list_length)
+        self.n_planned = 0
+
+    def __repr__(self):
+        return "<ExposurePlanner ({}): {:d} sessions>".format(self.experiment, self.n_planned)
+
+    def plan(self):
+        """Plan the next session.
+
+        :returns: Session pool with the same columns as the experiment's
+            ``generate_session_pool``.
+        :rtype: pd.DataFrame
+
+        """
+        pool = self._plan_fr() if self.experiment == "FR" else self._plan_catfr()
+        self.n_planned += 1
+        return pool
+
+    def plan_sessions(self, n_sessions):
+        """Plan the next ``n_sessions`` sessions."""
+        return [self.plan() for _ in range(n_sessions)]
+
+    def _plan_fr(self):
+        rng, index = self.rng, self.index
+        n_lists, length = self.num_lists, self.list_length
+
+        available = np.zeros(len(self.words), dtype=bool)
+        available[np.lexsort((rng.random(len(available)), index.exposures))[:n_lists * length]] = True
+
+        lists = np.empty((n_lists, length), dtype=np.intp)
+        filled = []
+        for position in rng.permutation(length):
+            candidates = np.flatnonzero(available)
+            keys = (rng.random(len(candidates)), index.positions[candidates, position])
+            words = candidates[np.lexsort(keys)[:n_lists]]
+
+            current = lists[:, filled]
+            cost = index.cooccurrence[words[:, None, None], current[None]].sum(axis=-1)
+            lists[_assign(cost, rng), position] = words
+            available[words] = False
+            filled.append(position)
+
+        index.record(lists)
+        return pd.DataFrame({
+            "word": self.words.word.values[lists.ravel()],
+            "listno": np.repeat(np.arange(n_lists), length),
+        })
+
+    def _plan_catfr(self):
+        rng = self.rng
+        cooccurrence = pd.DataFrame(self.category_index.cooccurrence, index=self.categories,
+                                    columns=self.categories)
+
+        pool = catfr.assign_word_numbers(shuffle_within_groups(self.words, "category", rng=rng))
+        pool = self._split_categories(catfr.assign_list_numbers(pool, cooccurrence=cooccurrence, rng=rng))
+        pool = self._order_pairs(catfr.sort_pairs(pool, rng=rng))
+
+        items = pool.pop("_item").values
+        lists = items.reshape(-1, self.list_length)
+        self.index.record(lists)
+        first_round = pd.Index(self.categories).get_indexer(pool.category.values).reshape(len(lists), -1)
+        self.category_index.record(first_round[:, :self.list_length // 2:2])
+        return pool
+
+    def _split_categories(self, pool):
+        """Choose which words of a category share a list, vectorized over all
+        categories.
+
+        """
+        cats = pd.Index(self.categories).get_indexer(pool.category.values)
+        parity = (pool.wordno.values % 2).astype(int)
+        listnos = pool.listno.values.copy()
+
+        # rows by category, parity and list, which must give 2 words of each
+        # parity to each list of a category
+        order = np.lexsort((listnos, parity, cats))
+        n_cats = len(self.categories)
+        per_parity, rem = divmod(len(pool), 2 * n_cats)
+        if rem or per_parity % 2 or (listnos < 0).any():
+            return pool
+        rows = order.reshape(n_cats, 2, per_parity)
+        if (cats[rows] != np.arange(n_cats)[:, None, None]).any() or (parity[rows] != [[0], [1]]).any():
+            return pool
+        if (listnos[rows[:, :, ::2]] != listnos[rows[:, :, 1::2]]).any() or \
+                (listnos[rows[:, 0, ::2]] != listnos[rows[:, 1, ::2]]).any():
+            return pool
+
+        splits = _splits(per_parity // 2, self.rng)
+        groups = np.arange(per_parity // 2)
+        member = (splits[:, None, :] == groups[None, :, None]).astype(float)
+        uses = listnos[rows[:, 0, ::2]]
+
+        items = pool._item.values[rows]
+        co = self.index.cooccurrence
+        even, odd = items[:, 0], items[:, 1]
+
+        # cost[c, s, t] of splitting even words by s and odd words by t is the
+        # number of earlier presentations together of words in the same group
+        flat = member.reshape(-1, member.shape[-1])
+
+        def together(a, b, within=False):
+            pairs = co[a[:, :, None], b[:, None, :]].astype(float)
+            weighted = np.matmul(flat, pairs)
+            if within:
+                return (weighted * flat).reshape(n_cats, len(splits), -1).sum(axis=-1) // 2
+            return np.matmul(weighted.reshape(n_cats, len(splits), -1), flat.reshape(len(splits), -1).T)
+
+        within_even = together(even, even, within=True)
+        within_odd = together(odd, odd, within=True)
+        mixed = together(even, odd)
+
+        cost = within_even[:, :, None] + within_odd[:, None, :] + mixed + self.rng.random(mixed.shape, dtype=np.float32)
+        best_even, best_odd = np.divmod(cost.reshape(n_cats, -1).argmin(axis=1), len(splits))
+
+        listnos[rows[:, 0]] = np.take_along_axis(uses, splits[best_even], axis=1)
+        listnos[rows[:, 1]] = np.take_along_axis(uses, splits[best_odd], axis=1)
+        pool = pool.copy()
+        pool["listno"] = listnos
+        return pool
+
+    def _order_pairs(self, pool):
+        """Reorder the 4 words of each category in a list (which keeps pairs
+        intact) to spread serial positions.
+
+        """
+        n = len(pool)
+        position = np.arange(n) % self.list_length
+        cats = pd.Index(self.categories).get_indexer(pool.category.values)
+        buckets = np.argsort(pool.listno.values * len(self.categories) + cats, kind="stable")
+        if n % 4:
+            return pool
+        buckets = buckets.reshape(-1, 4)
+        if (cats[buckets] != cats[buckets[:, :1]]).any():
+            return pool
+
+        perms = np.array(list(permutations(range(4))), dtype=np.intp)
+        counts = self.index.positions[pool._item.values[buckets][:, :, None], position[buckets][:, None, :]]
+        cost = counts[:, perms, np.arange(4)].sum(axis=-1) + self.rng.random((len(buckets), len(perms)))
+
+        index = np.arange(n)
+        index[buckets] = np.take_along_axis(buckets, perms[cost.argmin(axis=1)], axis=1)
+        return pool.iloc[index].reset_index(drop=True)
+
+
+def _plan_subject(experiment, subject, n_sessions, root_seed, kwargs):
+    planner = ExposurePlanner(experiment, rng=session_rng(root_seed, subject, experiment=experiment), **kwargs)
+    return planner.plan_sessions(n_sessions)
+
+
+def plan_cohort(experiment, subjects, n_sessions, seed=None, max_workers=None, **kwargs):
+    """Plan all sessions of a cohort of subjects. Each subject gets its own
+    :class:`ExposurePlanner` seeded with :func:`wordpool.rng.session_rng`, so
+    results don't depend on the number of workers.
+
+    :param str experiment: ``FR`` or ``catFR``.
+    :param list subjects: Subject identifiers.
+    :param int n_sessions: Number of sessions per subject.
+    :param int seed: Root seed. When None, a fresh one is drawn from the OS.
+    :param int max_workers: Number of worker processes. Defaults to the
+        number of CPUs. With 0, everything runs in the calling process.
+    :param kwargs: Passed on to :class:`ExposurePlanner`.
+    :returns: Mapping of subjects to lists of session pools.
+    :rtype: OrderedDict
+
+    """
+    from concurrent.futures import ProcessPoolExecutor
+
+    if experiment not in EXPERIMENTS:
+        raise ValueError("Experiment must be one of {}".format(", ".join(EXPERIMENTS)))
+    subjects = list(subjects)
+    if seed is None:
+        seed = np.random.SeedSequence().entropy
+
+    args = [(experiment, subject, n_sessions, seed, kwargs) for subject in subjects]
+    if max_workers == 0 or not args:
+        sessions = [_plan_subject(*arg) for arg in args]
+    else:
+        with ProcessPoolExecutor(max_workers=max_workers) as executor:
+            chunksize = max(1, len(args) // (4 * (max_workers or os.cpu_count() or 1)))
+            sessions = list(executor.map(_plan_subject, *zip(*args), chunksize=chunksize))
+    return OrderedDict(zip(subjects, sessions))
@@ -0,0 +1,549 @@
+"""Local session generation server.
+
+Starting a Python process, importing pandas and loading word pools takes far
+longer than generating a session. A :class:`SessionServer` pays these costs
+once: it loads the pools and runs every generator once on start-up, then
+serves FR, catFR, PAL, REC1 and LEARN1 sessions over HTTP on localhost or a
+Unix socket. Requests are handled in threads, so several experiment processes
+on the same machine can use one server::
+
+    $ python -m wordpool.listgen.server --socket /tmp/wordpool.sock --seed 42
+
+and, in each experiment::
+
+    from wordpool.listgen.server import Client
+
+    client = Client("/tmp/wordpool.sock")
+    pool = client.generate("FR", subject="R1001P", session=0, list_types=[4, 6, 16, 0])
+
+A request is a POST to ``/<experiment>`` with a JSON object of parameters (see
+:meth:`SessionServer.generate`) and is answered with the session as a JSON
+object with ``columns`` and ``data`` (``pd.DataFrame.to_json`` with
+``orient="split"``). ``GET /stats`` returns request counts. Errors are
+answered with a JSON object with an ``error`` message.
+
+Sessions of a subject are drawn from :func:`wordpool.rng.session_rng`
+streams of the server's root seed, so the same request always gives the same
+session and FR, catFR and PAL sessions match those of
+:func:`wordpool.listgen.generate_cohort` with the same seed. The command line
+therefore requires a root seed, given directly with ``--seed`` or kept in a
+file with ``--seed-file`` (which is created with a fresh seed the first time,
+see :func:`load_seed`), so that a restarted server hands out the same
+sessions.
+
+"""
+
+import argparse
+from collections import OrderedDict
+from http.client import HTTPConnection, HTTPException
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+import json
+import os
+import socket
+import socketserver
+import stat
+import sys
+import threading
+import time
+
+from . import catfr, pal
+from .. import exc, get_pool, instrument, list_available_pools, listgen
+from .._lazy import np, pd
+from ..rng import session_rng
+from .cohort import _generate_unit
+from .pipeline import SessionPipeline
+
+EXPERIMENTS = ("FR", "catFR", "PAL", "REC1", "LEARN1")
+
+# Requests run once per language on start-up
+_WARMUP = (
+    ("FR", {"list_types": (4, 6, 16, 0)}),
+    ("catFR", {"list_types": (4, 6, 16, 0)}),
+    ("PAL", {}),
+    ("REC1", {"list_types": (4, 6, 16, 0)}),
+    ("LEARN1", {"list_types": (4, 6, 16, 0), "stimspec": {(0,): 5, (1,): 5, (0, 1): 6},
+                "num_nonstim": 2, "num_stim": 2}),
+)
+
+# Exceptions caused by bad parameters rather than by the server
+_BAD_REQUEST = (ValueError, TypeError, KeyError, AssertionError, exc.LanguageError, exc.ListAssignmentError)
+
+
+def _stimspec(stimspec):
+    """Convert a stimspec given as ``[[channels, count], ...]`` (as sent over
+    JSON) to a dictionary.
+
+    """
+    if stimspec is None or isinstance(stimspec, dict):
+        return stimspec
+    return {tuple(channels): count for channels, count in stimspec}
+
+
+def _json_default(value):
+    if hasattr(value, "item"):
+        return value.item()
+    raise TypeError("{!r} is not JSON serializable".format(value))
+
+
+class _Handler(BaseHTTPRequestHandler):
+    protocol_version = "HTTP/1.1"
+
+    def setup(self):
+        # headers and body are written separately, which would otherwise
+        # wait for delayed ACKs on kept-alive TCP connections
+        self.disable_nagle_algorithm = self.request.family != socket.AF_UNIX
+        BaseHTTPRequestHandler.setup(self)
+
+    def _reply(self, status, body):
+        if not isinstance(body, bytes):
+            body = json.dumps(body, default=_json_default).encode()
+        self.send_response(status)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def do_GET(self):
+        if self.path == "/stats":
+            self._reply(200, self.server.sessions.stats())
+        else:
+            self._reply(404, {"error": "Unknown path {}".format(self.path)})
+
+    def do_POST(self):
+        server = self.server.sessions
+        body = self.rfile.read(int(self.headers.get("Content-Length") or 0))
+        experiment = self.path.strip("/")
+        if experiment not in EXPERIMENTS:
+            self._reply(404, {"error": "Experiment must be one of {}".format(", ".join(EXPERIMENTS))})
+            return
+
+        try:
+            params = json.loads(body or b"{}")
+            if not isinstance(params, dict):
+                raise TypeError("Parameters must be a JSON object")
+            frame = server.generate(experiment, **params)
+        except _BAD_REQUEST as e:
+            server._record(experiment, error=True)
+            self._reply(400, {"error": "{}: {}".format(type(e).__name__, e)})
+        except Exception as e:
+            server._record(experiment, error=True)
+            self._reply(500, {"error": "{}: {}".format(type(e).__name__, e)})
+        else:
+            server._record(experiment)
+            self._reply(200, frame.to_json(orient="split", index=False).encode())
+
+    def log_message(self, format, *args):
+        pass
+
+
+class _TCPServer(ThreadingHTTPServer):
+    daemon_threads = True
+
+
+class _UnixServer(socketserver.ThreadingMixIn, socketserver.UnixStreamServer):
+    daemon_threads = True
+
+
+class SessionServer(object):
+    """Session generation server with warm word pools.
+
+    Pools are loaded and all generators run once when the server is created,
+    before it starts accepting connections. Use :meth:`serve_forever` to
+    serve in the current thread or :meth:`start` (or a ``with`` block) to
+    serve in a background thread.
+
+    :param address: ``(host, port)`` to listen on (a port of 0 picks a free
+        one) or the path of a Unix socket. A stale socket file at the path is
+        replaced.
+    :param int seed: Root seed of session streams. When None, a fresh one is
+        drawn from the OS and kept for the lifetime of the server only, so
+        sessions change when the server is restarted.
+    :param tuple languages: Languages to warm up.
+    :param bool warm: Warm up the pools and generators of all experiments.
+    :param int max_pal_subjects: Number of subjects whose PAL sessions are
+        kept (PAL sessions of a subject are generated together).
+
+    """
+    def __init__(self, address=("127.0.0.1", 0), seed=None, languages=("EN",), warm=True,
+                 max_pal_subjects=128):
+        self.seed = seed if seed is not None else np.random.SeedSequence().entropy
+        self.languages = tuple(languages)
+        self.max_pal_subjects = max_pal_subjects
+        self._pal_units = OrderedDict()
+        self._lock = threading.Lock()
+        self._counts = {}
+        self._errors = 0
+        self._started = time.time()
+        self._thread = None
+
+        #: Warm-up requests which failed, as ``{(experiment, language): message}``.
+        self.unavailable = self.warm() if warm else {}
+
+        if isinstance(address, str):
+            if os.path.exists(address) and stat.S_ISSOCK(os.stat(address).st_mode):
+                os.unlink(address)
+            self._server = _UnixServer(address, _Handler)
+        else:
+            self._server = _TCPServer(tuple(address), _Handler)
+        self._server.sessions = self
+
+    def __repr__(self):
+        return "<SessionServer: {}>".format(self.address)
+
+    def __enter__(self):
+        return self.start()
+
+    def __exit__(self, *args):
+        self.close()
+
+    @property
+    def address(self):
+        """Address the server listens on (a ``(host, port)`` tuple or the path
+        of the Unix socket).
+
+        """
+        return self._server.server_address
+
+    def warm(self):
+        """Load the pools of and run all generators once for every language.
+
+        :returns: Failed requests as ``{(experiment, language): message}``.
+        :rtype: dict
+
+        """
+        failed = {}
+        for language in self.languages:
+            for experiment, params in _WARMUP:
+                try:
+                    self.generate(experiment, subject="warmup", language=language, **params)
+                except Exception as e:
+                    failed[(experiment, language)] = "{}: {}".format(type(e).__name__, e)
+        return failed
+
+    def generate(self, experiment, subject=None, session=0, seed=None, language="EN", **params):
+        """Generate a session.
+
+        :param str experiment: One of :data:`EXPERIMENTS`.
+        :param subject: Subject identifier. When given, the session is drawn
+            from the subject's :func:`wordpool.rng.session_rng` stream of the
+            experiment (of the source experiment for REC1).
+            Otherwise, ``seed`` seeds a new generator (a random one if None).
+        :param int session: Session number.
+        :param int seed: Root seed to use instead of the server's.
+        :param str language: ``EN`` or ``SP``.
+        :param params: Further parameters of the experiment:
+
+            * FR: ``num_lists``, ``list_types`` (the arguments of
+              :func:`wordpool.listgen.assign_list_types` as a list) and
+              ``stimspec`` (see :func:`wordpool.listgen.assign_multistim`,
+              as a dictionary or a list of ``[channels, count]`` pairs).
+            * catFR: ``list_types`` and ``stimspec``.
+            * PAL: ``n_sessions`` (all sessions of a subject use different
+              pairs), ``n_lists`` and ``n_pairs``.
+            * REC1: ``source`` (``FR`` or ``catFR``) and the parameters of
+              the source session, which needs ``list_types``. The blocks are
+              those of the session returned for the same source request.
+            * LEARN1: the parameters of an FR session, which needs
+              ``list_types`` and ``stimspec``, and ``num_nonstim``,
+              ``num_stim``, ``stim_channels`` and ``num_blocks`` (see
+              :func:`wordpool.listgen.generate_learn1_blocks`).
+
+        :rtype: pd.DataFrame
+
+        """
+        if experiment not in EXPERIMENTS:
+            raise ValueError("Experiment must be one of {}".format(", ".join(EXPERIMENTS)))
+        if seed is None:
+            seed = self.seed
+
+        with instrument.stage("server." + experiment):
+            if experiment == "PAL":
+                return self._pal(subject, session, seed, language, **params)
+
+            if subject is None:
+                rng = np.random.default_rng(seed)
+            else:
+                # REC1 recalls the source session, so it shares its stream
+                stream = params.get("source", "FR") if experiment == "REC1" else experiment
+                rng = session_rng(seed, subject, session, experiment=stream)
+            if experiment == "REC1":
+                return self._rec1(rng, language, **params)
+            elif experiment == "LEARN1":
+                return self._learn1(rng, language, **params)
+            return self._session(experiment, rng, language, **params)
+
+    def _session(self, experiment, rng, language, num_lists=26, list_types=None, stimspec=None):
+        if experiment == "FR":
+            pipeline = SessionPipeline(rng).fr_session(num_lists, language)
+            if list_types is not None:
+                pipeline.list_types(*list_types)
+            if stimspec is not None:
+                pipeline.multistim(_stimspec(stimspec))
+            return pipeline.run().to_dataframe()
+
+        if experiment != "catFR":
+            raise ValueError("Sessions must be FR or catFR")
+        if num_lists != 26:
+            raise ValueError("catFR sessions always have 26 lists")
+        pool = catfr.generate_session_pool(language, rng=rng)
+        if list_types is not None:
+            pool = listgen.assign_list_types(pool, *list_types, rng=rng)
+        if stimspec is not None:
+            pool = listgen.assign_multistim(pool, _stimspec(stimspec), rng=rng)
+        return pool
+
+    def _pal(self, subject, session, seed, language, n_sessions=1, n_lists=26, n_pairs=6):
+        if not 0 <= session < n_sessions:
+            raise ValueError("Session must be less than n_sessions")
+        kwargs = dict(n_lists=n_lists, n_pairs=n_pairs, language=language)
+        if subject is None:
+            return pal.generate_n_session_pairs(n_sessions, rng=np.random.default_rng(seed), **kwargs)[session]
+
+        key = (seed, str(subject), n_sessions, n_lists, n_pairs, language)
+        with self._lock:
+            unit = self._pal_units.pop(key, None)
+        if unit is None:
+            unit = _generate_unit("PAL", subject, None, n_sessions, seed, kwargs)
+        with self._lock:
+            self._pal_units[key] = unit
+            while len(self._pal_units) > self.max_pal_subjects:
+                self._pal_units.popitem(last=False)
+        return unit[session].copy()
+
+    def _rec1(self, rng, language, source="FR", **params):
+        if params.get("list_types") is None:
+            raise ValueError("REC1 sessions need list_types")
+        filename = "REC1_lures_{:s}.txt".format(language.lower())
+        if filename not in list_available_pools():
+            raise exc.LanguageError("No REC1 lures for language {}".format(language))
+        pool = self._session(source, rng, language, **params)
+        return listgen.generate_rec1_blocks(pool, get_pool(filename), rng=rng)
+
+    def _learn1(self, rng, language, num_nonstim, num_stim, stim_channels=(0, 1), num_blocks=4,
+                num_lists=26, list_types=None, stimspec=None):
+        if list_types is None or stimspec is None:
+            raise ValueError("LEARN1 sessions need list_types and stimspec")
+        pipeline = (SessionPipeline(rng)
+                    .fr_session(num_lists, language)
+                    .list_types(*list_types)
+                    .multistim(_stimspec(stimspec))
+                    .learn1_blocks(num_nonstim, num_stim, tuple(stim_channels), num_blocks))
+        return pipeline.run().to_dataframe()
+
+    def _record(self, experiment, error=False):
+        with self._lock:
+            self._counts[experiment] = self._counts.get(experiment, 0) + 1
+            self._errors += error
+
+    def stats(self):
+        """Return the uptime in seconds, the number of requests per experiment,
+        the number of failed requests and the experiments which failed to
+        warm up.
+
+        :rtype: dict
+
+        """
+        with self._lock:
+            return {
+                "uptime": time.time() - self._started,
+                "requests": dict(self._counts),
+                "errors": self._errors,
+                "unavailable": ["{} ({})".format(*key) for key in self.unavailable],
+            }
+
+    def serve_forever(self):
+        """Serve requests until :meth:`shutdown` is called."""
+        self._server.serve_forever()
+
+    def start(self):
+        """Serve requests in a background thread.
+
+        :returns: The server.
+
+        """
+        if self._thread is None:
+            self._thread = threading.Thread(target=self.serve_forever, name="wordpool-server", daemon=True)
+            self._thread.start()
+        return self
+
+    def shutdown(self):
+        """Stop serving requests (from another thread than the one serving)."""
+        self._server.shutdown()
+        if self._thread is not None:
+            self._thread.join()
+            self._thread = None
+
+    def close(self):
+        """Stop serving, close the socket and remove the Unix socket file."""
+        if self._thread is not None:
+            self.shutdown()
+        self._server.server_close()
+        if isinstance(self.address, str) and os.path.exists(self.address):
+            os.unlink(self.address)
+
+
+class _UnixConnection(HTTPConnection):
+    def __init__(self, path, timeout=None):
+        HTTPConnection.__init__(self, "localhost", timeout=timeout)
+        self.path = path
+
+    def connect(self):
+        self.sock = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+        self.sock.settimeout(self.timeout)
+        self.sock.connect(self.path)
+
+
+class Client(object):
+    """Client of a :class:`SessionServer`.
+
+    Each thread using the client keeps its own connection open between
+    requests.
+
+    :param address: ``(host, port)`` or the path of a Unix socket.
+    :param float timeout: Socket timeout in seconds.
+
+    """
+    def __init__(self, address, timeout=None):
+        self.address = address
+        self.timeout = timeout
+        self._local = threading.local()
+        self._connections = []
+        self._lock = threading.Lock()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *args):
+        self.close()
+
+    def _connection(self):
+        connection = getattr(self._local, "connection", None)
+        if connection is None:
+            if isinstance(self.address, str):
+                connection = _UnixConnection(self.address, self.timeout)
+            else:
+                connection = HTTPConnection(*self.address, timeout=self.timeout)
+            self._local.connection = connection
+            with self._lock:
+                self._connections.append(connection)
+        return connection
+
+    def _request(self, method, path, params=None):
+        body = None if params is None else json.dumps(params, default=_json_default).encode()
+        headers = {"Content-Type": "application/json"} if body is not None else {}
+        for attempt in range(2):
+            connection = self._connection()
+            try:
+                connection.request(method, path, body, headers)
+                response = connection.getresponse()
+                data = response.read()
+                break
+            except (ConnectionError, HTTPException):
+                # the server may have closed an idle connection
+                connection.close()
+                self._local.connection = None
+                if attempt:
+                    raise
+
+        try:
+            result = json.loads(data)
+        except ValueError:
+            # e.g., an HTML error page from BaseHTTPRequestHandler.send_error
+            message = data.decode("utf-8", "replace").strip() or response.reason
+            if response.status == 200:
+                message = "Invalid response: {}".format(message)
+            raise exc.ServerError(response.status, message)
+        if response.status != 200:
+            raise exc.ServerError(response.status, result.get("error") if isinstance(result, dict) else result)
+        return result
+
+    def generate(self, experiment, **params):
+        """Request a session (see :meth:`SessionServer.generate` for the
+        parameters).
+
+        :rtype: pd.DataFrame
+
+        """
+        stimspec = params.get("stimspec")
+        if isinstance(stimspec, dict):
+            params["stimspec"] = [[list(channels), count] for channels, count in stimspec.items()]
+
+        result = self._request("POST", "/" + experiment, params)
+        frame = pd.DataFrame(result["data"], columns=result["columns"])
+
+        # JSON has no tuples (e.g., for stim channels)
+        for name in frame.columns[frame.dtypes == object]:
+            values = frame[name].tolist()
+            if any(isinstance(value, list) for value in values):
+                frame[name] = [tuple(value) if isinstance(value, list) else value for value in values]
+        return frame
+
+    def stats(self):
+        """Return the server's :meth:`SessionServer.stats`."""
+        return self._request("GET", "/stats")
+
+    def close(self):
+        """Close the connections of all threads."""
+        with self._lock:
+            for connection in self._connections:
+                connection.close()
+            self._connections = []
+        self._local = threading.local()
+
+
+def load_seed(path):
+    """Return the root seed stored in a file, creating the file with a fresh
+    seed if it doesn't exist yet.
+
+    :param str path: Seed file.
+    :rtype: int
+
+    """
+    try:
+        with open(path) as f:
+            return int(f.read())
+    except FileNotFoundError:
+        pass
+
+    from .export import write_text
+
+    # link a complete file into place, so concurrent servers agree on a seed
+    tmp = "{}.{:d}.tmp".format(path, os.getpid())
+    write_text(tmp, "{:d}\n".format(np.random.SeedSequence().entropy))
+    try:
+        os.link(tmp, path)
+    except FileExistsError:
+        pass
+    finally:
+        os.remove(tmp)
+    with open(path) as f:
+        return int(f.read())
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Serve word pool sessions to local experiments.")
+    parser.add_argument("--host", default="127.0.0.1", help="host to listen on")
+    parser.add_argument("--port", type=int, default=8642, help="port to listen on")
+    parser.add_argument("--socket", help="listen on this Unix socket instead")
+    seed = parser.add_mutually_exclusive_group(required=True)
+    seed.add_argument("--seed", type=int, help="root seed of session streams")
+    seed.add_argument("--seed-file", help="file keeping the root seed (created with a fresh seed if missing)")
+    parser.add_argument("--language", action="append", help="language to warm up (default EN)")
+    args = parser.parse_args(argv)
+
+    address = args.socket or (args.host, args.port)
+    root_seed = args.seed if args.seed is not None else load_seed(args.seed_file)
+    server = SessionServer(address, seed=root_seed, languages=args.language or ["EN"])
+    for (experiment, language), message in server.unavailable.items():
+        print("{} ({}) is unavailable: {}".format(experiment, language, message), file=sys.stderr)
+    print("Serving on {}".format(server.address))
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        server.close()
+
+
+if __name__ == "__main__":
+    main()
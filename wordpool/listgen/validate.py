@@ -0,0 +1,202 @@
+"""Session validation.
+
+:func:`validate` checks the invariants of generated sessions for any number of
+sessions at once. Sessions are grouped into lists with a single sort and
+every check is a grouped NumPy operation on integer codes, so a whole cohort
+or :class:`wordpool.listgen.bank.SessionBank` can be validated before it is
+deployed::
+
+    sessions = [s for subject in cohort.values() for s in subject]
+    violations = validate(sessions, "FR", phase_counts={"STIM": 11})
+    assert violations.empty, violations
+
+The checks are:
+
+``list_length``
+    Every list has the expected number of words (or pairs, for PAL).
+``duplicates``
+    No word appears twice in a session.
+``pairs``
+    catFR only: words come in pairs of the same category, every category of a
+    list appears in exactly two pairs and the second round of categories
+    doesn't start with the category which ended the first.
+``cues``
+    PAL only: half of the pairs of every list are cued with ``word1``.
+``phase_types``
+    Every list has a single ``phase_type`` and, with ``phase_counts``, every
+    session has the given number of lists of each phase type.
+
+"""
+
+from .._lazy import np, pd
+
+CHECKS = ("list_length", "duplicates", "pairs", "cues", "phase_types")
+
+#: Default number of items per list.
+LIST_LENGTHS = {"FR": 12, "catFR": 12, "PAL": 6}
+
+#: Number of words per category in a catFR list.
+CATEGORY_SIZE = 4
+
+
+def _columns(sessions):
+    """Return session numbers, columns (with strings as codes) and the
+    string table of sessions.
+
+    """
+    if hasattr(sessions, "coded_columns"):
+        # a SessionBank already stores strings as codes
+        columns = {name: values.ravel() for name, values in sessions.coded_columns().items()}
+        session = np.repeat(np.arange(len(sessions)), sessions.meta["length"])
+        if "session" in columns:
+            session = session * sessions.n_sessions + columns.pop("session")
+        return session, columns, sessions.strings
+
+    if isinstance(sessions, pd.DataFrame):
+        frames = [sessions]
+        session = sessions["session"].to_numpy() if "session" in sessions else np.zeros(len(sessions), dtype=int)
+    else:
+        frames = list(sessions)
+        session = np.repeat(np.arange(len(frames)), [len(frame) for frame in frames])
+
+    names = [name for name in frames[0].columns if name != "session"]
+    columns = {name: np.concatenate([frame[name].to_numpy() for frame in frames]) for name in names}
+
+    # all string columns share one table, so words can be compared across
+    # columns (e.g., word1 and word2)
+    strings = [name for name in names if columns[name].dtype == object]
+    if strings:
+        codes, table = pd.factorize(np.concatenate([columns[name] for name in strings]))
+        for i, name in enumerate(strings):
+            columns[name] = codes[i * len(session):(i + 1) * len(session)]
+    else:
+        table = np.array([], dtype=object)
+    return session, columns, np.asarray(table, dtype=object)
+
+
+def validate(sessions, experiment="FR", list_length=None, phase_counts=None):
+    """Check the invariants of sessions (see the module documentation).
+
+    :param sessions: A frame of sessions (stacked with a ``session`` column,
+        as returned by :func:`wordpool.listgen.fr.generate_n_session_pools`,
+        or a single session), a list of session frames or a
+        :class:`wordpool.listgen.bank.SessionBank` (where sessions are
+        numbered by entry and session within the entry).
+    :param str experiment: ``FR``, ``catFR`` or ``PAL``.
+    :param int list_length: Expected list length. Defaults to
+        :data:`LIST_LENGTHS` of the experiment.
+    :param dict phase_counts: Expected number of lists of each phase type in
+        every session, e.g., ``{"BASELINE": 3, "STIM": 11}``.
+    :returns: One row per violation with the ``session``, ``listno`` (-1 for
+        violations concerning a whole session), ``check`` and a ``detail``
+        message. Empty if all sessions are valid.
+    :rtype: pd.DataFrame
+
+    """
+    if experiment not in LIST_LENGTHS:
+        raise ValueError("Experiment must be one of {}".format(", ".join(LIST_LENGTHS)))
+    if list_length is None:
+        list_length = LIST_LENGTHS[experiment]
+
+    session, columns, strings = _columns(sessions)
+    index = pd.Index(strings)
+
+    def code(value):
+        found = index.get_indexer([value])[0]
+        return found if found >= 0 else -2
+
+    # Group rows into lists, keeping the order of rows within each list
+    order = np.lexsort((columns["listno"], session))
+    s, listno = session[order], columns["listno"][order]
+    new = np.r_[True, (s[1:] != s[:-1]) | (listno[1:] != listno[:-1])]
+    starts = np.flatnonzero(new)
+    group = np.cumsum(new) - 1
+    sizes = np.diff(np.r_[starts, len(s)])
+    position = np.arange(len(s)) - starts[group]
+    list_sessions, list_listnos = s[starts], listno[starts]
+
+    found = []
+
+    def report(check, rows, details):
+        """Add violations of the lists of ``rows`` (indices into groups)."""
+        rows = np.asarray(rows, dtype=int)
+        found.append(pd.DataFrame({
+            "session": list_sessions[rows],
+            "listno": list_listnos[rows],
+            "check": check,
+            "detail": list(details),
+        }))
+
+    def report_sessions(check, sessions_, details):
+        found.append(pd.DataFrame({
+            "session": sessions_,
+            "listno": -1,
+            "check": check,
+            "detail": list(details),
+        }))
+
+    # list_length
+    bad = np.flatnonzero(sizes != list_length)
+    report("list_length", bad, ("{:d} items instead of {:d}".format(n, list_length) for n in sizes[bad]))
+
+    # duplicates
+    word_columns = ["word1", "word2"] if experiment == "PAL" else ["word"]
+    words = np.concatenate([columns[name][order] for name in word_columns])
+    word_sessions = np.tile(s, len(word_columns))
+    word_groups = np.tile(group, len(word_columns))
+    by_word = np.lexsort((words, word_sessions))
+    words, word_sessions, word_groups = words[by_word], word_sessions[by_word], word_groups[by_word]
+    same = (words[1:] == words[:-1]) & (word_sessions[1:] == word_sessions[:-1])
+    repeated = np.flatnonzero(same & (words[1:] >= 0)) + 1
+    report("duplicates", word_groups[repeated], ("{} appears more than once".format(word)
+                                                 for word in strings[words[repeated]]))
+
+    if experiment == "catFR":
+        category = columns["category"][order]
+
+        # consecutive words form pairs of the same category
+        first = np.flatnonzero((position % 2 == 0) & (position + 1 < sizes[group]))
+        split = first[category[first] != category[first + 1]]
+        report("pairs", group[split], ("words {:d} and {:d} differ in category".format(p, p + 1)
+                                       for p in position[split]))
+
+        # every category appears in two pairs per list
+        keys, counts = np.unique(group * (len(strings) + 1) + category, return_counts=True)
+        bad = counts != CATEGORY_SIZE
+        bad_groups, bad_categories = keys[bad] // (len(strings) + 1), keys[bad] % (len(strings) + 1)
+        report("pairs", bad_groups, ("{} appears {:d} times".format(strings[c], n)
+                                     for c, n in zip(bad_categories, counts[bad])))
+
+        # the second round doesn't repeat the last category of the first
+        middle = np.flatnonzero(sizes >= 2)
+        half = starts[middle] + sizes[middle] // 2
+        repeat = middle[category[half - 1] == category[half]]
+        report("pairs", repeat, ("{} ends the first round and starts the second".format(c)
+                                 for c in strings[category[starts[repeat] + sizes[repeat] // 2]]))
+
+    if experiment == "PAL":
+        word1 = (columns["cue_pos"][order] == code("word1")).astype(int)
+        cued = np.add.reduceat(word1, starts) if len(starts) else word1[:0]
+        bad = np.flatnonzero(np.abs(2 * cued - sizes) > 1)
+        report("cues", bad, ("{:d} of {:d} pairs cued with word1".format(n, m)
+                             for n, m in zip(cued[bad], sizes[bad])))
+
+    if "phase_type" in columns:
+        phase = columns["phase_type"][order]
+        mixed = np.flatnonzero(np.minimum.reduceat(phase, starts) != np.maximum.reduceat(phase, starts)) \
+            if len(starts) else starts
+        report("phase_types", mixed, ("list has more than one phase type" for _ in mixed))
+
+        if phase_counts:
+            session_ids, session_codes = np.unique(list_sessions, return_inverse=True)
+            list_phases = phase[starts]
+            for name, expected in phase_counts.items():
+                counts = np.bincount(session_codes[list_phases == code(name)], minlength=len(session_ids))
+                bad = np.flatnonzero(counts != expected)
+                report_sessions("phase_types", session_ids[bad],
+                                ("{:d} {} lists instead of {:d}".format(n, name, expected) for n in counts[bad]))
+    elif phase_counts:
+        raise ValueError("Sessions have no phase types")
+
+    violations = pd.concat(found, ignore_index=True)
+    return violations.sort_values(["session", "listno"], kind="stable").reset_index(drop=True)
@@ -1,17 +1,32 @@
+"""List generation helpers which work on plain lists of dictionaries (one per
+word) and therefore don't require pandas or NumPy. All functions also accept
+a columnar :class:`wordpool.columnar.WordPool`, which avoids the per-word
+overhead when NumPy is available.
+
+"""
+
+from . import columnar
+from .columnar import WordPool
+
+
 def assign_list_numbers_from_word_list(all_words, number_of_lists, start=0):
     """takes a list of dictionaries with just words and adds listnos.
 
     :param all_words: a list of dictionaries of all the words to assign numbers to
+        (or a :class:`WordPool`)
     :param number_of_lists: how many lists should the words be divided into
     :returns a list of dictionaries similar to ``all_words`` with added ``listno``
 
     """
     if len(all_words) == 0 or number_of_lists == 0:
-        return []
+        return all_words if isinstance(all_words, WordPool) else []
     explanation = "The number of words must be evenly divisible by the number of lists. "
     error_string = explanation + str(len(all_words)) + " isn't divisble by " + str(number_of_lists)
     assert len(all_words) % number_of_lists == 0, error_string
 
+    if isinstance(all_words, WordPool):
+        return columnar.assign_list_numbers(all_words, number_of_lists, start)
+
     length_of_each_list = len(all_words)//number_of_lists
     for i in range(len(all_words)):
         all_words[i]['listno'] = (i//length_of_each_list) + start
@@ -27,6 +42,7 @@ def assign_list_types_from_type_list(pool, num_baseline, stim_nonstim, num_ps=0)
         * ``NON-STIM``
 
         :param list pool: Input word pool.  list of dictionaries with (word, listno) keys
+            (or a :class:`WordPool`)
         :param int num_baseline: Number of baseline trials
         list.
         :param list stim_nonstim:
@@ -38,11 +54,14 @@ def assign_list_types_from_type_list(pool, num_baseline, stim_nonstim, num_ps=0)
         """
 
     # Check that the inputs match the number of lists
-    last_listno = pool[-1]['listno']
+    last_listno = pool['listno'][-1] if isinstance(pool, WordPool) else pool[-1]['listno']
     parameters_list_count = num_baseline + len(stim_nonstim) + num_ps
     error_message = "I think there should be " + str(parameters_list_count) + " lists but I see " + str(last_listno+1) + "."
     assert last_listno+1 == parameters_list_count, error_message
 
+    if isinstance(pool, WordPool):
+        return columnar.assign_list_types(pool, num_baseline, stim_nonstim, num_ps)
+
     for i in range(len(pool)):
         word = pool[i]
         if word['listno'] < num_baseline:
@@ -88,6 +107,9 @@ def _assign_stim_attribute_from_stim_attribute_list(pool, attribute_list, attrib
     """
     assert len(pool) > 0, "Empty pool"
 
+    if isinstance(pool, WordPool):
+        return columnar.assign_stim_attribute(pool, attribute_list, attribute_name)
+
     stim_words = [word for word in pool if word['phase_type'] == "STIM"]
     unique_listnos = set()
     for word in stim_words:
@@ -116,20 +138,62 @@ def extract_blocks(pool, listnos, num_blocks):
     :param int num_blocks: The number of blocks to organize the listnos into
     :returns: blocks of words as a list of tuples
 
+    """
+    if isinstance(pool, WordPool):
+        assert len(listnos) % num_blocks == 0, "The number of lists to append must be divisable by the number of blocks"
+        return columnar.extract_blocks(pool, listnos, num_blocks)
+
+    return list(iter_blocks(pool, listnos, num_blocks))
+
+
+def iter_blocks(pool, listnos, num_blocks):
+    """Like :func:`extract_blocks`, but return an iterator which only builds
+    each block word when it is consumed.
+
+    :param list pool: Input word pool.
+    :param list listnos: The order of lists to separate into blocks
+    :param int num_blocks: The number of blocks to organize the listnos into
+    :returns: iterator over block words
+
+    """
+    index, blocknos, block_listnos = block_indices(pool, listnos, num_blocks)
+
+    def build():
+        for i, blockno, block_listno in zip(index, blocknos, block_listnos):
+            word = dict(pool[i])
+            word['blockno'] = blockno
+            word['block_listno'] = block_listno
+            yield word
+
+    return build()
+
+
+def block_indices(pool, listnos, num_blocks):
+    """Find the words making up the blocks :func:`extract_blocks` would
+    return without copying any of them.
+
+    :param list pool: Input word pool.
+    :param list listnos: The order of lists to separate into blocks
+    :param int num_blocks: The number of blocks to organize the listnos into
+    :returns: ``(index, blocknos, block_listnos)`` with the position in
+        ``pool``, the block number and the block list number of each block
+        word
+
     """
     assert len(listnos) % num_blocks == 0, "The number of lists to append must be divisable by the number of blocks"
 
-    wordlists = {}
-    for word in pool:
-        wordlists[word['listno']] = wordlists.get(word['listno'], []) + [word]
+    if isinstance(pool, WordPool):
+        return columnar.block_indices(pool, listnos, num_blocks)
+
+    positions = {}
+    for i, word in enumerate(pool):
+        positions.setdefault(word['listno'], []).append(i)
 
-    blocks = []
-    for i in range(len(listnos)):
-        listno = listnos[i]
-        wordlist = [word.copy() for word in wordlists[listno]]
-        for word in wordlist:
-            word['blockno'] = i//num_blocks
-            word['block_listno'] = i
-        blocks += wordlist
+    index, blocknos, block_listnos = [], [], []
+    for i, listno in enumerate(listnos):
+        rows = positions[listno]
+        index.extend(rows)
+        blocknos.extend([i//num_blocks] * len(rows))
+        block_listnos.extend([i] * len(rows))
 
-    return blocks
+    return index, blocknos, block_listnos
@@ -0,0 +1,152 @@
+"""Process-wide registry of loaded word pools.
+
+Word pools are parsed once on first use and cached. Callers are handed
+read-only views which share the cached data, so generators running in the
+same process use a single copy of each pool and cannot modify each other's
+state.
+
+"""
+
+from collections import OrderedDict
+from collections.abc import Mapping
+import threading
+
+from ._lazy import np, pd
+
+
+class PoolRegistry(object):
+    """Memoizing cache of word pools with least-recently-used eviction.
+
+    :param int maxsize: Maximum number of pools to keep cached. When more
+        pools are requested, the least recently used one is evicted.
+
+    """
+    def __init__(self, maxsize=32):
+        assert maxsize > 0, "The registry must be able to hold at least one pool"
+        self.maxsize = maxsize
+        self._pools = OrderedDict()
+        self._lock = threading.Lock()
+
+    def __len__(self):
+        return len(self._pools)
+
+    def __contains__(self, filename):
+        return (filename, True) in self._pools or (filename, False) in self._pools
+
+    def get(self, filename, from_data_package=True):
+        """Return a read-only view of a word pool, loading it on first use.
+
+        The returned frame shares its data with the cached pool. Columns can be
+        added to or removed from it freely, but modifying existing values in
+        place raises a :class:`ValueError`.
+
+        :param str filename: Pool filename (see :func:`wordpool.load`).
+        :param bool from_data_package: See :func:`wordpool.load`.
+        :rtype: pd.DataFrame
+
+        """
+        key = (filename, from_data_package)
+        with self._lock:
+            try:
+                frame = self._pools.pop(key)
+            except KeyError:
+                from . import load
+                frame = _freeze(load(filename, from_data_package))
+                while len(self._pools) >= self.maxsize:
+                    self._pools.popitem(last=False)
+            self._pools[key] = frame
+
+        return frame.copy(deep=False)
+
+    def evict(self, filename, from_data_package=True):
+        """Remove a pool from the cache. Views already handed out stay valid."""
+        with self._lock:
+            self._pools.pop((filename, from_data_package), None)
+
+    def clear(self):
+        """Remove all pools from the cache."""
+        with self._lock:
+            self._pools.clear()
+
+
+def _freeze(frame):
+    """Rebuild a frame on top of read-only arrays, one per column.
+
+    pandas 1.5 can't compare contiguous read-only object arrays with a scalar
+    (e.g., ``pool[pool.category == "X"]`` raises "buffer source array is
+    read-only"), but copies strided arrays before comparing them. Columns of
+    strings are therefore stored as every other element of a buffer twice
+    their length, which only costs one extra reference per word.
+
+    :rtype: pd.DataFrame
+
+    """
+    columns = {}
+    for name in frame.columns:
+        values = frame[name].to_numpy()
+        if values.dtype == object:
+            buffer = np.empty((len(values), 2), dtype=object)
+            buffer[:, 0] = values
+            buffer.setflags(write=False)
+            columns[name] = buffer[:, 0]
+        else:
+            values = values.copy()
+            values.setflags(write=False)
+            columns[name] = values
+    return pd.DataFrame(columns, index=frame.index, columns=frame.columns, copy=False)
+
+
+#: Registry used by :func:`get_pool` and the list generation functions.
+pools = PoolRegistry()
+
+
+def get_pool(filename, from_data_package=True):
+    """Return a shared, read-only view of a word pool from the default
+    registry. Use :func:`wordpool.load` to get a private, writable copy
+    instead.
+
+    :param str filename: Pool filename (see :func:`wordpool.load`).
+    :param bool from_data_package: See :func:`wordpool.load`.
+    :rtype: pd.DataFrame
+
+    """
+    return pools.get(filename, from_data_package)
+
+
+def lazy_pools(module_name, names):
+    """Build a module-level ``__getattr__`` which resolves constants such as
+    ``RAM_LIST_EN`` to pools from the default registry on first access
+    instead of loading them at import time.
+
+    :param str module_name: Name of the module (used in error messages).
+    :param dict names: Mapping of attribute names to pool filenames.
+
+    """
+    def __getattr__(name):
+        try:
+            filename = names[name]
+        except KeyError:
+            raise AttributeError("module {!r} has no attribute {!r}".format(module_name, name))
+        return get_pool(filename)
+
+    return __getattr__
+
+
+class LazyPoolMapping(Mapping):
+    """Read-only mapping of keys to pools which are only loaded when looked
+    up.
+
+    :param dict filenames: Mapping of keys to pool filenames.
+
+    """
+    def __init__(self, filenames):
+        self._filenames = dict(filenames)
+
+    def __getitem__(self, key):
+        return get_pool(self._filenames[key])
+
+    def __iter__(self):
+        return iter(self._filenames)
+
+    def __len__(self):
+        return len(self._filenames)
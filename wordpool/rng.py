@@ -0,0 +1,82 @@
+"""Random number generation.
+
+All public functions which shuffle or sample words accept an ``rng``
+argument which is passed through :func:`get_rng`. Use :func:`session_rng` to
+get independent, reproducible streams for sessions of a subject.
+
+"""
+
+import hashlib
+
+from ._lazy import np, npr
+
+
+def get_rng(rng=None):
+    """Return a :class:`np.random.Generator`.
+
+    :param rng: An existing generator (returned as is), a seed or
+        :class:`np.random.SeedSequence`, or None. With None, a new generator
+        is seeded from NumPy's global random state so that
+        :func:`np.random.seed` still makes results reproducible.
+    :rtype: np.random.Generator
+
+    """
+    if isinstance(rng, npr.Generator):
+        return rng
+    if rng is None:
+        rng = npr.randint(0, 2**32, size=4, dtype=np.uint64)
+    return npr.default_rng(rng)
+
+
+def subject_key(subject):
+    """Return the spawn key of a subject's streams: the 32-bit words of the
+    SHA-256 digest of its identifier. Unlike a short checksum, this keeps
+    streams of different subjects apart (``str`` hashes can't be used since
+    they are salted per process).
+
+    :param subject: Subject identifier (converted with ``str``).
+    :rtype: tuple
+
+    """
+    digest = hashlib.sha256(str(subject).encode("utf-8")).digest()
+    return tuple(int.from_bytes(digest[i:i + 4], "little") for i in range(0, len(digest), 4))
+
+
+def stream_seed(root_seed, subject, experiment=None):
+    """Return the :class:`np.random.SeedSequence` which keys the streams of a
+    subject, and of an experiment if given, so that e.g. FR and PAL sessions
+    of the same subject don't share random numbers.
+
+    :param int root_seed: Root seed (e.g., of a study).
+    :param subject: Subject identifier (converted with ``str``).
+    :param str experiment: Experiment name or None.
+    :rtype: np.random.SeedSequence
+
+    """
+    spawn_key = subject_key(subject)
+    if experiment is not None:
+        spawn_key += subject_key(experiment)
+    return npr.SeedSequence(root_seed, spawn_key=spawn_key)
+
+
+def session_rng(root_seed, subject, session=0, experiment=None):
+    """Return the generator for a session of a subject.
+
+    Streams are addressed directly: the subject and experiment (together with
+    the root seed) determine the key of a counter-based Philox generator and
+    the session number the start of its counter. Any session can therefore be
+    regenerated without going through the sessions before it.
+
+    :param int root_seed: Root seed (e.g., of a study).
+    :param subject: Subject identifier (converted with ``str``).
+    :param int session: Session number.
+    :param str experiment: Experiment name. Sessions of different experiments
+        draw from different streams.
+    :rtype: np.random.Generator
+
+    """
+    key = stream_seed(root_seed, subject, experiment).generate_state(2, np.uint64)
+
+    # each session gets 2**192 counter values before running into the next
+    counter = np.array([0, 0, 0, session], dtype=np.uint64)
+    return npr.Generator(npr.Philox(key=key, counter=counter))
@@ -0,0 +1,15 @@
+import os
+
+import pytest
+
+
+@pytest.fixture(scope="session", autouse=True)
+def cache_dir(tmp_path_factory):
+    """Compile pools into a temporary directory instead of the user's cache."""
+    previous = os.environ.get("WORDPOOL_CACHE_DIR")
+    os.environ["WORDPOOL_CACHE_DIR"] = str(tmp_path_factory.mktemp("cache"))
+    yield os.environ["WORDPOOL_CACHE_DIR"]
+    if previous is None:
+        del os.environ["WORDPOOL_CACHE_DIR"]
+    else:
+        os.environ["WORDPOOL_CACHE_DIR"] = previous
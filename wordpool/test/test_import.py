@@ -0,0 +1,70 @@
+"""Cold import checks. These fail when importing ``wordpool`` starts pulling
+in heavy dependencies again.
+
+Wall-clock import times are tracked by the asv import benchmarks
+(``benchmarks/bench_import.py``). The time budget test is flaky on loaded
+machines, so it only runs when a budget is given (in seconds) with the
+``WORDPOOL_IMPORT_BUDGET`` environment variable.
+
+"""
+
+import json
+import os
+import os.path as osp
+import subprocess
+import sys
+import pytest
+
+import wordpool
+
+IMPORT_BUDGET = os.environ.get("WORDPOOL_IMPORT_BUDGET")
+HEAVY_MODULES = ["numpy", "pandas", "pkg_resources"]
+
+SCRIPT = """
+import json, sys, time
+t0 = time.perf_counter()
+import {module}
+elapsed = time.perf_counter() - t0
+print(json.dumps({{"elapsed": elapsed, "modules": sorted(sys.modules)}}))
+"""
+
+
+def cold_import(module):
+    """Import a module in a fresh interpreter and return the time taken and
+    the modules loaded afterwards.
+
+    """
+    env = dict(os.environ)
+    root = osp.dirname(osp.dirname(osp.abspath(wordpool.__file__)))
+    env["PYTHONPATH"] = os.pathsep.join([root, env.get("PYTHONPATH", "")])
+    output = subprocess.check_output([sys.executable, "-c", SCRIPT.format(module=module)], env=env)
+    result = json.loads(output.decode())
+    return result["elapsed"], set(result["modules"])
+
+
+@pytest.mark.benchmark
+@pytest.mark.parametrize("module", ["wordpool", "wordpool.listgen"])
+def test_import_is_lazy(module):
+    _, modules = cold_import(module)
+    for name in HEAVY_MODULES:
+        assert name not in modules
+
+
+@pytest.mark.benchmark
+@pytest.mark.skipif(IMPORT_BUDGET is None, reason="set WORDPOOL_IMPORT_BUDGET to check import times")
+@pytest.mark.parametrize("module", ["wordpool", "wordpool.listgen"])
+def test_import_time_budget(module):
+    budget = float(IMPORT_BUDGET)
+    # best of several runs to reduce noise from other processes
+    elapsed = min(cold_import(module)[0] for _ in range(5))
+    assert elapsed < budget, \
+        "importing {} took {:.3f} s (budget: {:.3f} s)".format(module, elapsed, budget)
+
+
+def test_pools_load_on_first_use():
+    from wordpool import listgen
+    assert len(listgen.RAM_LIST_EN) == len(wordpool.load("ram_wordpool_en.txt"))
+    assert len(listgen.pal.wordpools["SP"]) == len(wordpool.load("ram_wordpool_sp.txt"))
+    assert "EN" in listgen.pal.wordpools
+    with pytest.raises(AttributeError):
+        listgen.NOT_A_POOL
@@ -0,0 +1,90 @@
+import pytest
+
+from wordpool import instrument, listgen, pool_dataframe_to_pool_list
+
+
+@pytest.fixture
+def instrumented():
+    instrument.reset()
+    events = []
+    instrument.enable(memory=True, callback=events.append)
+    yield events
+    instrument.disable()
+    instrument.reset()
+
+
+def test_disabled():
+    instrument.reset()
+    assert not instrument.is_enabled()
+    listgen.fr.generate_session_pool(rng=1)
+    instrument.count("anything")
+    with instrument.stage("anything"):
+        pass
+    assert instrument.stats() == {"timers": {}, "counters": {}, "memory": {}}
+
+
+def test_stats(instrumented):
+    pool = listgen.fr.generate_session_pool(rng=1)
+    pool_dataframe_to_pool_list(pool)
+    pool_dataframe_to_pool_list(pool)
+    listgen.catfr.generate_session_pool("SP", rng=1)
+
+    stats = instrument.stats()
+    assert stats["timers"]["pool_dataframe_to_pool_list"]["calls"] == 2
+    assert stats["counters"]["rows_converted"] == 2 * len(pool)
+    assert stats["counters"]["catfr.attempts"] == 1
+    for name in ("fr.generate_session_pool", "catfr.sort_pairs", "catfr.generate_session_pool"):
+        timer = stats["timers"][name]
+        assert timer["calls"] == 1
+        assert 0 < timer["max"] == timer["total"]
+
+    # nested stages count towards their parent's peak
+    memory = stats["memory"]
+    assert memory["catfr.generate_session_pool"]["peak"] >= memory["catfr.sort_pairs"]["peak"] > 0
+
+    stages = [event["name"] for event in instrumented if event["kind"] == "stage"]
+    assert stages.index("catfr.sort_pairs") < stages.index("catfr.generate_session_pool")
+    assert {"kind": "counter", "name": "catfr.attempts", "n": 1} in instrumented
+
+
+def test_pipeline(instrumented):
+    pipeline = listgen.pipeline.SessionPipeline(rng=1).fr_session().list_types(4, 6, 16)
+    pipeline.run()
+    assert {"pipeline.fr_session", "pipeline.list_types"} <= set(instrument.stats()["timers"])
+
+    instrument.reset()
+    assert instrument.stats()["timers"] == {}
+
+
+def test_tracemalloc_ownership():
+    import tracemalloc
+
+    # tracing started by someone else keeps running
+    tracemalloc.start()
+    try:
+        instrument.enable(memory=True)
+        instrument.disable()
+        assert tracemalloc.is_tracing()
+    finally:
+        tracemalloc.stop()
+
+    instrument.enable(memory=True)
+    instrument.disable()
+    assert not tracemalloc.is_tracing()
+
+
+def test_memory_threads(instrumented):
+    from concurrent.futures import ThreadPoolExecutor
+
+    def work():
+        with instrument.stage("thread"):
+            return [0] * 100000
+
+    with ThreadPoolExecutor(1) as executor:
+        executor.submit(work).result()
+    work()
+
+    # only the thread which enabled instrumentation samples memory
+    stages = [event for event in instrumented if event["kind"] == "stage"]
+    assert "peak" not in stages[0] and stages[1]["peak"] > 0
+    assert instrument.stats()["timers"]["thread"]["calls"] == 2
@@ -0,0 +1,127 @@
+import numpy as np
+import pandas as pd
+import pytest
+
+import wordpool
+from wordpool.columnar import WordPool
+from wordpool.lexicon import Lexicon
+
+
+@pytest.fixture
+def frame():
+    rng = np.random.default_rng(0)
+    n = 5000
+    words = np.array(["WORD{:d}".format(i) for i in range(n)], dtype=object)
+    words[:300] = wordpool.get_pool("ram_wordpool_en.txt").word.values[:300]
+    words[-1] = words[0]
+    return pd.DataFrame({
+        "word": words,
+        "syllables": rng.integers(1, 4, n),
+        "recall": rng.random(n).round(3),
+        "pos": rng.choice(["N", "V", "A"], n),
+    })
+
+
+def test_select(frame):
+    lexicon = Lexicon(frame)
+    assert len(lexicon) == len(frame)
+    assert "APE" in lexicon and "NOPE" not in lexicon
+
+    fr = wordpool.get_pool("ram_wordpool_en.txt").word
+    queries = [
+        (dict(), np.ones(len(frame), dtype=bool)),
+        (dict(syllables=1), frame.syllables == 1),
+        (dict(pos=["N", "V"], recall=(None, 0.2)), frame.pos.isin(["N", "V"]) & (frame.recall <= 0.2)),
+        (dict(syllables=1, recall=(0.37, 0.69), exclude="ram_wordpool_en.txt"),
+         (frame.syllables == 1) & frame.recall.between(0.37, 0.69) & ~frame.word.isin(fr)),
+        (dict(recall=(0.5, 0.52), exclude=[["WORD400"], WordPool.from_dataframe(frame[:10])]),
+         frame.recall.between(0.5, 0.52) & ~frame.word.isin(["WORD400"] + list(frame.word[:10]))),
+        (dict(exclude=list(frame.word[:2])), ~frame.word.isin(frame.word[:2])),
+        (dict(exclude=frame.word[3]), frame.word != frame.word[3]),
+        (dict(exclude=["ram_wordpool_en.txt", "WORD400"]), ~frame.word.isin(list(fr) + ["WORD400"])),
+        (dict(recall=(0.9, 0.1)), np.zeros(len(frame), dtype=bool)),
+        (dict(syllables=7, pos="N"), np.zeros(len(frame), dtype=bool)),
+        (dict(word=frame.word[0]), frame.word == frame.word[0]),
+    ]
+    for query, expected in queries:
+        rows = lexicon.select(**query)
+        assert rows.tolist() == np.flatnonzero(expected).tolist(), query
+        assert lexicon.count(**query) == expected.sum()
+        assert lexicon.words(**query).tolist() == frame.word[expected].tolist()
+
+    with pytest.raises(KeyError):
+        lexicon.select(frequency=(1, 2))
+
+
+@pytest.mark.parametrize("ascending", [True, False])
+@pytest.mark.parametrize("query", [dict(syllables=2), dict(recall=(0.5, 0.6))])
+def test_order_by(frame, query, ascending):
+    lexicon = Lexicon(frame)
+    matches = frame.iloc[lexicon.select(**query)].sort_values("recall", kind="stable")
+    expected = matches.index.values if ascending else matches.index.values[::-1]
+
+    rows = lexicon.select(order_by="recall", ascending=ascending, **query)
+    assert rows.tolist() == expected.tolist()
+    rows = lexicon.select(order_by="recall", ascending=ascending, limit=20, **query)
+    assert rows.tolist() == expected[:20].tolist()
+
+
+def test_missing_values(frame):
+    rng = np.random.default_rng(1)
+    frame.loc[rng.random(len(frame)) < 0.1, "recall"] = np.nan
+    frame["pos"] = frame.pos.astype(object)
+    frame.loc[rng.random(len(frame)) < 0.1, "pos"] = None
+    lexicon = Lexicon(frame)
+    present = frame.recall.notnull()
+
+    # missing values are out of every range, whichever condition comes first
+    queries = [
+        (dict(recall=(None, 0.5)), frame.recall <= 0.5),
+        (dict(recall=(0.5, None)), frame.recall >= 0.5),
+        (dict(recall=(None, None)), present),
+        (dict(recall=(None, None), word=["APE", "WORD400"]), present & frame.word.isin(["APE", "WORD400"])),
+        (dict(recall=(0.2, None), syllables=1, pos="N"),
+         (frame.recall >= 0.2) & (frame.syllables == 1) & (frame.pos == "N")),
+        (dict(pos=["N", "V"]), frame.pos.isin(["N", "V"])),
+        (dict(recall=(None, 0.01), exclude=[["APE"]]), (frame.recall <= 0.01) & (frame.word != "APE")),
+    ]
+    for query, expected in queries:
+        assert lexicon.select(**query).tolist() == np.flatnonzero(expected).tolist(), query
+
+    # and sorted last in either order
+    for query in [dict(), dict(syllables=1, pos="N")]:
+        rows = lexicon.select(**query)
+        matches = frame.iloc[rows]
+        ordered = matches[matches.recall.notnull()].sort_values("recall", kind="stable").index.values
+        missing = matches.index.values[matches.recall.isnull().values]
+        for ascending in [True, False]:
+            expected = np.concatenate([ordered if ascending else ordered[::-1], missing])
+            for limit in [None, 50, len(rows) - 3]:
+                result = lexicon.select(order_by="recall", ascending=ascending, limit=limit, **query)
+                assert result.tolist() == expected[:limit].tolist(), (query, ascending, limit)
+
+
+def test_query(frame):
+    lexicon = Lexicon(frame.rename(columns={"word": "item"}), word_column="item")
+    pool = lexicon.query(syllables=1, recall=(0.37, 0.69), columns=["item", "recall"],
+                         order_by="recall", ascending=False, limit=88)
+    assert list(pool.columns) == ["word", "recall"]
+    assert len(pool) == 88
+    assert pool.recall.is_monotonic_decreasing
+    assert pool.recall.between(0.37, 0.69).all()
+
+    with pytest.raises(KeyError):
+        Lexicon(frame, word_column="item")
+
+
+def test_attributes(frame):
+    lexicon = Lexicon(frame)
+    pool = pd.DataFrame({"word": [frame.word[0], "NOPE", frame.word[10]], "listno": [0, 0, 1]})
+    annotated = lexicon.attributes(pool, columns=["recall", "pos"])
+    assert list(annotated.columns) == ["word", "listno", "recall", "pos"]
+    assert list(pool.columns) == ["word", "listno"]
+
+    # duplicate words get the attributes of their first occurrence
+    assert annotated.recall[0] == frame.recall[0]
+    assert np.isnan(annotated.recall[1]) and pd.isnull(annotated.pos[1])
+    assert annotated.pos[2] == frame.pos[10]
@@ -1,6 +1,7 @@
 import os
 import os.path as osp
 import shutil
+import time
 from contextlib import contextmanager
 import pytest
 
@@ -61,6 +62,92 @@ def test_write_wordpool(tmpdir):
             assert (words == wordpool.load("REC1_lures_en.txt").word).all()
 
 
+def test_write_wordpool_unchanged(tmpdir):
+    path = str(tmpdir)
+    filename = listgen.write_wordpool_txt(path, "EN")[0]
+    os.utime(filename, (0, 0))
+    listgen.write_wordpool_txt(path, "EN")
+    assert os.stat(filename).st_mtime == 0
+
+    # the file is replaced when the contents differ
+    with open(filename, "w") as f:
+        f.write("bogus\n")
+    os.utime(filename, (0, 0))
+    listgen.write_wordpool_txt(path, "EN")
+    assert os.stat(filename).st_mtime != 0
+    assert os.listdir(path) == ["RAM_wordpool.txt"]
+
+
+def test_write_atomic_mode(tmpdir, monkeypatch):
+    from wordpool.listgen import export
+    from wordpool.listgen.export import write_text
+
+    # where the umask can't be read without changing it, the one at import
+    # is used
+    monkeypatch.setattr(export, "_UMASK", 0o027)
+    umask = os.umask(0o027)
+    try:
+        # new files get the usual permissions rather than mkstemp's
+        filename = str(tmpdir.join("new.txt"))
+        write_text(filename, "A\n")
+        assert os.stat(filename).st_mode & 0o777 == 0o640
+
+        # replaced files keep theirs
+        os.chmod(filename, 0o604)
+        write_text(filename, "B\n")
+        assert os.stat(filename).st_mode & 0o777 == 0o604
+    finally:
+        os.umask(umask)
+
+
+def test_new_file_mode(monkeypatch):
+    from wordpool.listgen import export
+
+    # without /proc, the umask read at import is used
+    monkeypatch.setattr(export, "_current_umask", lambda: None)
+    monkeypatch.setattr(export, "_UMASK", 0o077)
+    assert export._new_file_mode() == 0o600
+
+
+def test_write_session_missing(tmpdir):
+    from wordpool.listgen.export import write_session
+
+    frame = pd.DataFrame({"word": ["A", None, "C"], "number": [1.5, np.nan, 3.0], "listno": [0, 1, 2]})
+    for i, session in enumerate([frame, wordpool.columnar.WordPool.from_dataframe(frame),
+                                 frame.to_dict("records")]):
+        filename = str(tmpdir.join("{:d}.tsv".format(i)))
+        write_session(filename, session)
+        with open(filename) as f:
+            assert f.read() == frame.to_csv(sep="\t", index=False)
+
+
+def test_export_cohort(tmpdir):
+    path = str(tmpdir)
+    sessions = {
+        "R1001P": [listgen.fr.generate_session_pool(rng=i) for i in range(2)],
+        "R1002P": [wordpool.columnar.WordPool.from_dataframe(listgen.fr.generate_session_pool(rng=2))],
+    }
+    summary = listgen.export_cohort(path, sessions, include_lure_words=True, max_workers=2)
+    assert len(summary["written"]) == 7
+    assert summary["unchanged"] == []
+    assert sorted(os.listdir(osp.join(path, "R1001P"))) == \
+        ["RAM_lurepool.txt", "RAM_wordpool.txt", "session_0.tsv", "session_1.tsv"]
+
+    session = pd.read_table(osp.join(path, "R1001P", "session_1.tsv"))
+    assert_frame_equal(session, sessions["R1001P"][1])
+    with open(osp.join(path, "R1002P", "RAM_wordpool.txt")) as f:
+        assert [line.strip() for line in f] == list(wordpool.load("ram_wordpool_en.txt").word)
+
+    # only changed files are written again
+    sessions["R1001P"][0] = listgen.fr.generate_session_pool(rng=3)
+    summary = listgen.export_cohort(path, sessions, include_lure_words=True)
+    assert summary["written"] == [osp.join(path, "R1001P", "session_0.tsv")]
+    assert len(summary["unchanged"]) == 6
+
+    with pytest.raises(exc.LanguageError):
+        listgen.export_cohort(path, sessions, "SP", include_lure_words=True)
+
+
 @pytest.mark.fr
 class TestFR:
     def test_generate_session_pool(self):
@@ -90,6 +177,31 @@ class TestFR:
             second = session2[session2.listno == n]
             assert not (first.word == second.word).all()  # practice lists should be shuffled, too!
 
+    def test_generate_n_session_pools(self):
+        words = wordpool.load("ram_wordpool_en.txt")
+        pools = listgen.fr.generate_n_session_pools(5)
+        assert list(pools.columns) == ["session", "word", "listno"]
+        assert list(pools.session.unique()) == list(range(5))
+
+        for _, session in pools.groupby("session"):
+            assert sorted(session.word) == sorted(words.word)
+            assert list(session.listno) == sorted(session.listno)
+            assert (session.groupby("listno").word.count() == 12).all()
+
+        lazy = listgen.fr.generate_n_session_pools(5, num_lists=13, language="SP", stacked=False)
+        assert len(lazy) == 5
+        session = lazy[3]
+        assert list(session.columns) == ["word", "listno"]
+        assert (session.groupby("listno").word.count() == 24).all()
+        assert (session.index == range(len(session))).all()
+        assert not (lazy[0].word == lazy[1].word).all()
+        assert len(lazy[1:3]) == 2
+
+        with pytest.raises(AssertionError):
+            listgen.fr.generate_n_session_pools(2, num_lists=7)
+        with pytest.raises(AssertionError):
+            listgen.fr.generate_n_session_pools(2, language="DA")
+
     def test_assign_list_types(self):
         session = listgen.fr.generate_session_pool()
         session = listgen.assign_list_types(session, 4, 7, 11, 4)
@@ -158,6 +270,35 @@ class TestFR:
         # this should be the original index before being reset
         assert "index" in blocks.columns
 
+    def test_generate_rec1_blocks_batch(self):
+        pools = [listgen.assign_list_types(listgen.fr.generate_session_pool(rng=i), 4, 6, 16, 0, rng=i)
+                 for i in range(3)]
+        lures = wordpool.load("REC1_lures_en.txt")
+        original = lures.copy()
+        blocks = listgen.generate_rec1_blocks_batch(pools, lures, rng=1)
+        assert_frame_equal(lures, original)
+        assert list(blocks.session.unique()) == [0, 1, 2]
+
+        for session, pool in enumerate(pools):
+            words = blocks[blocks.session == session]
+            targets = words[words.type != "LURE"]
+            assert len(words) == 12 * 12 + len(lures)
+            assert (targets.phase_type == "NON-STIM").sum() == 6 * 12
+            assert (targets.phase_type == "STIM").sum() == 6 * 12
+            assert targets.listno.max() <= 21 or (targets.phase_type[targets.listno > 21] == "NON-STIM").all()
+            assert (pool.loc[targets["index"], "word"].values == targets.word.values).all()
+            assert set(words.listno) == set(targets.listno)
+
+            # the first half of the lists comes first
+            listnos = sorted(targets.listno.unique())
+            first = words.listno.isin(listnos[:6]).values
+            assert first[:first.sum()].all()
+
+        # a batch of one is the same as a single session
+        single = listgen.generate_rec1_blocks(pools[0], lures, rng=1)
+        batch = listgen.generate_rec1_blocks_batch(pools[:1], lures, rng=1)
+        assert_frame_equal(single, batch.drop(columns="session"))
+
     @pytest.mark.parametrize('iteration', range(5))
     def test_generate_learn1_blocks(self, iteration):
         session = listgen.fr.generate_session_pool()
@@ -217,6 +358,46 @@ class TestCatFR:
         for count in counts:
             assert counts[count] == 12
 
+    def test_assign_list_numbers_constructive(self):
+        pool = listgen.catfr.assign_word_numbers(wordpool.load("ram_categorized_v2_sp.txt"))
+
+        for _ in range(20):
+            stats = {}
+            assigned = listgen.catfr.assign_list_numbers(pool, stats=stats)
+            assert stats["attempts"] == 1
+            assert (assigned.listno >= 0).all()
+            lists = assigned.groupby("listno")
+            assert (lists.word.count() == 12).all()
+            assert (lists.category.nunique() == 3).all()
+            odd = assigned.groupby(["listno", "category"]).wordno.apply(lambda w: (w % 2).sum())
+            assert (odd == 2).all()
+        assert "listno" not in pool
+
+        # fewer lists leave words unassigned
+        assigned = listgen.catfr.assign_list_numbers(pool, n_lists=20)
+        assert (assigned.listno == -1).sum() == 312 - 20*12
+
+        with pytest.raises(exc.ListAssignmentError):
+            listgen.catfr.assign_list_numbers(pool, n_lists=27)
+        with pytest.raises(exc.ListAssignmentError):
+            listgen.catfr.assign_list_numbers(pool[pool.category.isin(pool.category.unique()[:2])], n_lists=1)
+
+    def test_assign_list_numbers_cooccurrence(self):
+        pool = listgen.catfr.assign_word_numbers(wordpool.load("ram_categorized_v2_sp.txt"))
+        categories = pool.category.unique()
+        cooccurrence = pd.DataFrame(0, index=categories, columns=categories)
+        cooccurrence.loc[categories[0], categories[1]] = cooccurrence.loc[categories[1], categories[0]] = 10
+
+        # no penalties give the same result as none at all
+        assert_frame_equal(listgen.catfr.assign_list_numbers(pool, rng=1),
+                           listgen.catfr.assign_list_numbers(pool, cooccurrence=cooccurrence * 0, rng=1))
+
+        for seed in range(5):
+            assigned = listgen.catfr.assign_list_numbers(pool, cooccurrence=cooccurrence, rng=seed)
+            assert (assigned.groupby("listno").category.nunique() == 3).all()
+            lists = assigned.groupby("listno").category.apply(set)
+            assert not any({categories[0], categories[1]} <= cats for cats in lists)
+
     def test_sort_pairs(self):
         pool = self.catpool.copy()
         with pytest.raises(AssertionError):
@@ -239,6 +420,23 @@ class TestCatFR:
         for n in range(5, len(pool), 12):
             assert pool.category[n] != pool.category[n + 1]
 
+    def test_sort_pairs_buckets(self):
+        pool = listgen.catfr.assign_list_numbers(
+            listgen.catfr.assign_word_numbers(wordpool.load("ram_categorized_v2_sp.txt")))
+        pairs = listgen.catfr.sort_pairs(pool)
+
+        assert sorted(pairs.word) == sorted(pool.word)
+        assert list(pairs.listno) == sorted(pool.listno)
+        for _, list_ in pairs.groupby("listno"):
+            categories = list(list_.category[::2])
+            assert categories[:3] == list(pd.unique(pool[pool.listno == list_.listno.iloc[0]].category))
+            assert sorted(categories[3:]) == sorted(categories[:3])
+            assert categories[2] != categories[3]
+
+        # every category needs two pairs in a list
+        with pytest.raises(ValueError):
+            listgen.catfr.sort_pairs(pool.iloc[1:])
+
     def test_generate_cat_session_pool(self):
         with pytest.raises(exc.LanguageError):
             listgen.catfr.generate_session_pool(language="DA")
@@ -296,6 +494,41 @@ class TestPAL:
         for _, list_pairs in pool.groupby('listno'):
             assert len(list_pairs) == 6
 
+    def test_generate_n_session_pairs_stacked(self):
+        from wordpool.listgen.validate import validate
+
+        sessions = listgen.pal.generate_n_session_pairs(50, language="SP", rng=1)
+        stacked = listgen.pal.generate_n_session_pairs(50, language="SP", stacked=True, rng=1)
+        assert list(stacked.session.unique()) == list(range(50))
+        for n, session in enumerate(sessions):
+            assert_frame_equal(session, stacked[stacked.session == n].drop(columns="session").reset_index(drop=True))
+
+        # pairs are also given as tuples, as before
+        pool = sessions[0]
+        assert list(pool.columns) == ['word1', 'word2', 'type', 'listno', 'word', 'cue_pos']
+        main = pool[pool.type != 'PRACTICE']
+        assert list(main.word) == list(zip(main.word1, main.word2))
+        assert pool[pool.type == 'PRACTICE'].word.isnull().all()
+
+        # balanced cues, list lengths and no pair repeated across sessions
+        assert validate(stacked, "PAL").empty
+        mains = [session[session.type != 'PRACTICE'] for session in sessions]
+        assert (listgen.pal.session_overlap(mains) == 0).all()
+
+        pairs = mains[0][['word1', 'word2']].reset_index(drop=True)
+        pool = listgen.pal.add_fields(pairs, language="SP", rng=2)
+        assert (pool.type == 'PRACTICE').sum() == 6
+        assert_frame_equal(pool.loc[6:, ['word1', 'word2']].reset_index(drop=True), pairs)
+        assert list(pool.listno) == [0] * 6 + list(np.repeat(np.arange(1, 27), 6))
+
+    def test_shared_pools_untouched(self):
+        words = listgen.pal.wordpools['EN'].word.tolist()
+        practice = listgen.pal.PRACTICE_LIST_EN.word.tolist()
+        listgen.pal.generate_n_session_pairs(2)
+        listgen.pal.add_fields()
+        assert wordpool.get_pool("ram_wordpool_en.txt").word.tolist() == words
+        assert wordpool.get_pool("practice_en.txt").word.tolist() == practice
+
     def test_assign_cue_position(self):
         pool = listgen.pal.generate_n_session_pairs(1)[0]
         cue_positions_by_list = [listgen.pal.assign_cues(words) for _, words in pool.groupby('listno')]
@@ -318,3 +551,473 @@ class TestPAL:
                 pool2 = wordpools[j]
                 assert not self.equal_pairs(pool1.loc[pool1.type != 'PRACTICE'],
                                             pool2.loc[pool2.type != 'PRACTICE']).any()
+
+    def test_pair_index(self):
+        pool = listgen.pal.generate_n_session_pairs(1)[0]
+        pairs = pool.loc[pool.type != 'PRACTICE', ['word1', 'word2']].reset_index(drop=True)
+        index = listgen.pal.PairIndex(pairs)
+        assert len(index) == len(pairs)
+        assert (pairs.word1[0], pairs.word2[0]) in index
+        assert (pairs.word2[0], pairs.word1[0]) in index
+        assert ('NOT', 'WORDS') not in index
+
+        swapped = pairs.rename(columns={'word1': 'word2', 'word2': 'word1'})
+        assert index.contains(swapped).all()
+        mixed = pd.DataFrame({'word1': pairs.word1.values, 'word2': np.roll(pairs.word2.values, 1)})
+        assert not index.contains(mixed).any()
+
+        # same results as the reference implementation
+        assert (listgen.pal.equal_pairs(mixed, pairs) == self.equal_pairs(mixed, pairs)).all()
+        assert (listgen.pal.equal_pairs(swapped, pairs) == self.equal_pairs(swapped, pairs)).all()
+
+    def test_session_overlap(self):
+        sessions = [pool.loc[pool.type != 'PRACTICE'] for pool in listgen.pal.generate_n_session_pairs(4)]
+        assert (listgen.pal.session_overlap(sessions) == 0).all()
+
+        sessions.append(sessions[1].iloc[:10])
+        overlap = listgen.pal.session_overlap(sessions)
+        assert overlap.shape == (5, 5)
+        assert overlap[1, 4] == overlap[4, 1] == 10
+        assert overlap.sum() == 20
+
+    def test_where(self):
+        pool = listgen.pal.generate_n_session_pairs(1)[0]
+        pool = pool.loc[pool.type != 'PRACTICE']
+        words = [pool.word1.iloc[0], pool.word2.iloc[5]]
+        assert listgen.pal.where_(words[0], pool).sum() == 1
+        assert listgen.pal.where_(words, pool).sum() == 2
+        assert len(listgen.pal.where_(words, pool.iloc[:0])) == 0
+
+
+class TestCohort:
+    def test_generate_cohort(self):
+        subjects = ["R1001P", "R1002P", "R1003P"]
+        progress = []
+        serial = listgen.generate_cohort("FR", subjects, 2, seed=42, max_workers=0,
+                                         progress=lambda done, total: progress.append((done, total)))
+        assert list(serial) == subjects
+        assert progress == [(i, 6) for i in range(1, 7)]
+        assert not serial["R1001P"][0].word.equals(serial["R1001P"][1].word)
+
+        # independent of worker count and chunking
+        parallel = listgen.generate_cohort("FR", subjects, 2, seed=42, max_workers=2, chunksize=4)
+        for subject in subjects:
+            for a, b in zip(serial[subject], parallel[subject]):
+                assert_frame_equal(a, b)
+
+        # the global random state is left alone
+        np.random.seed(0)
+        listgen.generate_cohort("FR", subjects[:1], 1, seed=1, max_workers=0)
+        assert np.random.randint(1000) == 684
+
+        pal = listgen.generate_cohort("PAL", subjects[:2], 3, seed=42, max_workers=2)
+        assert [len(sessions) for sessions in pal.values()] == [3, 3]
+
+        with pytest.raises(ValueError):
+            listgen.generate_cohort("YC1", subjects, 1)
+
+    def test_unit_seed(self):
+        from wordpool.listgen.cohort import unit_seed
+        state = unit_seed(42, "FR", "R1001P", 0).generate_state(4)
+        assert (state == unit_seed(42, "FR", "R1001P", 0).generate_state(4)).all()
+        assert (state != unit_seed(42, "FR", "R1001P", 1).generate_state(4)).any()
+        assert (state != unit_seed(42, "FR", "R1002P", 0).generate_state(4)).any()
+        assert (state != unit_seed(43, "FR", "R1001P", 0).generate_state(4)).any()
+        assert (state != unit_seed(42, "catFR", "R1001P", 0).generate_state(4)).any()
+        assert (state != unit_seed(42, "FR", "R1001P").generate_state(4)).any()
+
+    def test_experiment_streams(self):
+        from wordpool.rng import session_rng, stream_seed
+        from wordpool.listgen.cohort import unit_seed
+
+        # FR session 0 and the PAL unit of a subject don't share a stream
+        fr_rng = session_rng(42, "R1001P", 0, experiment="FR")
+        pal_rng = session_rng(42, "R1001P", 0, experiment="PAL")
+        assert (fr_rng.random(4) != pal_rng.random(4)).all()
+
+        fr = listgen.generate_cohort("FR", ["R1001P"], 1, seed=42, max_workers=0)["R1001P"][0]
+        expected = listgen.fr.generate_session_pool(rng=session_rng(42, "R1001P", 0, experiment="FR"))
+        assert_frame_equal(fr, expected)
+
+        pal = listgen.generate_cohort("PAL", ["R1001P"], 1, seed=42, max_workers=0)["R1001P"][0]
+        expected = listgen.pal.generate_n_session_pairs(1, rng=session_rng(42, "R1001P", 0, experiment="PAL"))[0]
+        assert_frame_equal(pal, expected)
+        shared = listgen.pal.generate_n_session_pairs(1, rng=session_rng(42, "R1001P", 0, experiment="FR"))[0]
+        assert not pal.equals(shared)
+
+        # unit seeds extend the key of the streams
+        seed = unit_seed(42, "PAL", "R1001P")
+        assert seed.spawn_key == stream_seed(42, "R1001P", "PAL").spawn_key
+        assert unit_seed(42, "PAL", "R1001P", 2).spawn_key == seed.spawn_key + (2,)
+
+
+class TestPipeline:
+    def test_session_pipeline(self):
+        stimspec = {(0,): 5, (1,): 5, (0, 1): 6}
+        pipeline = (listgen.pipeline.SessionPipeline(rng=3)
+                    .fr_session(language="EN")
+                    .list_types(4, 6, 16)
+                    .multistim(stimspec)
+                    .learn1_blocks(2, 2, (0, 1)))
+        assert not pipeline.timings
+        pool = pipeline.run()
+        assert isinstance(pool, wordpool.WordPool)
+        assert list(pipeline.timings) == ["fr_session", "list_types", "multistim", "learn1_blocks"]
+        assert all(t >= 0 for t in pipeline.timings.values())
+
+        # same as chaining the frame based functions
+        rng = np.random.default_rng(3)
+        session = listgen.fr.generate_session_pool(language="EN", rng=rng)
+        session = listgen.assign_list_types(session, 4, 6, 16, rng=rng)
+        session = listgen.assign_multistim(session, stimspec, rng=rng)
+        blocks = listgen.generate_learn1_blocks(session, 2, 2, (0, 1), rng=rng)
+        assert_frame_equal(pool.to_dataframe(), blocks)
+
+        # custom stages
+        def drop_words(pool, rng, column):
+            del pool[column]
+            return pool
+
+        pool = listgen.pipeline.SessionPipeline().fr_session().stage("drop", drop_words, column="word").run()
+        assert pool.columns == ["listno"]
+
+
+class TestBank:
+    def test_session_bank(self, tmpdir):
+        path = osp.join(str(tmpdir), "fr.bank")
+        listgen.bank.build_bank(path, "FR", 4, seed=42, max_workers=0)
+        with pytest.raises(ValueError):
+            listgen.bank.build_bank(path, "FR", 4)
+
+        sessions = listgen.generate_cohort("FR", ["0", "1", "2", "3"], 1, seed=42, max_workers=0)
+        with listgen.bank.SessionBank(path) as bank:
+            assert len(bank) == bank.remaining == 4
+            assert_frame_equal(bank.get(2), sessions["2"][0])
+            coded = bank.coded_columns()
+            assert list(coded) == list(sessions["2"][0].columns)
+            assert coded["word"].shape == (4, len(sessions["2"][0]))
+            assert (bank.strings[coded["word"][2]] == sessions["2"][0].word.values).all()
+            assert bank.consume(1)
+            assert not bank.consume(1)
+
+            index, pool = bank.draw()
+            assert index == 0
+            assert_frame_equal(pool, sessions["0"][0])
+
+        # consumption is recorded in the bank
+        with listgen.bank.SessionBank(path) as bank:
+            assert bank.is_consumed(0) and bank.is_consumed(1)
+            assert [bank.draw()[0] for _ in range(2)] == [2, 3]
+            assert bank.remaining == 0
+            with pytest.raises(exc.BankExhaustedError):
+                bank.draw()
+
+    def test_streamed_bank(self, tmpdir):
+        # entries with several sessions, completed in any order by workers
+        path = osp.join(str(tmpdir), "fr.bank")
+        listgen.bank.build_bank(path, "FR", 5, n_sessions=2, seed=3, max_workers=2, chunksize=1)
+        sessions = listgen.generate_cohort("FR", [str(i) for i in range(5)], 2, seed=3, max_workers=0)
+        with listgen.bank.SessionBank(path) as bank:
+            for index in range(5):
+                entry = bank.get(index)
+                for n, session in enumerate(sessions[str(index)]):
+                    assert_frame_equal(entry[entry.session == n].drop(columns="session").reset_index(drop=True),
+                                       session.reset_index(drop=True))
+
+    def test_pal_bank(self, tmpdir):
+        path = osp.join(str(tmpdir), "pal.bank")
+        listgen.bank.build_bank(path, "PAL", 2, n_sessions=2, seed=1, max_workers=0)
+        sessions = listgen.generate_cohort("PAL", ["1"], 2, seed=1, max_workers=0)["1"]
+        with listgen.bank.SessionBank(path) as bank:
+            entry = bank.get(1)
+            for n, session in enumerate(sessions):
+                # missing list types survive the round trip
+                assert_frame_equal(entry[entry.session == n].drop(columns="session").reset_index(drop=True),
+                                   session.reset_index(drop=True))
+            assert "word" not in bank.coded_columns()
+
+
+class TestAio:
+    def test_coroutines(self):
+        import asyncio
+        from concurrent.futures import ThreadPoolExecutor
+        from wordpool.listgen import aio
+
+        async def main():
+            # sessions are generated while the loop keeps running
+            ticks = []
+
+            async def heartbeat():
+                while True:
+                    ticks.append(None)
+                    await asyncio.sleep(0)
+
+            beat = asyncio.ensure_future(heartbeat())
+            pools = await asyncio.gather(*[aio.generate_fr_session_pool(rng=i) for i in range(4)])
+            beat.cancel()
+            assert ticks
+            for i, pool in enumerate(pools):
+                assert_frame_equal(pool, listgen.fr.generate_session_pool(rng=i))
+
+            pool = await aio.assign_list_types(pools[0], 3, 6, 16, 1, rng=1)
+            assert_frame_equal(pool, listgen.assign_list_types(pools[0], 3, 6, 16, 1, rng=1))
+
+            with ThreadPoolExecutor(1) as executor:
+                aio.set_executor(executor)
+                try:
+                    sessions = await aio.generate_subject("FR", "R1001P", 2, seed=42, timeout=30)
+                finally:
+                    aio.set_executor(None)
+            cohort = listgen.generate_cohort("FR", ["R1001P"], 2, seed=42, max_workers=0)
+            for a, b in zip(sessions, cohort["R1001P"]):
+                assert_frame_equal(a, b)
+
+            pal = await aio.generate_subject("PAL", "R1001P", 2, seed=1)
+            assert len(pal) == 2
+
+            with pytest.raises(asyncio.TimeoutError):
+                await aio.run(time.sleep, 1, timeout=0.01)
+
+            with pytest.raises(ValueError):
+                await aio.generate_subject("YC1", "R1001P", 1)
+
+        asyncio.run(main())
+
+
+class TestValidate:
+    def test_fr(self, tmpdir):
+        from wordpool.listgen.validate import validate
+
+        sessions = listgen.fr.generate_n_session_pools(20, rng=1)
+        assert validate(sessions).empty
+
+        pool = listgen.assign_list_types(listgen.fr.generate_session_pool(rng=1), 3, 6, 16, 1, rng=1)
+        assert validate([pool, pool], phase_counts={"BASELINE": 3, "NON-STIM": 6, "STIM": 16}).empty
+        violations = validate([pool, pool], phase_counts={"STIM": 15})
+        assert list(violations.session) == [0, 1]
+        assert list(violations.listno) == [-1, -1]
+        assert (violations.check == "phase_types").all()
+
+        bad = pool.copy()
+        bad.loc[13, "word"] = bad.loc[0, "word"]
+        bad.loc[14, "listno"] = 2
+        bad.loc[15, "phase_type"] = "STIM"
+        violations = validate([pool, bad])
+        assert (violations.session == 1).all()
+        assert sorted(violations.check) == ["duplicates", "list_length", "list_length", "phase_types"]
+
+        # banks are validated without decoding them
+        path = osp.join(str(tmpdir), "fr.bank")
+        listgen.bank.build_bank(path, "FR", 3, seed=1, max_workers=0)
+        with listgen.bank.SessionBank(path) as bank:
+            assert validate(bank).empty
+
+    def test_catfr(self):
+        from wordpool.listgen.validate import validate
+
+        pool = listgen.catfr.assign_word_numbers(wordpool.load("ram_categorized_v2_sp.txt"))
+        sessions = [listgen.catfr.sort_pairs(listgen.catfr.assign_list_numbers(pool, rng=i), rng=i)
+                    for i in range(5)]
+        assert validate(sessions, "catFR").empty
+
+        bad = sessions[0].copy()
+        bad.iloc[[1, 2]] = bad.iloc[[2, 1]].values
+        violations = validate(bad, "catFR")
+        assert (violations.check == "pairs").all()
+        assert (violations.listno == bad.listno[0]).all()
+
+    def test_pal(self):
+        from wordpool.listgen.validate import validate
+
+        sessions = listgen.pal.generate_n_session_pairs(3, language="SP", rng=1)
+        assert validate(sessions, "PAL").empty
+
+        bad = sessions[1].copy()
+        bad.loc[bad.listno == 4, "cue_pos"] = "word2"
+        violations = validate([sessions[0], bad], "PAL")
+        assert list(violations.check) == ["cues"]
+        assert list(violations.listno) == [4]
+
+        with pytest.raises(ValueError):
+            validate(sessions, "YC1")
+
+
+class TestPlanner:
+    def test_fr(self):
+        from wordpool.listgen.planner import ExposurePlanner, ExposureIndex
+        from wordpool.listgen.validate import validate
+
+        planner = ExposurePlanner("FR", rng=1)
+        sessions = planner.plan_sessions(24)
+        assert validate(sessions).empty
+        words = sorted(wordpool.load("ram_wordpool_en.txt").word)
+        for session in sessions:
+            assert list(session.columns) == ["word", "listno"]
+            assert sorted(session.word) == words
+
+        # serial positions and list mates are spread more evenly than with
+        # independent sessions
+        index = planner.index
+        assert (index.exposures == 24).all()
+        assert index.positions.max() - index.positions.min() <= 2
+
+        independent = ExposureIndex(len(words), 12)
+        codes = pd.Index(wordpool.load("ram_wordpool_en.txt").word)
+        for i in range(24):
+            session = listgen.fr.generate_session_pool(rng=i)
+            independent.record(codes.get_indexer(session.word).reshape(26, 12))
+        assert index.cooccurrence.max() < independent.cooccurrence.max()
+        assert index.repeated_pairs() < independent.repeated_pairs()
+
+        # fewer words than in the pool use the least exposed ones
+        planner = ExposurePlanner("FR", num_lists=2, list_length=12, rng=1)
+        planner.plan_sessions(13)
+        assert set(planner.index.exposures) == {1}
+
+    def test_catfr(self):
+        from wordpool.listgen.planner import ExposurePlanner, ExposureIndex
+        from wordpool.listgen.validate import validate
+
+        planner = ExposurePlanner("catFR", language="SP", rng=1)
+        sessions = planner.plan_sessions(12)
+        for session in sessions:
+            assert list(session.columns) == ["category", "word", "wordno", "category_num", "listno"]
+
+        # PANDA is in two categories of the SP pool
+        violations = validate(sessions, "catFR")
+        assert (violations.check == "duplicates").all()
+
+        independent = ExposureIndex(len(planner.categories), 3)
+        for i in range(12):
+            session = listgen.catfr.generate_session_pool("SP", rng=i)
+            first_round = pd.Index(planner.categories).get_indexer(session.category)
+            independent.record(first_round.reshape(26, 12)[:, :6:2])
+        assert planner.category_index.cooccurrence.max() < independent.cooccurrence.max()
+
+        # every list counts, even though categories appear in several lists
+        planner = ExposurePlanner("catFR", language="SP", rng=2)
+        session = planner.plan()
+        first_round = pd.Index(planner.categories).get_indexer(session.category).reshape(26, 12)[:, :6:2]
+        exposures = planner.category_index.exposures
+        assert exposures.sum() == 78
+        assert (exposures == np.bincount(first_round.ravel(), minlength=len(exposures))).all()
+        assert np.triu(planner.category_index.cooccurrence, 1).sum() == 78
+        assert (planner.category_index.cooccurrence == planner.category_index.cooccurrence.T).all()
+        assert (np.diag(planner.category_index.cooccurrence) == 0).all()
+
+    def test_exposure_index(self):
+        from wordpool.listgen.planner import ExposureIndex
+
+        index = ExposureIndex(4, 2)
+        index.record([[0, 1], [1, 2], [0, 1]])
+        assert index.exposures.tolist() == [2, 3, 1, 0]
+        assert index.positions.tolist() == [[2, 0], [1, 2], [0, 1], [0, 0]]
+        assert index.cooccurrence[0, 1] == index.cooccurrence[1, 0] == 2
+        assert index.cooccurrence[1, 2] == 1
+        assert index.repeated_pairs() == 1
+
+    def test_splits(self):
+        from wordpool.listgen.planner import MAX_SPLITS, _splits
+
+        rng = np.random.default_rng(0)
+        splits = _splits(3, rng)
+        assert splits.shape == (90, 6)
+        assert len(np.unique(splits, axis=0)) == 90
+        assert (np.sort(splits, axis=1) == [0, 0, 1, 1, 2, 2]).all()
+
+        # too many to enumerate
+        splits = _splits(8, rng)
+        assert splits.shape == (MAX_SPLITS, 16)
+        assert (np.sort(splits, axis=1) == np.repeat(np.arange(8), 2)).all()
+
+    def test_plan_cohort(self):
+        from wordpool.listgen.planner import plan_cohort
+
+        subjects = ["R1001P", "R1002P"]
+        serial = plan_cohort("FR", subjects, 2, seed=1, max_workers=0)
+        parallel = plan_cohort("FR", subjects, 2, seed=1, max_workers=2)
+        assert list(serial) == subjects
+        for subject in subjects:
+            for a, b in zip(serial[subject], parallel[subject]):
+                assert_frame_equal(a, b)
+        assert not serial["R1001P"][0].word.equals(serial["R1002P"][0].word)
+
+        with pytest.raises(ValueError):
+            plan_cohort("PAL", subjects, 1)
+
+
+class TestServer:
+    def test_load_seed(self, tmpdir):
+        from wordpool.listgen.server import load_seed
+
+        path = str(tmpdir.join("seed"))
+        seed = load_seed(path)
+        assert load_seed(path) == seed
+        assert tmpdir.listdir() == [tmpdir.join("seed")]
+        with open(path, "w") as f:
+            f.write("42\n")
+        assert load_seed(path) == 42
+
+    @pytest.mark.parametrize("unix", [False, True])
+    def test_server(self, tmpdir, unix):
+        import threading
+        from wordpool.listgen.server import SessionServer, Client
+
+        address = str(tmpdir.join("wordpool.sock")) if unix else ("127.0.0.1", 0)
+        with SessionServer(address, seed=42) as server, Client(server.address) as client:
+            # sessions of a subject are those of a cohort with the same seed
+            pool = client.generate("FR", subject="R1001P", session=1)
+            cohort = listgen.generate_cohort("FR", ["R1001P"], 2, seed=42, max_workers=0)
+            assert_frame_equal(pool, cohort["R1001P"][1])
+
+            pal = client.generate("PAL", subject="R1001P", session=1, n_sessions=2)
+            assert_frame_equal(pal, listgen.generate_cohort("PAL", ["R1001P"], 2, seed=42)["R1001P"][1])
+
+            # REC1 blocks are drawn from the session of the same request
+            params = dict(subject="R1001P", list_types=[4, 6, 16, 0])
+            session = client.generate("FR", **params)
+            blocks = client.generate("REC1", **params)
+            targets = blocks[blocks.type != "LURE"]
+            assert set(targets.word) <= set(session.word)
+            assert_frame_equal(blocks, server.generate("REC1", **params))
+
+            stimspec = {(0,): 5, (1,): 5, (0, 1): 6}
+            learn1 = client.generate("LEARN1", list_types=[4, 6, 16, 0], stimspec=stimspec,
+                                     num_nonstim=2, num_stim=2, seed=1)
+            assert (0, 1) in learn1.stim_channels.tolist()
+            assert len(learn1.blockno.unique()) == 4
+
+            # several clients at once
+            results = {}
+
+            def request(subject):
+                with Client(server.address) as own:
+                    results[subject] = [own.generate("FR", subject=subject, session=n) for n in range(3)]
+
+            threads = [threading.Thread(target=request, args=(subject,)) for subject in range(4)]
+            for thread in threads:
+                thread.start()
+            for thread in threads:
+                thread.join()
+            for subject, pools in results.items():
+                for n, pool in enumerate(pools):
+                    assert_frame_equal(pool, server.generate("FR", subject=subject, session=n))
+
+            with pytest.raises(exc.ServerError) as e:
+                client.generate("REC1", subject="R1001P")
+            assert e.value.status == 400
+            with pytest.raises(exc.ServerError) as e:
+                client.generate("YC1")
+            assert e.value.status == 404
+            # methods the server doesn't handle are answered with an HTML page
+            with pytest.raises(exc.ServerError) as e:
+                client._request("PUT", "/FR")
+            assert e.value.status == 501
+
+            stats = client.stats()
+            assert stats["requests"]["FR"] == 14
+            assert stats["errors"] == 1
+            assert "FR (EN)" not in stats["unavailable"]
+
+        if unix:
+            assert not osp.exists(address)
@@ -190,3 +190,82 @@ class TestIntegratedNoPandasFunctions:
                           {"word": "thirteen", "listno": 6, "phase_type": "STIM", "stim_channels": (0, ), "amplitude_index": 2},
                           {"word": "fourteen", "listno": 6, "phase_type": "STIM", "stim_channels": (0, ), "amplitude_index": 2}]
         assert words_with_amplitude_index == correct_result
+
+
+@pytest.mark.nopandas
+class TestWordPool:
+    def test_conversions(self):
+        import pandas as pd
+        from pandas.testing import assert_frame_equal
+
+        words = a_couple_words() + ten_words()
+        pool = nopandas.WordPool.from_records(words)
+        assert len(pool) == 12
+        assert pool.columns == ["word"]
+        assert pool.to_records() == words
+
+        df = pd.DataFrame({"word": [w["word"] for w in words], "listno": range(12)})
+        pool = nopandas.WordPool.from_dataframe(df)
+        assert_frame_equal(pool.to_dataframe(), df)
+
+        # columns are replaced, never modified in place
+        pool["listno"] = 0
+        assert list(df.listno) == list(range(12))
+
+        taken = pool.take([3, 1])
+        assert taken.to_records() == [{"word": "six", "listno": 0}, {"word": "two", "listno": 0}]
+
+    def test_matches_dictionaries(self):
+        stim_nostim_list = ["STIM"] * 2 + ["NON-STIM"] * 1
+        stim_channels_list = [(0, 1)] * 1 + [(0, )] * 1
+        listnos = [3, 4, 5, 5, 4, 3, 4, 5, 3]
+
+        records = nopandas.assign_list_numbers_from_word_list(a_couple_words() + ten_words(), 6)
+        pool = nopandas.assign_list_numbers_from_word_list(nopandas.WordPool.from_records(a_couple_words() + ten_words()), 6)
+        assert pool.to_records() == records
+
+        records = nopandas.assign_list_types_from_type_list(records, 2, stim_nostim_list, num_ps=1)
+        pool = nopandas.assign_list_types_from_type_list(pool, 2, stim_nostim_list, num_ps=1)
+        assert pool.to_records() == records
+
+        records = nopandas.assign_multistim_from_stim_channels_list(records, stim_channels_list)
+        pool = nopandas.assign_multistim_from_stim_channels_list(pool, stim_channels_list)
+        assert pool.to_records() == records
+
+        blocks = nopandas.extract_blocks(pool, listnos, 3)
+        assert blocks.to_records() == nopandas.extract_blocks(records, listnos, 3)
+
+        with pytest.raises(AssertionError):
+            nopandas.assign_multistim_from_stim_channels_list(pool, [(0, )])
+
+
+@pytest.mark.nopandas
+class TestBlocks:
+    def test_iter_blocks(self):
+        pool = nopandas.assign_list_numbers_from_word_list(a_couple_words() + ten_words(), 6)
+        listnos = [3, 4, 5, 5, 4, 3]
+
+        blocks = nopandas.iter_blocks(pool, listnos, 2)
+        assert not isinstance(blocks, list)
+        blocks = list(blocks)
+        assert blocks == nopandas.extract_blocks(pool, listnos, 2)
+        assert blocks[0] == {"word": "nine", "listno": 3, "blockno": 0, "block_listno": 0}
+
+        # the pool is left alone
+        assert all("blockno" not in word for word in pool)
+
+        with pytest.raises(AssertionError):
+            nopandas.iter_blocks(pool, listnos, 4)
+        with pytest.raises(KeyError):
+            nopandas.iter_blocks(pool, [3, 42], 2)
+
+    def test_block_indices(self):
+        words = nopandas.assign_list_numbers_from_word_list(a_couple_words() + ten_words(), 6)
+        listnos = [3, 1, 3, 1]
+        expected = ([6, 7, 2, 3, 6, 7, 2, 3], [0, 0, 0, 0, 1, 1, 1, 1], [0, 0, 1, 1, 2, 2, 3, 3])
+        assert nopandas.block_indices(words, listnos, 2) == expected
+
+        pool = nopandas.WordPool.from_records(words)
+        assert tuple(a.tolist() for a in nopandas.block_indices(pool, listnos, 2)) == expected
+        with pytest.raises(KeyError):
+            nopandas.block_indices(pool, [3, 42], 2)
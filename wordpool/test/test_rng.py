@@ -0,0 +1,50 @@
+import numpy as np
+from pandas.testing import assert_frame_equal
+
+from wordpool import listgen
+from wordpool.rng import get_rng, session_rng, subject_key
+
+
+def test_get_rng():
+    rng = np.random.default_rng(1)
+    assert get_rng(rng) is rng
+    assert get_rng(1).random() == np.random.default_rng(1).random()
+
+    # the global state still makes results reproducible
+    np.random.seed(0)
+    first = get_rng().random(3)
+    np.random.seed(0)
+    assert (get_rng().random(3) == first).all()
+
+
+def test_session_rng():
+    first = session_rng(42, "R1001P", 37).random(4)
+    assert (session_rng(42, "R1001P", 37).random(4) == first).all()
+    for other in [session_rng(42, "R1001P", 36), session_rng(42, "R1002P", 37), session_rng(43, "R1001P", 37)]:
+        assert (other.random(4) != first).all()
+
+    # identifiers with the same CRC32 still get different streams
+    assert (session_rng(42, "plumless").random(4) != session_rng(42, "buckeroo").random(4)).all()
+    assert subject_key("plumless") != subject_key("buckeroo")
+    assert len(subject_key("R1001P")) == 8
+
+    # experiments get streams of their own
+    assert (session_rng(42, "R1001P", 37, experiment="FR").random(4) != first).all()
+    assert (session_rng(42, "R1001P", 37, experiment="FR").random(4)
+            != session_rng(42, "R1001P", 37, experiment="catFR").random(4)).all()
+
+
+def test_generators_accept_rng():
+    assert_frame_equal(listgen.fr.generate_session_pool(rng=1), listgen.fr.generate_session_pool(rng=1))
+    assert not listgen.fr.generate_session_pool(rng=1).equals(listgen.fr.generate_session_pool(rng=2))
+
+    a = listgen.pal.generate_n_session_pairs(2, rng=session_rng(1, "R1001P"))
+    b = listgen.pal.generate_n_session_pairs(2, rng=session_rng(1, "R1001P"))
+    for x, y in zip(a, b):
+        assert_frame_equal(x, y)
+
+    pool = listgen.fr.generate_session_pool(rng=1)
+    typed = [listgen.assign_list_types(pool, 3, 6, 16, 1, rng=5) for _ in range(2)]
+    assert_frame_equal(*typed)
+    learn1 = [listgen.generate_learn1_blocks(typed[0], 2, 2, stim_channels=(0,), rng=5) for _ in range(2)]
+    assert_frame_equal(*learn1)
@@ -0,0 +1,26 @@
+import numpy as np
+import pandas as pd
+
+import wordpool
+from wordpool.vocab import Vocabulary
+
+
+def test_vocabulary():
+    vocab = Vocabulary(["A", "B", "A"])
+    assert len(vocab) == 2
+    assert "A" in vocab
+
+    assert vocab.intern(pd.Series(["B", "C", "C", "A"])).tolist() == [1, 2, 2, 0]
+    assert vocab.intern(["C"]).dtype == np.int32
+    assert vocab.lookup(["D", "A"]).tolist() == [-1, 0]
+    assert len(vocab) == 3
+    assert vocab.decode([2, 0]).tolist() == ["C", "A"]
+    assert vocab.strings.tolist() == ["A", "B", "C"]
+
+
+def test_shuffle_within_groups_codes():
+    words = wordpool.load("ram_categorized_v2_sp.txt")
+    shuffled = wordpool.shuffle_within_groups(words, "category", rng=1)
+    assert (shuffled.category.values == words.category.values).all()
+    assert sorted(shuffled.word) == sorted(words.word)
+    assert not (shuffled.word.values == words.word.values).all()
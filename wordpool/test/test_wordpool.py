@@ -4,6 +4,9 @@ import os.path as osp
 import subprocess
 import pytest
 
+import numpy as np
+import pandas as pd
+
 import wordpool
 
 here = osp.realpath(osp.dirname(__file__))
@@ -38,6 +41,104 @@ def test_create(pool, catpool):
     assert "word" in other
 
 
+def test_get_pool():
+    from wordpool.registry import PoolRegistry
+
+    registry = PoolRegistry(maxsize=2)
+    first = registry.get("ram_wordpool_en.txt")
+    second = registry.get("ram_wordpool_en.txt")
+    assert first is not second
+    assert np.shares_memory(first.values, second.values)
+    assert (first.word == wordpool.load("ram_wordpool_en.txt").word).all()
+
+    # shared string columns can still be compared with scalars
+    assert len(first[first.word == first.word[0]]) == 1
+    categories = registry.get("ram_categorized_v2_sp.txt")
+    assert not categories.word.values.flags.writeable
+    assert (categories[categories.category == categories.category[0]].category == categories.category[0]).all()
+
+    # views are read-only...
+    with pytest.raises(ValueError):
+        first.loc[0, "word"] = "NOTAWORD"
+    with pytest.raises(ValueError):
+        np.random.shuffle(first.values)
+
+    # ...but columns can be added and removed without affecting others
+    first["listno"] = 0
+    del second["word"]
+    assert list(registry.get("ram_wordpool_en.txt").columns) == ["word"]
+
+    # least recently used pools are evicted
+    registry.get("ram_wordpool_sp.txt")
+    registry.get("ram_wordpool_en.txt")
+    registry.get("practice_en.txt")
+    assert len(registry) == 2
+    assert "ram_wordpool_sp.txt" not in registry
+    assert "ram_wordpool_en.txt" in registry
+
+    assert isinstance(wordpool.get_pool("ram_wordpool_en.txt"), pd.DataFrame)
+
+
+def test_load_cache(tmpdir, monkeypatch):
+    from pandas.testing import assert_frame_equal
+    from wordpool import cache, instrument
+
+    monkeypatch.setenv("WORDPOOL_CACHE_DIR", str(tmpdir.join("cache")))
+    path = str(tmpdir.join("pool.txt"))
+    expected = pd.DataFrame({"word": ["A", "B", "C", "A"], "category": ["X", "Y", "X", "Y"], "number": [1, 2, 3, 4]})
+    expected.to_csv(path, sep="\t", index=False)
+
+    # compiled on first load, mapped afterwards
+    assert_frame_equal(wordpool.load(path, False), expected)
+    assert len(tmpdir.join("cache").listdir()) == 1
+    compiled = wordpool.load(path, False)
+    assert_frame_equal(compiled, expected)
+    assert isinstance(compiled.word[0], str)
+
+    # strings are decoded once and shared between loads
+    assert wordpool.load(path, False).word[0] is compiled.word[0]
+    decoded = cache.decode(np.array(["A", "B", "C"]), np.array([[2, -1], [2, 0]]))
+    assert decoded.shape == (2, 2) and decoded[0, 0] is decoded[1, 0]
+    assert list(decoded[1]) == ["C", "A"] and np.isnan(decoded[0, 1])
+
+    # loaded pools are private copies
+    compiled.loc[0, "word"] = "Z"
+    compiled.loc[0, "number"] = 42
+    assert_frame_equal(wordpool.load(path, False), expected)
+
+    # changes invalidate the compiled pool, which is removed
+    expected = expected.iloc[:2]
+    expected.to_csv(path, sep="\t", index=False)
+    assert_frame_equal(wordpool.load(path, False), expected)
+    assert_frame_equal(wordpool.load(path, False), expected)
+    assert tmpdir.join("cache").listdir() == [tmpdir.join("cache", cache.cache_key(path))]
+
+    # missing values can't be compiled, which is remembered
+    pd.DataFrame({"word": ["A", None]}).to_csv(path, sep="\t", index=False)
+    assert not cache.compile_pool(pd.read_table(path), str(tmpdir.join("missing")))
+    assert wordpool.load(path, False).word.isnull().sum() == 1
+    assert tmpdir.join("cache").listdir() == [tmpdir.join("cache", cache.cache_key(path) + ".skip")]
+    instrument.reset()
+    instrument.enable()
+    try:
+        assert wordpool.load(path, False).word.isnull().sum() == 1
+    finally:
+        instrument.disable()
+    assert instrument.stats()["counters"] == {"cache.skipped": 1}
+    instrument.reset()
+
+    # entries of missing or changed pools are pruned
+    other = str(tmpdir.join("other.txt"))
+    expected.to_csv(other, sep="\t", index=False)
+    wordpool.load(other, False)
+    tmpdir.join("cache", ".tmp-leftover").ensure(dir=True).setmtime(0)
+    assert len(tmpdir.join("cache").listdir()) == 3
+    tmpdir.join("other.txt").remove()
+    expected.to_csv(path, sep="\t", index=False)
+    assert cache.prune() == 3
+    assert tmpdir.join("cache").listdir() == []
+
+
 def test_assign_list_numbers(catpool):
     df = catpool.copy()
     assigned = wordpool.assign_list_numbers(catpool, 26)
@@ -86,6 +187,25 @@ def test_shuffle_within_groups(catpool):
     assert not (df.word == shuffled.word).all()
 
 
+def test_shuffle_within_groups_batch():
+    df = wordpool.load("ram_categorized_v2_sp.txt")
+
+    index = wordpool.shuffle_within_groups_batch(df, "category", 10, rng=1)
+    assert index.shape == (10, len(df))
+    for row in index:
+        assert (df.category.values[row] == df.category.values).all()
+        assert sorted(row) == list(range(len(df)))
+    assert len(set(map(tuple, index))) == 10
+
+    # a single shuffle matches the batch with the same generator
+    rng = np.random.default_rng(2)
+    expected = df.iloc[wordpool.shuffle_within_groups_batch(df, "category", 1, rng=2)[0]].reset_index(drop=True)
+    assert (wordpool.shuffle_within_groups(df, "category", rng=rng) == expected).all().all()
+
+    with pytest.raises(RuntimeError):
+        wordpool.shuffle_within_groups_batch(df, "none", 2)
+
+
 def test_shuffle_within_lists(pool, catpool):
     df = pool.copy()
     catdf = catpool.copy()
@@ -0,0 +1,79 @@
+"""Interned vocabulary.
+
+A :class:`Vocabulary` maps words (or other strings) to ``int32`` codes once,
+so that membership tests and joins can work on integer arrays rather than
+comparing Python strings. Strings are only needed again when producing
+output. :class:`wordpool.listgen.pal.PairIndex` keeps the words of its pairs
+in a vocabulary and session banks (:mod:`wordpool.listgen.bank`) store
+codes into one.
+
+"""
+
+import threading
+
+from ._lazy import np, pd
+
+
+class Vocabulary(object):
+    """Append-only mapping of strings to consecutive integer codes.
+
+    :param strings: Array-like of initial strings. Duplicates are ignored.
+
+    """
+    def __init__(self, strings=()):
+        self._lock = threading.Lock()
+        self._index = pd.Index([], dtype=object)
+        self.intern(strings)
+
+    def __len__(self):
+        return len(self._index)
+
+    def __contains__(self, string):
+        return string in self._index
+
+    @property
+    def strings(self):
+        """All strings in code order."""
+        return self._index.values
+
+    def lookup(self, values):
+        """Return the codes of strings without adding new ones. Unknown
+        strings get a code of -1.
+
+        :param values: Array-like of strings.
+        :rtype: np.ndarray
+
+        """
+        return self._index.get_indexer(_as_array(values)).astype(np.int32)
+
+    def intern(self, values):
+        """Return the codes of strings, adding the ones not seen before.
+
+        :param values: Array-like of strings.
+        :rtype: np.ndarray
+
+        """
+        values = _as_array(values)
+        codes = self.lookup(values)
+        missing = codes < 0
+        if missing.any():
+            with self._lock:
+                new = pd.unique(values[missing])
+                new = new[self._index.get_indexer(new) < 0]
+                self._index = self._index.append(pd.Index(new, dtype=object))
+            codes[missing] = self._index.get_indexer(values[missing])
+        return codes
+
+    def decode(self, codes):
+        """Return the strings for an array of codes.
+
+        :rtype: np.ndarray
+
+        """
+        return self._index.values[np.asarray(codes)]
+
+
+def _as_array(values):
+    if isinstance(values, (pd.Series, pd.Index)):
+        return values.to_numpy(dtype=object)
+    return np.asarray(values, dtype=object)